@@ -0,0 +1,144 @@
+import os
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+
+from recorder import Purchase, read_trace
+from transaction import SOLD, DECLINES
+
+
+class SalesAggregate:
+    """Sales totals that can be added to one event at a time and merged with totals
+    worked out elsewhere, keyed by vending machine and then by product type, money type
+    or reason.
+
+    Attributes:
+        - attempts: purchases attempted, by machine
+        - sales: purchases made, by (machine, product type name)
+        - revenue: money taken less change given, in pence, by (machine, product type name);
+          sales read from traces that did not record change add no revenue
+        - change_paid: coins and notes given as change, by (machine, money type name)
+        - refunds: purchases declined, by (machine, exception name)
+    """
+
+    def __init__(self):
+        self.attempts = Counter()
+        self.sales = Counter()
+        self.revenue = Counter()
+        self.change_paid = Counter()
+        self.refunds = Counter()
+
+    def _counters(self):
+        return self.attempts, self.sales, self.revenue, self.change_paid, self.refunds
+
+    def add(self, machine, purchase, sign=1):
+        """Add a purchase made at a machine to the totals, or take it away with a sign of -1."""
+        self.attempts[machine] += sign
+        if purchase.outcome == SOLD:
+            product = type(purchase.product).__name__
+            self.sales[machine, product] += sign
+            if purchase.change is not None:
+                self.revenue[machine, product] += sign * (
+                    sum(m.value for m in purchase.money_objects) - sum(m.value for m in purchase.change))
+                for m in purchase.change:
+                    self.change_paid[machine, type(m).__name__] += sign
+        else:
+            # a purchase stopped by an unexpected error has no outcome code
+            exception = DECLINES.get(purchase.outcome, Exception)
+            self.refunds[machine, exception.__name__] += sign
+
+    def merge(self, other):
+        """Add the totals of another aggregate to these."""
+        for mine, theirs in zip(self._counters(), other._counters()):
+            mine.update(theirs)
+        return self
+
+    def refund_rates(self, machine=None):
+        """Return the share of attempted purchases declined for each reason, at one
+        machine or across them all."""
+        attempts = self.attempts[machine] if machine is not None else sum(self.attempts.values())
+        rates = Counter()
+        for (m, reason), count in self.refunds.items():
+            if machine is None or m == machine:
+                rates[reason] += count
+        return {reason: count / attempts for reason, count in rates.items() if count} if attempts else {}
+
+
+def purchases(paths):
+    """Read the purchases from trace files one at a time, in constant memory.
+
+    Returns:
+        - a generator of (machine, Purchase) pairs, where the machine is the name in the
+          trace's header or, without one, the trace's file name
+    """
+    for path in paths:
+        header, events = read_trace(path)
+        machine = header.get('machine') or os.path.basename(path)
+        for event in events:
+            if isinstance(event, Purchase):
+                yield machine, event
+
+
+def aggregate(stream):
+    """Return the totals of a stream of (machine, Purchase) pairs."""
+    totals = SalesAggregate()
+    for machine, purchase in stream:
+        totals.add(machine, purchase)
+    return totals
+
+
+def windows(stream, width):
+    """Split a stream of (machine, Purchase) pairs into back to back windows of time.
+    Purchases are expected in time order, as they are within one trace.
+
+    Returns:
+        - a generator of (window start, SalesAggregate) pairs, one for each window
+          holding a purchase
+    """
+    start, totals = None, None
+    for machine, purchase in stream:
+        window = purchase.time - purchase.time % width
+        if window != start:
+            if totals is not None:
+                yield start, totals
+            start, totals = window, SalesAggregate()
+        totals.add(machine, purchase)
+    if totals is not None:
+        yield start, totals
+
+
+def rolling(stream, width):
+    """Keep the totals of the purchases made in the last width seconds. Purchases are
+    expected in time order, as they are within one trace.
+
+    Only the purchases within the window are held. The same aggregate is yielded each
+    time, updated, so it should be copied with merge if it is to be kept.
+
+    Returns:
+        - a generator of (time, SalesAggregate) pairs, one after each purchase
+    """
+    totals = SalesAggregate()
+    window = deque()
+    for machine, purchase in stream:
+        window.append((machine, purchase))
+        totals.add(machine, purchase)
+        while window[0][1].time <= purchase.time - width:
+            expired_machine, expired = window.popleft()
+            totals.add(expired_machine, expired, sign=-1)
+        yield purchase.time, totals
+
+
+def _aggregate_file(path):
+    return aggregate(purchases([path]))
+
+
+def aggregate_files(paths, processes=None):
+    """Work out the totals of many trace files in parallel, one file per task, and merge
+    them.
+
+    Args:
+        - paths: the trace files
+        - processes: (int) worker processes to use, by default one per CPU
+    """
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return reduce(SalesAggregate.merge, pool.map(_aggregate_file, paths), SalesAggregate())
@@ -0,0 +1,310 @@
+"""Benchmarks for change calculation, money box operations, purchases, service visits, fleets and snapshots.
+
+Run from the repository root:
+
+    python -m benchmarks.run                  # run and compare against the baseline
+    python -m benchmarks.run --save-baseline  # run and store the results as the baseline
+    python -m benchmarks.run -k purchase      # only run benchmarks whose name matches
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+
+from change import calculate_change, make_change, _solve
+from exceptions import CalculateChangeError, InsufficientFundsForPurchase, NoStockException
+from fleet import FleetManager
+from machine import MoneyBox, VendingMachine
+from money import OneCent, FiveCent, TenCent, TwentyFiveCent, FiftyCent, OneDollarBill, TwoDollarBill
+from products import Candy, Snack, Nuts, Coke, Pepsi, Soda
+from snapshot import dumps, loads
+from transaction import VendingAction
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+COINS = [OneCent, FiveCent, TenCent, TwentyFiveCent, FiftyCent]
+VALID_MONEY = COINS + [OneDollarBill, TwoDollarBill]
+
+# Relative demand for each product, and the tenders customers pay with.
+PRODUCT_MIX = [(Candy, 4), (Snack, 2), (Nuts, 1), (Coke, 5), (Pepsi, 3), (Soda, 3)]
+TENDERS = [
+    [OneDollarBill],
+    [TwoDollarBill],
+    [FiftyCent],
+    [TwentyFiveCent, TwentyFiveCent],
+    [TenCent, TenCent, TwentyFiveCent],
+]
+
+Result = namedtuple('Result', ['name', 'ops_per_sec', 'p50', 'p95', 'p99'])
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """Register a benchmark. The decorated function sets up the benchmark and returns
+    the operation to time, which is called with the number of the run."""
+    def register(setup):
+        BENCHMARKS.append((name, setup))
+        return setup
+    return register
+
+
+def _money_box(n_coins, seed=0):
+    rng = random.Random(seed)
+    money_store = [rng.choice(COINS)() for _ in range(n_coins)]
+    return MoneyBox(money_store=money_store, valid_money=VALID_MONEY)
+
+
+def _register_change_benchmarks():
+    for target in (5, 45, 95, 190):
+        for n_coins in (10, 100, 1000):
+            available = [m.value for m in _money_box(n_coins, seed=target).money_store]
+            ledger = _money_box(n_coins, seed=target).ledger
+
+            def calculate(target=target, available=available):
+                def operation(i):
+                    _solve.cache_clear()
+                    try:
+                        calculate_change(target, available)
+                    except CalculateChangeError:
+                        pass
+                return operation
+
+            def cached(target=target, ledger=ledger):
+                def operation(i):
+                    try:
+                        make_change(target, ledger.values, ledger.counts)
+                    except CalculateChangeError:
+                        pass
+                return operation
+
+            benchmark('change/calculate_change/target={}/coins={}'.format(target, n_coins))(calculate)
+            benchmark('change/make_change_cached/target={}/coins={}'.format(target, n_coins))(cached)
+
+
+def _register_money_box_benchmarks():
+    for n_coins in (10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5):
+        def add_remove(n_coins=n_coins):
+            money_box = _money_box(n_coins)
+            coins = [m() for m in COINS]
+
+            def operation(i):
+                coin = coins[i % len(coins)]
+                money_box.add_to_money_store(coin)
+                money_box.remove_from_money_store(coin)
+            return operation
+
+        def total(n_coins=n_coins):
+            money_box = _money_box(n_coins)
+
+            def operation(i):
+                return money_box.total_money
+            return operation
+
+        def change(n_coins=n_coins):
+            money_box = _money_box(n_coins)
+
+            def operation(i):
+                _solve.cache_clear()
+                try:
+                    money_box.calculate_change(65)
+                except CalculateChangeError:
+                    pass
+            return operation
+
+        benchmark('money_box/add_remove/coins={}'.format(n_coins))(add_remove)
+        benchmark('money_box/total_money/coins={}'.format(n_coins))(total)
+        benchmark('money_box/calculate_change/coins={}'.format(n_coins))(change)
+
+
+@benchmark('purchase/product_mix')
+def purchase_product_mix():
+    rng = random.Random(0)
+    vending_machine = VendingMachine(products=[], money_box=_money_box(2000))
+    for product_type, weight in PRODUCT_MIX:
+        vending_machine.inventory.add(product_type(), weight * 100000)
+    vending_action = VendingAction(vending_machine)
+
+    product_types, weights = zip(*PRODUCT_MIX)
+    orders = [(rng.choices(product_types, weights)[0](), [m() for m in rng.choice(TENDERS)]) for _ in range(4096)]
+
+    def operation(i):
+        product, money_objects = orders[i % len(orders)]
+        try:
+            vending_action.purchase(product, money_objects)
+        except (CalculateChangeError, InsufficientFundsForPurchase, NoStockException):
+            pass
+    return operation
+
+
+def _register_decline_benchmarks():
+    # every order is declined: too little money, no stock or no change
+    orders = [(Nuts(), [FiftyCent()]), (Pepsi(), [OneDollarBill()]), (Candy(), [TwoDollarBill()])]
+
+    def setup(method):
+        money_box = MoneyBox(money_store=[OneCent()], valid_money=VALID_MONEY)
+        vending_action = VendingAction(VendingMachine(products=[Nuts(), Candy()], money_box=money_box))
+        purchase = getattr(vending_action, method)
+
+        def operation(i):
+            product, money_objects = orders[i % len(orders)]
+            try:
+                purchase(product, money_objects)
+            except (CalculateChangeError, InsufficientFundsForPurchase, NoStockException):
+                pass
+        return operation
+
+    for method in ('purchase', 'try_purchase'):
+        benchmark('purchase/declined/{}'.format(method))(lambda method=method: setup(method))
+
+
+@benchmark('service_visit/restock_collect')
+def service_visit_restock_collect():
+    # a visit loads a thousand products and coins and takes the coins back out
+    rng = random.Random(0)
+    vending_machine = VendingMachine(products=[], money_box=_money_box(0))
+    vending_action = VendingAction(vending_machine)
+    product_types = [product_type for product_type, _ in PRODUCT_MIX]
+    products = [rng.choice(product_types)() for _ in range(1000)]
+    money_objects = [rng.choice(COINS)() for _ in range(1000)]
+
+    def operation(i):
+        vending_action.restock(products, money_objects)
+        vending_action.remove_money_objects_to_money_stock(money_objects)
+    return operation
+
+
+def _register_fleet_benchmarks(batch_size=512, n_machines=64, stock=16000):
+    # each operation is a batch of orders spread over the fleet, so orders a second are
+    # the operations a second times the batch size; the workers are stopped once timed
+    rng = random.Random(0)
+    orders = [(rng.randrange(n_machines), product(), [m() for m in tender]) for product, tender in
+              (rng.choice([(Candy, [TenCent]), (Coke, [TwentyFiveCent]), (Candy, [TwentyFiveCent])])
+               for _ in range(batch_size))]
+
+    def setup(workers):
+        fleet = FleetManager(workers=workers)
+        fleet.add_machines((i, [Candy()] * stock + [Coke()] * stock, [FiveCent()] * 100 + [TenCent()] * 100, COINS)
+                           for i in range(n_machines))
+
+        def operation(i):
+            fleet.purchase(orders)
+        operation.close = fleet.close
+        return operation
+
+    for workers in (1, 2, 4):
+        benchmark('fleet/workers_{}'.format(workers))(lambda workers=workers: setup(workers))
+
+
+@benchmark('snapshot/round_trip')
+def snapshot_round_trip():
+    vending_machine = VendingMachine(products=[], money_box=_money_box(2000))
+    for product_type, weight in PRODUCT_MIX:
+        vending_machine.inventory.add(product_type(), weight * 10)
+
+    def operation(i):
+        loads(dumps(vending_machine, seq=i))
+    return operation
+
+
+_register_change_benchmarks()
+_register_money_box_benchmarks()
+_register_decline_benchmarks()
+_register_fleet_benchmarks()
+
+
+def measure(name, operation, repeat):
+    """Time an operation, one call at a time, returning its throughput and latency percentiles."""
+    timer = time.perf_counter
+    latencies = []
+    for i in range(repeat):
+        start = timer()
+        operation(i)
+        latencies.append(timer() - start)
+
+    latencies.sort()
+    total = sum(latencies)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+    return Result(name, repeat / total if total else float('inf'), percentile(0.5), percentile(0.95), percentile(0.99))
+
+
+def run(pattern=None, repeat=2000):
+    """Run every benchmark whose name contains the pattern."""
+    results = []
+    for name, setup in BENCHMARKS:
+        if pattern and pattern not in name:
+            continue
+        operation = setup()
+        try:
+            results.append(measure(name, operation, repeat))
+        finally:
+            close = getattr(operation, 'close', None)
+            if close is not None:
+                close()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return the results whose throughput has fallen more than the tolerance below the baseline."""
+    regressions = []
+    for result in results:
+        expected = baseline.get(result.name)
+        if expected and result.ops_per_sec < expected['ops_per_sec'] * (1 - tolerance):
+            regressions.append((result, expected['ops_per_sec']))
+    return regressions
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    """Store results in the baseline file, keeping the entries of benchmarks that were not run."""
+    baseline = load_baseline(path)
+    baseline.update({r.name: r._asdict() for r in results})
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-k', dest='pattern', help='only run benchmarks whose name contains this')
+    parser.add_argument('--repeat', type=int, default=2000, help='calls timed per benchmark')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline file to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='fraction of baseline throughput that may be lost before failing')
+    args = parser.parse_args(argv)
+
+    results = run(args.pattern, args.repeat)
+    baseline = load_baseline(args.baseline)
+
+    print('{:<55} {:>12} {:>10} {:>10} {:>10} {:>9}'.format('benchmark', 'ops/sec', 'p50 us', 'p95 us', 'p99 us', 'baseline'))
+    for r in results:
+        expected = baseline.get(r.name)
+        relative = '{:+.0%}'.format(r.ops_per_sec / expected['ops_per_sec'] - 1) if expected else '-'
+        print('{:<55} {:>12.0f} {:>10.2f} {:>10.2f} {:>10.2f} {:>9}'.format(
+            r.name, r.ops_per_sec, r.p50 * 1e6, r.p95 * 1e6, r.p99 * 1e6, relative))
+
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for result, expected in regressions:
+        print('REGRESSION {}: {:.0f} ops/sec against a baseline of {:.0f}'.format(result.name, result.ops_per_sec, expected))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import json
+import threading
+from array import array
+
+from exceptions import InvalidProductType
+from products import Product
+from registry import types_by_name
+
+
+def product_type(sku, price):
+    """Return the product type of an SKU. An SKU without a class in products.py is given
+    one, created the first time it is seen, with the price as its default price."""
+    known = types_by_name(Product).get(sku)
+    if known is not None:
+        return known
+    return type(sku, (Product,), {'__slots__': (), 'price': price})
+
+
+def price_of(product_type, catalog=None):
+    """Return the price of a product type from the table a catalog has in effect now,
+    or None if it is not in the catalog. Without a catalog it is the price of the type."""
+    if catalog is None:
+        return product_type.price
+    table = catalog.table
+    return table.price(product_type) if product_type in table else None
+
+
+class PriceTable:
+    """The SKUs and prices of one version of a catalog.
+
+    Each SKU has an id, its position in the table, and prices are kept in a compact
+    array indexed by id. A table never changes once built.
+
+    Args:
+        - version: (int) version of the catalog the table was loaded from
+        - prices: a list of (product type, price) pairs
+    """
+
+    def __init__(self, version, prices):
+        self.version = version
+        self.product_types = tuple(t for t, _ in prices)
+        self.skus = tuple(t.__name__ for t in self.product_types)
+        self.prices = array('q', (p for _, p in prices))
+        self._ids = {t: i for i, t in enumerate(self.product_types)}
+
+    def __contains__(self, product_type):
+        return product_type in self._ids
+
+    def __len__(self):
+        return len(self.prices)
+
+    def sku_id(self, product_type):
+        """Return the id of a product type, raising if it is not in the catalog."""
+        try:
+            return self._ids[product_type]
+        except KeyError:
+            raise InvalidProductType("Product type is not in the catalog")
+
+    def price(self, product_type):
+        """Return the price of a product type, in pence."""
+        return self.prices[self.sku_id(product_type)]
+
+    def price_of(self, sku_id):
+        """Return the price of the SKU with an id, in pence."""
+        return self.prices[sku_id]
+
+    @classmethod
+    def from_dict(cls, data, version=0):
+        """Build a table from a dict holding a 'products' mapping of SKU to price and,
+        optionally, a 'version'."""
+        return cls(data.get('version', version),
+                   [(product_type(sku, price), price) for sku, price in data['products'].items()])
+
+
+class Catalog:
+    """A catalog of SKUs and prices loaded from a JSON data file such as
+
+        {"version": 3, "products": {"Candy": 10, "Coke": 30}}
+
+    The catalog can be reloaded while sales are in flight. A new price table is built
+    from the file and then replaces the current one in a single step, so a sale that
+    took the table before the reload keeps pricing from it, and one that starts after
+    sees the new prices. A file that cannot be read leaves the current table in place.
+
+    Args:
+        - path: the catalog data file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.table = None
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """Load the data file again, returning the new price table."""
+        with self._lock:
+            with open(self.path) as f:
+                data = json.load(f)
+            version = self.table.version + 1 if self.table is not None else 1
+            self.table = PriceTable.from_dict(data, version)
+            return self.table
+
+    def price(self, product_type):
+        """Return the current price of a product type, in pence."""
+        return self.table.price(product_type)
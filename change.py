@@ -1,7 +1,11 @@
-from typing import List
+from functools import lru_cache
+from typing import List, Optional, Tuple
 
 from exceptions import CalculateChangeError
 
+# Used as the cost of an amount that cannot be made from the available money.
+_UNREACHABLE = float('inf')
+
 
 def calculate_change(target: int, available: List[int]) -> List[int]:
     """A function to calculates the coins and notes to return given a certain amount.
@@ -11,38 +15,109 @@ def calculate_change(target: int, available: List[int]) -> List[int]:
         - available: (List[int]) of coins and notes that are available
 
     Returns:
-        - (List[int]) of coins and notes that match the target
+        - (List[int]) of coins and notes that match the target, largest first
     """
+    available_counts = {}
+    for a in available:
+        available_counts[a] = available_counts.get(a, 0) + 1
+
+    values = tuple(sorted(available_counts))
+    counts = tuple(available_counts[v] for v in values)
+
+    change = make_change(target, values, counts)
+
+    result = []
+    for value, count in zip(reversed(values), reversed(change)):
+        result.extend([value] * count)
+    return result
+
 
-    total_amount_available = sum(available)
+def make_change(target: int, values: Tuple[int, ...], counts: Tuple[int, ...],
+                weights: Optional[Tuple[int, ...]] = None) -> Tuple[int, ...]:
+    """Calculate how many of each denomination to give as change for a target amount.
 
+    Only the available number of each denomination can be used. Of all the ways of
+    making the target the one with the lowest total weight is chosen; by default every
+    coin and note weighs the same, giving the fewest coins. Ties are broken in favour of
+    the larger denominations. Results are cached on the target and the inventory.
+
+    Args:
+        - target: (int) total amount of change to return
+        - values: (Tuple[int]) value of each denomination, smallest first
+        - counts: (Tuple[int]) number available of each denomination
+        - weights: (Tuple[int]) optional cost of giving one of each denomination
+
+    Returns:
+        - (Tuple[int]) number of each denomination to give
+    """
     if target <= 0:
         raise CalculateChangeError('To calculate change requires the target amount to be positive.')
 
+    total_amount_available = sum(v * c for v, c in zip(values, counts))
     if total_amount_available < target:
-        raise CalculateChangeError("Amount available '{}' is not enough to give change for amount '{}'")
+        raise CalculateChangeError("Amount available '{}' is not enough to give change for amount '{}'".format(
+            total_amount_available, target))
 
-    if target in available:
-        return [target]
+    change = find_change(target, values, counts, weights)
+    if change is None:
+        raise CalculateChangeError('There is not enough change to match this amount')
+    return change
 
-    ordered_available = sorted(available, key=int, reverse=True)
 
-    result = []
-    rolling_target = target
-    rolling_available = ordered_available
-
-    for a in ordered_available:
-        if rolling_target in rolling_available:
-            result.append(rolling_target)
-            rolling_available.remove(rolling_target)
-            rolling_target -= rolling_target
-
-        elif rolling_target > a:
-            result.append(a)
-            rolling_available.remove(a)
-            rolling_target -= a
-        else:
-            raise CalculateChangeError('There is not enough change to match this amount')
-
-        if rolling_target == 0:
-            return sorted(result, key=int, reverse=True)
+def find_change(target: int, values: Tuple[int, ...], counts: Tuple[int, ...],
+                weights: Optional[Tuple[int, ...]] = None) -> Optional[Tuple[int, ...]]:
+    """Calculate change as make_change does, returning None rather than raising when the
+    target cannot be made. No change is needed for a target of zero.
+
+    Counts beyond what could ever be used for the target are capped before the cache is
+    consulted, so inventories that only differ in money too large to matter share an
+    entry.
+    """
+    if target == 0:
+        return (0,) * len(values)
+    if target < 0:
+        return None
+    if weights is None:
+        weights = (1,) * len(values)
+    usable = tuple(min(c, target // v) for v, c in zip(values, counts))
+    return _solve(target, values, usable, weights)
+
+
+@lru_cache(maxsize=4096)
+def _solve(target, values, counts, weights):
+    """Bounded coin change. For each denomination in turn a table of the lowest weight of
+    making every amount up to the target is built, using binary splitting of the count
+    so each table costs O(target * log(count)). The tables are then walked back from the
+    largest denomination, taking as many of each as still leaves an optimal remainder."""
+    tables = [[0] + [_UNREACHABLE] * target]
+
+    for value, count, weight in zip(values, counts, weights):
+        table = list(tables[-1])
+        remaining = count
+        part = 1
+        while remaining > 0:
+            take = min(part, remaining)
+            step, cost = take * value, take * weight
+            for amount in range(target, step - 1, -1):
+                candidate = table[amount - step] + cost
+                if candidate < table[amount]:
+                    table[amount] = candidate
+            remaining -= take
+            part *= 2
+        tables.append(table)
+
+    if tables[-1][target] == _UNREACHABLE:
+        return None
+
+    change = [0] * len(values)
+    amount = target
+    for i in range(len(values) - 1, -1, -1):
+        value, weight = values[i], weights[i]
+        best, previous = tables[i + 1][amount], tables[i]
+        for k in range(min(counts[i], amount // value), -1, -1):
+            if previous[amount - k * value] + k * weight == best:
+                change[i] = k
+                amount -= k * value
+                break
+
+    return tuple(change)
@@ -20,3 +20,7 @@ class CalculateChangeError(Exception):
 
 class InsufficientFundsForPurchase(Exception):
     pass
+
+
+class InvalidProductType(Exception):
+    pass
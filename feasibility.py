@@ -0,0 +1,138 @@
+from catalog import price_of
+from money import TwentyFiveCent, OneDollarBill, TwoDollarBill
+
+# The tenders customers most often pay with.
+COMMON_TENDERS = (TwentyFiveCent, OneDollarBill, TwoDollarBill)
+
+
+class FeasibilityIndex:
+    """Which products a vending machine can currently sell for which tenders.
+
+    For every product type and every tender worth at least its price the index keeps
+    whether the machine could give the change. The index listens to the vending
+    machine and, after each change, only looks again at the change amounts that
+    could use a denomination whose count changed: change smaller than every changed
+    denomination cannot be affected. Amounts shared by several pairs are worked out
+    once.
+
+    The vending machine asks for exact change only while some product in stock cannot
+    be bought with a tender worth more than its price.
+
+    Products are priced from a catalog when one is given. When the catalog is reloaded
+    the index is built again the next time it is asked about, and a product type not
+    in the catalog cannot be sold for any tender.
+
+    Args:
+        - vending_machine: the vending machine to follow
+        - product_types: the product types to index; by default those the machine
+          has stocked
+        - tenders: the money types customers pay with, one coin or note at a time
+        - catalog: a Catalog to price products from, if any; without one products are
+          priced at the price of their type
+    """
+
+    def __init__(self, vending_machine, product_types=None, tenders=COMMON_TENDERS, catalog=None):
+        self.vending_machine = vending_machine
+        self.tenders = tuple(tenders)
+        self.catalog = catalog
+        self._product_types = product_types
+        self._build()
+        vending_machine.add_listener(self.update)
+
+    def _build(self):
+        self._table = self.catalog.table if self.catalog is not None else None
+        self._prices = {}
+        self._pairs_by_amount = {}
+        self._feasible = {}
+        self._feasible_tenders = {}
+        self._in_stock = {}
+        self._missing_change = 0
+
+        for product_type in (self._product_types or list(self.vending_machine.inventory.product_types)):
+            self._add_product_type(product_type)
+
+    def _check_prices(self):
+        """Build the index again if the catalog has been reloaded since it was built."""
+        if self.catalog is not None and self.catalog.table is not self._table:
+            self._build()
+
+    @property
+    def exact_change_only(self):
+        """Whether some product in stock cannot be bought with a tender that needs change."""
+        self._check_prices()
+        return self._missing_change > 0
+
+    def sellable(self, product_type):
+        """Whether a product is in stock and can be bought with at least one tender."""
+        self._check_prices()
+        return self._in_stock.get(product_type, False) and self._feasible_tenders.get(product_type, 0) > 0
+
+    def sellable_products(self):
+        """Return the set of product types that can currently be sold."""
+        self._check_prices()
+        return {p for p in self._in_stock if self.sellable(p)}
+
+    def tenders_for(self, product_type):
+        """Return the tenders a product could currently be bought with."""
+        self._check_prices()
+        if not self._in_stock.get(product_type, False):
+            return []
+        return [t for t in self.tenders if self._feasible.get((product_type, t), False)]
+
+    def update(self, delta):
+        """Bring the index up to date after a change to the vending machine."""
+        for product_type, _ in delta.product_delta:
+            if product_type not in self._in_stock:
+                self._add_product_type(product_type)
+            self._set_in_stock(product_type, product_type in self.vending_machine.inventory)
+
+        ledger = self.vending_machine.money_box.ledger
+        changed = [v for v, d in zip(ledger.values, delta.money_delta) if d]
+        if changed:
+            self._refresh(min_value=min(changed))
+
+    def _add_product_type(self, product_type):
+        accepted = set(self.vending_machine.money_box.ledger.denominations)
+        price = price_of(product_type, self.catalog)
+        self._prices[product_type] = price
+        self._in_stock[product_type] = False
+        self._feasible_tenders[product_type] = 0
+
+        amounts = set()
+        for tender in self.tenders:
+            if price is None or tender not in accepted or tender.value < price:
+                continue
+            pair = (product_type, tender)
+            self._feasible[pair] = False
+            self._pairs_by_amount.setdefault(tender.value - price, []).append(pair)
+            amounts.add(tender.value - price)
+
+        self._set_in_stock(product_type, product_type in self.vending_machine.inventory)
+        for amount in amounts:
+            self._refresh_amount(amount)
+
+    def _refresh(self, min_value):
+        for amount in self._pairs_by_amount:
+            if amount >= min_value:
+                self._refresh_amount(amount)
+
+    def _refresh_amount(self, amount):
+        feasible = self.vending_machine.money_box.change_counts(amount) is not None
+
+        for pair in self._pairs_by_amount[amount]:
+            if self._feasible[pair] == feasible:
+                continue
+            self._feasible[pair] = feasible
+            product_type = pair[0]
+            self._feasible_tenders[product_type] += 1 if feasible else -1
+            if amount > 0 and self._in_stock[product_type]:
+                self._missing_change += -1 if feasible else 1
+
+    def _set_in_stock(self, product_type, in_stock):
+        if self._in_stock[product_type] == in_stock:
+            return
+        self._in_stock[product_type] = in_stock
+
+        missing = sum(1 for t in self.tenders
+                      if self._feasible.get((product_type, t)) is False and t.value > self._prices[product_type])
+        self._missing_change += missing if in_stock else -missing
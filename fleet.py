@@ -0,0 +1,179 @@
+import multiprocessing
+import zlib
+from collections import Counter, namedtuple
+
+from machine import MoneyBox, VendingMachine
+from transaction import VendingAction
+
+# Totals across the fleet: the number of machines, the stock of each product type and
+# the count of each money type, keyed by name, and the cash held in pence.
+FleetSummary = namedtuple('FleetSummary', ['machines', 'stock', 'coins', 'cash'])
+
+
+def _serve(conn):
+    """Run a shard: keep its vending machines and answer batches of commands until told
+    to stop."""
+    vending_actions = {}
+
+    def add_machines(machines):
+        for machine_id, products, money_store, valid_money in machines:
+            money_box = MoneyBox(money_store=money_store, valid_money=valid_money)
+            vending_actions[machine_id] = VendingAction(VendingMachine(products=products, money_box=money_box))
+
+    def purchase(orders):
+        by_machine = {}
+        for i, (machine_id, product, money_objects) in enumerate(orders):
+            by_machine.setdefault(machine_id, []).append((i, product, money_objects))
+
+        results = [None] * len(orders)
+        for machine_id, machine_orders in by_machine.items():
+            stream = vending_actions[machine_id].purchase_many((p, m) for _, p, m in machine_orders)
+            for (i, _, _), result in zip(machine_orders, stream):
+                results[i] = result
+        return results
+
+    def restock(restocks):
+        for machine_id, products, money_objects in restocks:
+            vending_actions[machine_id].restock(products, money_objects)
+
+    def summary(_):
+        stock, coins, cash = Counter(), Counter(), 0
+        for vending_action in vending_actions.values():
+            vending_machine = vending_action.vending_machine
+            ledger = vending_machine.money_box.ledger
+            inventory = vending_machine.inventory
+            stock.update({t.__name__: c for t, c in zip(inventory.product_types, inventory.counts)})
+            coins.update({d.__name__: c for d, c in zip(ledger.denominations, ledger.counts)})
+            cash += ledger.balance
+        return FleetSummary(len(vending_actions), stock, coins, cash)
+
+    commands = {'add_machines': add_machines, 'purchase': purchase, 'restock': restock, 'summary': summary}
+    while True:
+        command, payload = conn.recv()
+        if command == 'stop':
+            conn.close()
+            return
+        try:
+            conn.send((True, commands[command](payload)))
+        except Exception as e:
+            conn.send((False, e))
+
+
+class FleetManager:
+    """Runs a fleet of vending machines sharded across worker processes.
+
+    Each vending machine belongs to the shard picked by a hash of its id, and only that
+    shard's process ever touches it, so the shards never need to lock against each
+    other. Commands are sent in batches: a batch is split by shard, every shard is sent
+    its part before any answer is awaited, and the answers are put back in the order of
+    the batch. Fleet-wide totals are gathered the same way, each shard summing its own
+    machines.
+
+    Args:
+        - workers: (int) shards, each served by its own process
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or multiprocessing.cpu_count()
+        self._shards = {}
+        self._connections = []
+        self._processes = []
+        for _ in range(self.workers):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_serve, args=(child,), daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def shard(self, machine_id):
+        """Return the shard owning a vending machine."""
+        shard = self._shards.get(machine_id)
+        if shard is None:
+            shard = self._shards[machine_id] = zlib.crc32(str(machine_id).encode()) % self.workers
+        return shard
+
+    def add_machines(self, machines):
+        """Create vending machines in their shards.
+
+        Args:
+            - machines: an iterable of (machine id, products, money store, valid money),
+              as taken by VendingMachine and MoneyBox
+        """
+        self._scatter('add_machines', machines)
+
+    def purchase(self, orders):
+        """Purchase products across the fleet. Orders for the same vending machine are
+        made in the order given.
+
+        Args:
+            - orders: an iterable of (machine id, product, money objects)
+
+        Returns:
+            - (list) of OrderResult, one for each order, in order
+        """
+        return self._scatter('purchase', orders, ordered=True)
+
+    def restock(self, restocks):
+        """Add products and money to vending machines across the fleet.
+
+        Args:
+            - restocks: an iterable of (machine id, products, money objects)
+        """
+        self._scatter('restock', restocks)
+
+    def summary(self):
+        """Return the FleetSummary of every shard added together."""
+        for conn in self._connections:
+            conn.send(('summary', None))
+        machines, stock, coins, cash = 0, Counter(), Counter(), 0
+        for part in self._gather(range(self.workers)):
+            machines += part.machines
+            stock.update(part.stock)
+            coins.update(part.coins)
+            cash += part.cash
+        return FleetSummary(machines, stock, coins, cash)
+
+    def close(self):
+        """Stop the worker processes."""
+        for conn, process in zip(self._connections, self._processes):
+            conn.send(('stop', None))
+            process.join()
+            conn.close()
+        self._connections, self._processes = [], []
+
+    def _scatter(self, command, items, ordered=False):
+        batches = [[] for _ in range(self.workers)]
+        positions = [[] for _ in range(self.workers)]
+        for i, item in enumerate(items):
+            shard = self.shard(item[0])
+            batches[shard].append(item)
+            positions[shard].append(i)
+
+        shards = [s for s in range(self.workers) if batches[s]]
+        for s in shards:
+            self._connections[s].send((command, batches[s]))
+        answers = self._gather(shards)
+
+        if not ordered:
+            return None
+        results = [None] * sum(len(p) for p in positions)
+        for s, answer in zip(shards, answers):
+            for i, result in zip(positions[s], answer):
+                results[i] = result
+        return results
+
+    def _gather(self, shards):
+        # every shard is read before raising, so none is left with an unread answer
+        answers = [self._connections[s].recv() for s in shards]
+        for ok, answer in answers:
+            if not ok:
+                raise answer
+        return [answer for _, answer in answers]
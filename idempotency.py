@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class IdempotencyCache:
+    """Remembers the results of completed commands by idempotency key, so a command sent
+    again, such as a purchase retried after a timeout, is answered with its first result
+    instead of being carried out twice.
+
+    Results are kept for ttl seconds after their command completes, and at most
+    max_entries of them are kept, the least recently used being evicted first. A
+    command sent again while the first is still running waits for it to complete. A
+    command that raises is not remembered, so it can be retried.
+
+    Attributes:
+        - hits: commands answered with a remembered result
+        - misses: commands carried out
+        - evictions: results dropped because they expired or the cache was full
+
+    Args:
+        - max_entries: (int) most results to keep
+        - ttl: (float) seconds to keep a result for
+        - clock: returns the time now, in seconds
+    """
+
+    def __init__(self, max_entries=10000, ttl=600.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._results = OrderedDict()
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._results)
+
+    def run(self, key, command, *args):
+        """Return the remembered result of the command sent with a key, or carry the
+        command out with the given arguments and remember its result."""
+        while True:
+            with self._lock:
+                now = self.clock()
+                entry = self._results.get(key)
+                if entry is not None:
+                    if entry[0] > now:
+                        self._results.move_to_end(key)
+                        self.hits += 1
+                        return entry[1]
+                    del self._results[key]
+                    self.evictions += 1
+
+                running = self._running.get(key)
+                if running is None:
+                    running = self._running[key] = threading.Event()
+                    self.misses += 1
+                    break
+            running.wait()
+
+        try:
+            result = command(*args)
+        except BaseException:
+            with self._lock:
+                del self._running[key]
+            running.set()
+            raise
+
+        with self._lock:
+            del self._running[key]
+            self._results[key] = (self.clock() + self.ttl, result)
+            self._evict()
+        running.set()
+        return result
+
+    def stats(self):
+        """Return the hits, misses and evictions so far, and the results held."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self._results)}
+
+    def _evict(self):
+        results = self._results
+        while len(results) > self.max_entries:
+            results.popitem(last=False)
+            self.evictions += 1
+
+        # results are only checked for expiry from the least recently used end, so
+        # expired ones behind a recently used one wait until they are looked up
+        now = self.clock()
+        while results and next(iter(results.values()))[0] <= now:
+            results.popitem(last=False)
+            self.evictions += 1
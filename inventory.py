@@ -0,0 +1,81 @@
+from array import array
+
+from exceptions import NoStockException
+
+
+class Inventory:
+    """An inventory keeps a stock level for each type of product rather than a list of every product.
+
+    Each product type is given a slot the first time it is seen, and its stock level is
+    kept in a compact array indexed by that slot. Checking, adding and removing stock
+    are all constant time.
+
+    Args:
+        - products: the products initially in stock
+    """
+
+    def __init__(self, products=()):
+        self.product_types = []
+        self._index = {}
+        self._samples = []
+        self._counts = array('q')
+
+        for p in products:
+            self.add(p)
+
+    def __contains__(self, product_type):
+        i = self._index.get(product_type)
+        return i is not None and self._counts[i] > 0
+
+    def __len__(self):
+        """The number of products in stock."""
+        return sum(self._counts)
+
+    def slot(self, product_type):
+        """Return the slot of a product type, or None if it has never been stocked."""
+        return self._index.get(product_type)
+
+    def count(self, product_type):
+        """Return the stock level of a product type."""
+        i = self._index.get(product_type)
+        return 0 if i is None else self._counts[i]
+
+    @property
+    def counts(self):
+        """Return a snapshot of the stock level of every product type, by slot."""
+        return tuple(self._counts)
+
+    def in_stock(self):
+        """Return a set of the product types that are in stock."""
+        return {t for t, c in zip(self.product_types, self._counts) if c > 0}
+
+    def add(self, product, count=1):
+        """Add a number of products of the same type as a product."""
+        i = self._index.get(product.__class__)
+        if i is None:
+            i = len(self.product_types)
+            self._index[product.__class__] = i
+            self.product_types.append(product.__class__)
+            self._samples.append(product)
+            self._counts.append(0)
+
+        self._counts[i] += count
+
+    def remove(self, product_type, count=1):
+        """Remove a number of products of a product type."""
+        i = self._index.get(product_type)
+        if i is None or self._counts[i] < count:
+            raise NoStockException("Stock has run out")
+
+        self._counts[i] -= count
+
+    def get(self, product_type):
+        """Return a product of a product type, or None if it is not in stock."""
+        i = self._index.get(product_type)
+        if i is None or self._counts[i] == 0:
+            return None
+        return self._samples[i]
+
+    def products(self):
+        """Return a list of the products in stock, grouped by product type."""
+        return [s for s, c in zip(self._samples, self._counts) for _ in range(c)]
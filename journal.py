@@ -0,0 +1,188 @@
+import json
+import os
+import threading
+import time
+
+from machine import MoneyBox, VendingMachine
+from money import BaseMoney
+from products import Product
+from registry import types_by_name
+
+SNAPSHOT_FILE = 'snapshot.json'
+JOURNAL_FILE = 'journal.log'
+
+
+class Journal:
+    """An append-only journal of the changes applied to a vending machine.
+
+    Every sale, restock and adjustment of the vending machine is written to the
+    journal as a record of the change it made. Records are written in groups: the
+    journal is only flushed and synced to disk once a number of records are waiting or
+    once some time has passed since the last sync, so many sales share the cost of a
+    sync. A background thread syncs records left waiting after a burst, so none waits
+    much longer than the group interval, and close syncs the rest. Records still
+    waiting when the process stops without closing the journal are lost.
+
+    Every so often a snapshot of the whole vending machine is written and the journal
+    is started again, so recovering only loads the latest snapshot and replays the
+    records written since.
+
+    Args:
+        - directory: where the snapshot and journal files are kept
+        - group_size: (int) records to collect before syncing
+        - group_interval: (float) most seconds a record waits to be synced
+        - snapshot_interval: (int) records between snapshots
+    """
+
+    def __init__(self, directory, group_size=64, group_interval=0.05, snapshot_interval=10000):
+        self.directory = directory
+        self.group_size = group_size
+        self.group_interval = group_interval
+        self.snapshot_interval = snapshot_interval
+        self.vending_machine = None
+        self.seq = 0
+        self._pending = []
+        self._last_sync = time.monotonic()
+        self._since_snapshot = 0
+        self._file = None
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher = None
+
+    @property
+    def snapshot_path(self):
+        return os.path.join(self.directory, SNAPSHOT_FILE)
+
+    @property
+    def journal_path(self):
+        return os.path.join(self.directory, JOURNAL_FILE)
+
+    def attach(self, vending_machine):
+        """Start journaling a vending machine, beginning with a snapshot of it."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.vending_machine = vending_machine
+        self._file = open(self.journal_path, 'ab')
+        self.snapshot()
+        vending_machine.add_listener(self.append)
+        self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flusher.start()
+
+    def append(self, delta):
+        """Add a record of a change to the journal."""
+        with self._lock:
+            self.seq += 1
+            record = {
+                'seq': self.seq,
+                'kind': delta.kind,
+                'products': {t.__name__: c for t, c in delta.product_delta},
+                'money': list(delta.money_delta),
+            }
+            self._pending.append(json.dumps(record, separators=(',', ':')).encode() + b'\n')
+            self._since_snapshot += 1
+
+            if len(self._pending) >= self.group_size or \
+                    time.monotonic() - self._last_sync >= self.group_interval:
+                self._sync()
+
+            if self._since_snapshot >= self.snapshot_interval:
+                self._snapshot()
+
+    def flush(self):
+        """Write and sync every waiting record."""
+        with self._lock:
+            self._sync()
+
+    def snapshot(self):
+        """Write a snapshot of the vending machine and start the journal again."""
+        # the money box lock is held while changes are applied and journaled, so the
+        # snapshot never holds a change whose record is not yet written
+        with self.vending_machine._money_lock, self._lock:
+            self._snapshot()
+
+    def close(self):
+        """Sync every waiting record and stop journaling."""
+        self.vending_machine.remove_listener(self.append)
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._lock:
+            self._sync()
+            self._file.close()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.group_interval):
+            with self._lock:
+                if self._pending and time.monotonic() - self._last_sync >= self.group_interval:
+                    self._sync()
+
+    def _sync(self):
+        if self._pending:
+            self._file.write(b''.join(self._pending))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = []
+        self._last_sync = time.monotonic()
+
+    def _snapshot(self):
+        # records up to the snapshot are synced first, so the journal never lags it
+        self._sync()
+        ledger = self.vending_machine.money_box.ledger
+        inventory = self.vending_machine.inventory
+        state = {
+            'seq': self.seq,
+            'money': {d.__name__: c for d, c in zip(ledger.denominations, ledger.counts)},
+            'products': {t.__name__: c for t, c in zip(inventory.product_types, inventory.counts)},
+        }
+
+        temporary_path = self.snapshot_path + '.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_path, self.snapshot_path)
+
+        self._file.truncate(0)
+        self._since_snapshot = 0
+
+    @classmethod
+    def recover(cls, directory, concurrent=False):
+        """Rebuild a vending machine from the latest snapshot and the journal written
+        after it.
+
+        Returns:
+            - (VendingMachine) as it was when the last synced record was written
+        """
+        money_types = types_by_name(BaseMoney)
+        product_types = types_by_name(Product)
+
+        with open(os.path.join(directory, SNAPSHOT_FILE)) as f:
+            state = json.load(f)
+
+        money_box = MoneyBox(money_store=[], valid_money=[money_types[n] for n in state['money']])
+        vending_machine = VendingMachine(products=[], money_box=money_box, concurrent=concurrent)
+
+        ledger = money_box.ledger
+        ledger.apply([state['money'][d.__name__] for d in ledger.denominations])
+        for name, count in state['products'].items():
+            vending_machine.inventory.add(product_types[name](), count)
+
+        journal_path = os.path.join(directory, JOURNAL_FILE)
+        if os.path.exists(journal_path):
+            with open(journal_path, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # a record cut short by a crash ends the journal
+                        break
+                    if record['seq'] <= state['seq']:
+                        continue
+
+                    ledger.apply(record['money'])
+                    for name, count in record['products'].items():
+                        if count > 0:
+                            vending_machine.inventory.add(product_types[name](), count)
+                        else:
+                            vending_machine.inventory.remove(product_types[name], -count)
+
+        return vending_machine
@@ -0,0 +1,119 @@
+from array import array
+
+from exceptions import InvalidMoneyTypes, MoneyTypeNotInStock
+
+
+class Ledger:
+    """A ledger holds a count of each money type rather than the money objects themselves.
+
+    Counts are stored in a compact array with one slot per denomination, ordered by
+    value from the smallest to the largest. Adding, removing, checking the presence of
+    a money type and reading the balance are all constant time.
+
+    Every change to the ledger increases its version, so a reader can tell whether the
+    counts it planned against are still current. Each denomination also has a stamp
+    that only increases when its own count changes.
+
+    Args:
+        - denominations: the valid money types (classes) the ledger can hold
+    """
+
+    def __init__(self, denominations):
+        self.denominations = tuple(sorted(set(denominations), key=lambda d: d.value))
+        self.values = tuple(d.value for d in self.denominations)
+        self._index = {d: i for i, d in enumerate(self.denominations)}
+        self._counts = array('q', [0] * len(self.denominations))
+        self._stamps = array('q', [0] * len(self.denominations))
+        self._balance = 0
+        self.version = 0
+
+    def __contains__(self, money_type):
+        i = self._index.get(money_type)
+        return i is not None and self._counts[i] > 0
+
+    def __len__(self):
+        """The number of coins and notes in the ledger."""
+        return sum(self._counts)
+
+    def index(self, money_type):
+        """Return the slot of a money type, raising if the ledger does not accept it."""
+        try:
+            return self._index[money_type]
+        except KeyError:
+            raise InvalidMoneyTypes("Money type not allowed in money box")
+
+    def count(self, money_type):
+        """Return how many of a money type are held."""
+        i = self._index.get(money_type)
+        return 0 if i is None else self._counts[i]
+
+    @property
+    def counts(self):
+        """Return a snapshot of the count held of every denomination."""
+        return tuple(self._counts)
+
+    def stamps(self, n):
+        """Return the stamps of the n smallest denominations."""
+        return tuple(self._stamps[:n])
+
+    @property
+    def balance(self):
+        """Return the total value of the money held, in pence."""
+        return self._balance
+
+    def add(self, money_type, count=1):
+        """Add a number of coins or notes of a money type."""
+        i = self.index(money_type)
+        self._counts[i] += count
+        self._balance += self.values[i] * count
+        self._stamps[i] += 1
+        self.version += 1
+
+    def remove(self, money_type, count=1):
+        """Remove a number of coins or notes of a money type."""
+        i = self._index.get(money_type)
+        if i is None or self._counts[i] < count:
+            raise MoneyTypeNotInStock("There are no coins or notes of this amount in the machine")
+
+        self._counts[i] -= count
+        self._balance -= self.values[i] * count
+        self._stamps[i] += 1
+        self.version += 1
+
+    def tally(self, money_objects):
+        """Return a vector of counts per denomination for a list of money objects."""
+        counts = self.try_tally(money_objects)
+        if counts is None:
+            raise InvalidMoneyTypes("Money type not allowed in money box")
+        return counts
+
+    def try_tally(self, money_objects):
+        """Return a vector of counts per denomination for a list of money objects, or
+        None if the ledger does not accept one of them."""
+        index = self._index
+        counts = [0] * len(self.denominations)
+        for m in money_objects:
+            i = index.get(m.__class__)
+            if i is None:
+                return None
+            counts[i] += 1
+        return counts
+
+    def apply(self, delta):
+        """Apply a vector of count changes to every denomination at once. Either the
+        whole delta is applied or, when any count would become negative, none of it."""
+        counts = self._counts
+        for i, d in enumerate(delta):
+            if counts[i] + d < 0:
+                raise MoneyTypeNotInStock("There are no coins or notes of this amount in the machine")
+
+        for i, d in enumerate(delta):
+            if d:
+                counts[i] += d
+                self._balance += self.values[i] * d
+                self._stamps[i] += 1
+        self.version += 1
+
+    def money_objects(self):
+        """Return a list of money objects matching the contents of the ledger."""
+        return [d() for d, c in zip(self.denominations, self._counts) for _ in range(c)]
@@ -1,97 +1,315 @@
-from change import calculate_change
-from exceptions import NoStockException, InvalidMoneyTypes, MoneyTypeNotInStock, InvalidMoneyBox
+import logging
+import threading
+from collections import Counter, namedtuple
+from contextlib import ExitStack
+
+from exceptions import NoStockException, InvalidMoneyTypes, MoneyTypeNotInStock, InvalidMoneyBox, CalculateChangeError
+from inventory import Inventory
+from ledger import Ledger
+from policies import FewestCoins, Greedy
+
+logger = logging.getLogger(__name__)
+
+# A change applied to a vending machine: the kind of change, a tuple of
+# (product type, change in stock) pairs and the change in the count of each
+# denomination in the money box.
+Delta = namedtuple('Delta', ['kind', 'product_delta', 'money_delta'])
+
+
+class _NoLock:
+    """Stands in for a lock when a vending machine is only used from one thread."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
 
 
 class VendingMachine:
     """A vending machine object holds products and accepts different
     types of money. The vending machine tracks how many of each type of product
-    is inside it. Each vending machine must have a money_box declared."""
+    is inside it. Each vending machine must have a money_box declared.
+
+    A vending machine created with concurrent=True can be shared between threads. The
+    stock of each product type has its own lock and the money box has another, so
+    purchases of different products only wait on each other while money is moved.
+
+    Listeners are called with a Delta after every change to the stock or the money box,
+    while the money box lock is held, so they see the changes in the order they were
+    applied. A listener that raises is logged and does not undo the change."""
 
-    def __init__(self, products, money_box):
-        self.products = products
+    def __init__(self, products, money_box, concurrent=False):
+        self.inventory = Inventory(products)
         self.money_box = money_box
+        self.concurrent = concurrent
+        self.listeners = []
 
         if not isinstance(self.money_box, MoneyBox):
             raise InvalidMoneyBox("A avalid money box has not been declared")
 
+        if concurrent:
+            self._money_lock = threading.Lock()
+            self._product_locks = {}
+            self._product_locks_lock = threading.Lock()
+        else:
+            self._money_lock = _NoLock()
+
+    def _product_lock(self, product_type):
+        """Return the lock guarding the stock of a product type."""
+        if not self.concurrent:
+            return self._money_lock
+
+        lock = self._product_locks.get(product_type)
+        if lock is None:
+            with self._product_locks_lock:
+                lock = self._product_locks.setdefault(product_type, threading.Lock())
+        return lock
+
+    def add_listener(self, listener):
+        """Call a listener with a Delta every time the stock or the money box changes."""
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Stop calling a listener added with add_listener."""
+        # taken so a change being told to the listeners finishes first
+        with self._money_lock:
+            self.listeners.remove(listener)
+
+    def _notify(self, kind, product_delta, money_delta):
+        if self.listeners:
+            delta = Delta(kind, product_delta, money_delta)
+            for listener in self.listeners:
+                # the change is already applied, so a failing listener must not make it
+                # look as if it was not
+                try:
+                    listener(delta)
+                except Exception:
+                    logger.exception("Vending machine listener %r failed", listener)
+
+    def _notify_money(self, money_type, count):
+        """Tell the listeners about a change in the count of one money type."""
+        if self.listeners:
+            money_delta = [0] * len(self.money_box.ledger.denominations)
+            money_delta[self.money_box.ledger.index(money_type)] = count
+            self._notify('adjust', (), tuple(money_delta))
+
+    def _notify_product(self, product_type, count):
+        """Tell the listeners about a change in the stock of one product type. The money
+        box lock must be held."""
+        if self.listeners:
+            self._notify('adjust', ((product_type, count),), (0,) * len(self.money_box.ledger.denominations))
+
+    @property
+    def products(self):
+        """Return a list of the products in the vending machine."""
+        return self.inventory.products()
+
+    def _add_product_type(self, product):
+        """Give a product's type a slot in the inventory if it does not have one."""
+        if self.concurrent and self.inventory.slot(product.__class__) is None:
+            # a new product type changes the layout of the inventory
+            with self._product_locks_lock:
+                self.inventory.add(product, 0)
+
     def add_product(self, product):
         """A product is added to the vending machine."""
-        self.products.append(product)
+        self._add_product_type(product)
+        # the stock is changed under the money box lock too, so a listener never sees
+        # stock whose change it has not been told about yet
+        with self._product_lock(product.__class__), self._money_lock:
+            self.inventory.add(product)
+            self._notify_product(product.__class__, 1)
+
+    def restock(self, products, money_objects=()):
+        """Add products and money to the vending machine as a single change. The money
+        is checked before anything is added, and each product type's stock is added to
+        once, however many of it are loaded."""
+        ledger = self.money_box.ledger
+        money_delta = [0] * len(ledger.denominations)
+        for money_type, count in Counter(map(type, money_objects)).items():
+            money_delta[ledger.index(money_type)] = count
+        money_delta = tuple(money_delta)
+
+        products = list(products)
+        product_delta = Counter(map(type, products))
+        samples = dict(zip(map(type, products), products))
+        for p in samples.values():
+            self._add_product_type(p)
+
+        with ExitStack() as stack:
+            if self.concurrent:
+                # always take the product locks in slot order so restocks cannot deadlock
+                for product_type in sorted(product_delta, key=self.inventory.slot):
+                    stack.enter_context(self._product_lock(product_type))
+
+            with self._money_lock:
+                ledger.apply(money_delta)
+                for product_type, count in product_delta.items():
+                    self.inventory.add(samples[product_type], count)
+                self._notify('restock', tuple(product_delta.items()), money_delta)
+
+    def collect(self, amount=None, counts=None):
+        """Take money out of the money box as a single change, either a number of coins
+        and notes of each money type or an amount. An amount is made up from the largest
+        money types first, and only under the dispensing policy when that cannot make
+        it. Either all of it is taken or, if the money box does not hold it, none.
+
+        Args:
+            - amount: the amount to take, in pence
+            - counts: a mapping of money type to the number to take
+
+        Returns:
+            - the count of each denomination taken
+        """
+        if (amount is None) == (counts is None):
+            raise ValueError("Either an amount or counts must be given")
+
+        ledger = self.money_box.ledger
+        with self._money_lock:
+            if counts is None:
+                taken = None
+                if amount > 0:
+                    # the policy may build tables as large as the amount while every sale
+                    # waits on the lock, so it is only asked when the greedy pass fails
+                    taken = Greedy().change(amount, ledger.values, ledger.counts)
+                if taken is None:
+                    taken = self.money_box.change_counts(amount)
+                if taken is None:
+                    raise CalculateChangeError('There is not enough change to match this amount')
+            else:
+                taken = [0] * len(ledger.denominations)
+                for money_type, count in counts.items():
+                    if count < 0:
+                        raise ValueError("Counts to collect cannot be negative")
+                    if count:
+                        if ledger.count(money_type) < count:
+                            raise MoneyTypeNotInStock("There are no coins or notes of this amount in the machine")
+                        taken[ledger.index(money_type)] = count
+                taken = tuple(taken)
+
+            money_delta = tuple(-c for c in taken)
+            ledger.apply(money_delta)
+            self._notify('collect', (), money_delta)
+        return taken
 
     def remove_product(self, product):
         """A product is removed from the vending machine."""
-        if not type(product) in self.product_types():
-            raise NoStockException("Stock has run out")
+        with self._product_lock(type(product)), self._money_lock:
+            self.inventory.remove(type(product))
+            self._notify_product(type(product), -1)
+
+    def commit(self, product_type, money_delta, version=None, stamps=None):
+        """Apply a planned sale to the vending machine in one step: a product of a type
+        is removed and the count of each denomination in the money box is changed. If
+        either cannot be applied the vending machine is left untouched.
 
-        product_to_remove = self.get_product_of_type(type(product))
-        self.products.remove(product_to_remove)
+        Args:
+            - product_type: the type of product sold
+            - money_delta: the change in the count of each denomination in the money box
+            - version: the ledger version the sale was planned against, if any
+            - stamps: the stamps of the smallest denominations, the ones the sale's
+              change was planned from, if any
+
+        Returns:
+            - (bool) False, without applying anything, if the money box has changed
+              since the given version, or the count of one of the given denominations
+              has changed since its stamp
+        """
+        with self._product_lock(product_type):
+            if product_type not in self.inventory:
+                raise NoStockException("Stock has run out")
+
+            with self._money_lock:
+                ledger = self.money_box.ledger
+                if version is not None and version != ledger.version:
+                    return False
+                if stamps is not None and ledger.stamps(len(stamps)) != stamps:
+                    return False
+                ledger.apply(money_delta)
+                self.inventory.remove(product_type)
+                self._notify('purchase', ((product_type, -1),), money_delta)
+
+        return True
 
     def add_to_money_stock(self, money_type):
         """Instruct the money box to add new money amount."""
         try:
-            self.money_box.add_to_money_store(money_type)
+            with self._money_lock:
+                self.money_box.add_to_money_store(money_type)
+                self._notify_money(money_type.__class__, 1)
         except InvalidMoneyTypes as e:
             raise e
 
     def remove_from_money_stock(self, money_type):
         """Instruct the money box to remove money amount."""
         try:
-            self.money_box.remove_from_money_store(money_type)
+            with self._money_lock:
+                self.money_box.remove_from_money_store(money_type)
+                self._notify_money(money_type.__class__, -1)
         except MoneyTypeNotInStock as e:
             raise e
 
     def product_types(self):
         """Return all the product types in the vending machine"""
-        return set(p.__class__ for p in self.products)
+        return self.inventory.in_stock()
+
+    def stock_level(self, product_type):
+        """Return how many products of a particular type are in the vending machine."""
+        return self.inventory.count(product_type)
 
     def get_product_of_type(self, product_type):
-        """Get a product of a particular type from a list of products."""
-        for p in self.products:
-            if p.__class__ is product_type:
-                return p
+        """Get a product of a particular type from the vending machine."""
+        return self.inventory.get(product_type)
 
 
 class MoneyBox:
     """A money box is a container that holds money. It knows about the money inside it, is able to add or remove money
-    to itself. It only accepts the predefined valid money types."""
+    to itself. It only accepts the predefined valid money types.
 
-    def __init__(self, money_store, valid_money):
-        self.money_store = money_store
+    The money inside the box is kept in a ledger as a count per money type, so adding and removing money does not
+    depend on how much money the box holds. Which money is given as change is decided by the money box's dispensing
+    policy, by default the fewest coins and notes."""
+
+    def __init__(self, money_store, valid_money, policy=None):
         self.valid_money = valid_money
+        self.policy = policy if policy is not None else FewestCoins()
+        self._valid_money_types = frozenset(valid_money)
         self._check_money_is_valid(money_store)
+        self.ledger = Ledger(valid_money)
+        self.ledger.apply(self.ledger.tally(money_store))
+
+    @property
+    def money_store(self):
+        """Return a list of the money objects within the money box, smallest first."""
+        return self.ledger.money_objects()
 
     @property
     def valid_money_types(self):
         """Return a set of valid money types"""
-        return {m for m in self.valid_money}
+        return self._valid_money_types
 
     @property
     def money_store_types(self):
         """Return the a set of money types within the money store."""
-        return {m.__class__ for m in self.money_store}
+        return {m for m in self.ledger.denominations if m in self.ledger}
 
     def _check_money_is_valid(self, money_store):
         """Check that the money in the money box is valid when the money box is initially created."""
-        if not len(money_store) == 0:
-            for m in money_store:
-                if m.__class__ not in self.valid_money_types:
-                    raise InvalidMoneyTypes("Money type not allowed in money box")
+        valid_money_types = self._valid_money_types
+        for m in money_store:
+            if m.__class__ not in valid_money_types:
+                raise InvalidMoneyTypes("Money type not allowed in money box")
 
     def add_to_money_store(self, money_type):
         """Add a money amount to the money stock."""
-        self._check_money_is_valid([money_type])
-        self.money_store.append(money_type)
+        self.ledger.add(money_type.__class__)
 
     def remove_from_money_store(self, money_type):
         """Take away money amount from the money stock, firstly checking
         whether the money type exists in the money stock."""
-        if len(self.money_store) == 0 or money_type.__class__ not in self.money_store_types:
-            raise MoneyTypeNotInStock("There are no coins or notes of this amount in the machine")
+        self.ledger.remove(money_type.__class__)
 
-        for m in self.money_store:
-            if m.__class__ == money_type.__class__:
-                self.money_store.remove(m)
-                return
     @property
     def total_money(self):
         """Returns the total monetary value of all money in the money box.
@@ -100,17 +318,13 @@ class MoneyBox:
             balance: Amount of money in pence.
 
         """
-        balance = 0
-        for m in self.money_store:
-            balance += m.value
-
-        return balance
+        return self.ledger.balance
 
     @property
     def available_amounts(self):
         available = []
-        for m in self.money_store:
-            available.append(m.value)
+        for value, count in zip(self.ledger.values, self.ledger.counts):
+            available.extend([value] * count)
         return available
 
     def calculate_change(self, target):
@@ -120,15 +334,25 @@ class MoneyBox:
         if target == 0:
             return money_to_return
 
-        change = calculate_change(target, self.available_amounts)
+        change = self.change_counts(target)
+        if change is None:
+            raise CalculateChangeError('There is not enough change to match this amount')
 
-        remaining_change = change
+        for d, count in zip(self.ledger.denominations, change):
+            money_to_return.extend(d() for _ in range(count))
 
-        for m in self.money_store:
-            if m.value in remaining_change:
-                money_to_return.append(m)
-                remaining_change.remove(m.value)
+        return money_to_return
 
-            if len(remaining_change) == 0:
-                return money_to_return
+    def change_counts(self, target, tendered=None):
+        """Return the count of each denomination to give as change for a target amount under the dispensing policy,
+        or None if the change cannot be made. Money being tendered, given as a count of each denomination, can be
+        given as change along with the money already in the box."""
+        counts = self.ledger.counts
+        if target == 0:
+            return (0,) * len(counts)
+        if target < 0:
+            return None
 
+        if tendered is not None:
+            counts = tuple(c + t for c, t in zip(counts, tendered))
+        return self.policy.change(target, self.ledger.values, counts)
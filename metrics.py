@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+DEFAULT_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 5e-3, 1e-2, 0.1, 1.0)
+
+_HELP = {
+    'vending_sales_total': 'Purchases completed.',
+    'vending_refunds_total': 'Purchases refused, by the exception that refused them.',
+    'vending_coins_dispensed_total': 'Coins and notes given as change, by money type.',
+    'vending_stage_seconds': 'Time spent in each stage of a purchase or money box operation.',
+}
+
+
+class Histogram:
+    """Counts of observations falling into fixed buckets, with their sum."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Counters and latency histograms for vending actions and money boxes.
+
+    Metrics are only collected by the vending actions and money boxes they are given
+    to; a VendingAction without metrics takes none of the timings and does no extra
+    work. The collected metrics can be rendered in the Prometheus text format, written
+    to a file or served over HTTP.
+
+    Args:
+        - buckets: upper bounds, in seconds, of the latency histogram buckets
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, label=None, amount=1):
+        """Add to a counter. A counter may have one label, given as a (name, value) pair."""
+        key = (name, label)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, stage, seconds):
+        """Record the time taken by a stage."""
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def instrument_money_box(self, money_box):
+        """Time the two money box operations every purchase goes through: working out
+        the change and applying the change in counts to the ledger."""
+        money_box.change_counts = self._timed('money_box_change_counts', money_box.change_counts)
+        money_box.ledger.apply = self._timed('ledger_apply', money_box.ledger.apply)
+
+    def _timed(self, stage, method):
+        clock = time.perf_counter
+
+        @wraps(method)
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.observe(stage, clock() - start)
+        return timed
+
+    def render(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items(), key=lambda item: (item[0][0], item[0][1] or ()))
+            histograms = sorted(self.histograms.items())
+
+            described = set()
+            for (name, label), value in counters:
+                if name not in described:
+                    described.add(name)
+                    lines.append('# HELP {} {}'.format(name, _HELP.get(name, name)))
+                    lines.append('# TYPE {} counter'.format(name))
+                labels = '{{{}="{}"}}'.format(*label) if label else ''
+                lines.append('{}{} {}'.format(name, labels, value))
+
+            name = 'vending_stage_seconds'
+            if histograms:
+                lines.append('# HELP {} {}'.format(name, _HELP[name]))
+                lines.append('# TYPE {} histogram'.format(name))
+            for stage, histogram in histograms:
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), histogram.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append('{}_bucket{{stage="{}",le="{}"}} {}'.format(name, stage, le, cumulative))
+                lines.append('{}_sum{{stage="{}"}} {}'.format(name, stage, repr(histogram.sum)))
+                lines.append('{}_count{{stage="{}"}} {}'.format(name, stage, histogram.count))
+
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """Write the metrics to a file, replacing it in one step so readers never see
+        half a file."""
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'w') as f:
+            f.write(self.render())
+        os.replace(temporary_path, path)
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serve the metrics over HTTP from a background thread.
+
+        Returns:
+            - (HTTPServer) the server, which can be stopped with shutdown()
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer((host, port), Handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        return server
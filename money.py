@@ -3,46 +3,80 @@ from abc import ABC
 COIN_TYPE = 0
 NOTE_TYPE = 1
 
+# The one instance of each money type.
+_INSTANCES = {}
+
 
 class BaseMoney(ABC):
     """Base money is an abstract money object which represents
-    something that can be used as a unit of exchange."""
+    something that can be used as a unit of exchange.
+
+    Every coin or note of the same type is the same object: creating a money object
+    returns the shared instance of its type. Money objects have no instance
+    attributes, and are equal when their type and value are equal."""
+    __slots__ = ()
     money_type = None
     value = None
 
+    def __new__(cls):
+        instance = _INSTANCES.get(cls)
+        if instance is None:
+            instance = _INSTANCES.setdefault(cls, super().__new__(cls))
+        return instance
+
+    def __eq__(self, other):
+        if not isinstance(other, BaseMoney):
+            return NotImplemented
+        return self.money_type == other.money_type and self.value == other.value
+
+    def __hash__(self):
+        return hash((self.money_type, self.value))
+
+    def __repr__(self):
+        return '{}()'.format(self.__class__.__name__)
+
 
 class Coin(BaseMoney):
+    __slots__ = ()
     money_type = COIN_TYPE
 
 
 class Note(BaseMoney):
+    __slots__ = ()
     money_type = NOTE_TYPE
 
 
 class OneCent(Coin):
+    __slots__ = ()
     value = 1
 
 
 class FiveCent(Coin):
+    __slots__ = ()
     value = 5
 
 
 class TenCent(Coin):
+    __slots__ = ()
     value = 10
 
 
 class TwentyFiveCent(Coin):
+    __slots__ = ()
     value = 25
 
 
 class FiftyCent(Coin):
+    __slots__ = ()
     value = 50
 
 
 class OneDollarBill(Note):
+    __slots__ = ()
     value = 100
 
 
 class TwoDollarBill(Note):
+    __slots__ = ()
     value = 200
 
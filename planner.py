@@ -0,0 +1,190 @@
+import numpy as np
+
+from machine import MoneyBox, VendingMachine
+from simulation import FleetSimulator, NO_STOCK, NO_CHANGE
+
+
+class RestockPlan:
+    """The products and money to load into a vending machine at a service visit.
+
+    Args:
+        - product_counts: (dict) number of each product type to load
+        - float_counts: (dict) number of each money type to load as the float
+        - lost_no_stock: (int) sales of the planning trace lost for lack of stock
+        - lost_no_change: (int) sales of the planning trace lost for lack of change
+    """
+
+    def __init__(self, product_counts, float_counts, lost_no_stock=0, lost_no_change=0):
+        self.product_counts = product_counts
+        self.float_counts = float_counts
+        self.lost_no_stock = lost_no_stock
+        self.lost_no_change = lost_no_change
+
+    def __repr__(self):
+        return 'RestockPlan(product_counts={}, float_counts={}, lost_no_stock={}, lost_no_change={})'.format(
+            self.product_counts, self.float_counts, self.lost_no_stock, self.lost_no_change)
+
+    def products(self):
+        """Return the products to load, as taken by VendingMachine."""
+        return [t() for t, c in self.product_counts.items() for _ in range(c)]
+
+    def money_store(self):
+        """Return the float to load, as taken by MoneyBox."""
+        return [t() for t, c in self.float_counts.items() for _ in range(c)]
+
+    def build(self, valid_money, concurrent=False):
+        """Return a vending machine loaded with the plan."""
+        money_box = MoneyBox(money_store=self.money_store(), valid_money=valid_money)
+        return VendingMachine(products=self.products(), money_box=money_box, concurrent=concurrent)
+
+
+def plan_restock(trace, valid_money, slot_capacity, float_capacity, service_interval=None,
+                 product_types=None, max_rounds=100, catalog=None):
+    """Search for the products and float to load that lose the fewest sales over a
+    historical trace of purchases.
+
+    The trace is cut into service intervals, and every candidate load is simulated over
+    every interval from a freshly loaded machine, each pair a machine of one fleet
+    simulation. The search starts from the products in proportion to their demand and
+    the float in proportion to the coins given as change, then repeatedly tries moving
+    slots from one product to another and coins from one denomination to another,
+    keeping the best move, and halving the size of the moves once none helps.
+
+    Args:
+        - trace: a list of (product, money objects) purchases in the order they were made
+        - valid_money: the money types the vending machine accepts
+        - slot_capacity: (int) number of products the vending machine holds
+        - float_capacity: (int) number of coins and notes to load as the float
+        - service_interval: (int) purchases between service visits, by default the
+          whole trace
+        - product_types: the product types to stock, by default those in the trace
+        - max_rounds: (int) most rounds of moves to try
+        - catalog: a Catalog to price products from, if any
+
+    Returns:
+        - (RestockPlan) the best load found
+    """
+    planner = _Planner(trace, valid_money, service_interval, product_types, catalog)
+    return planner.plan(slot_capacity, float_capacity, max_rounds)
+
+
+def _apportion(weights, total):
+    """Split a total in proportion to the weights, giving the remainder to the largest
+    fractions. Equal shares are given when every weight is zero."""
+    weights = np.asarray(weights, dtype=float)
+    if weights.sum() == 0:
+        weights = np.ones(len(weights))
+    shares = weights / weights.sum() * total
+    counts = np.floor(shares).astype(np.int64)
+    remainder = int(total - counts.sum())
+    counts[np.argsort(counts - shares, kind='stable')[:remainder]] += 1
+    return counts
+
+
+class _Planner:
+
+    def __init__(self, trace, valid_money, service_interval, product_types, catalog=None):
+        self.catalog = catalog
+        if product_types is None:
+            product_types = []
+            for product, _ in trace:
+                if type(product) not in product_types:
+                    product_types.append(type(product))
+
+        self.product_types = list(product_types)
+        self.denominations = sorted(valid_money, key=lambda d: d.value)
+        column = {t: i for i, t in enumerate(self.denominations)}
+        slot = {t: i for i, t in enumerate(self.product_types)}
+
+        # purchases of products that will not be stocked can never be made, whatever
+        # the plan, so they are left out
+        trace = [(p, m) for p, m in trace if type(p) in slot]
+        self.products = np.array([slot[type(p)] for p, _ in trace], dtype=np.int64)
+        self.tenders = np.zeros((len(trace), len(self.denominations)), dtype=np.int64)
+        for row, (_, money_objects) in enumerate(trace):
+            for money in money_objects:
+                if type(money) not in column:
+                    raise ValueError("Money type '{}' is not accepted".format(type(money).__name__))
+                self.tenders[row, column[type(money)]] += 1
+
+        service_interval = service_interval or max(len(trace), 1)
+        self.intervals = np.arange(len(trace)) // service_interval
+        self.n_intervals = int(self.intervals.max()) + 1 if len(trace) else 1
+
+    def plan(self, slot_capacity, float_capacity, max_rounds):
+        stock = self._initial_stock(slot_capacity)
+        coins = self._initial_coins(float_capacity)
+        no_stock, no_change = self._evaluate(stock[None, :], coins[None, :])
+        best = (int(no_stock[0] + no_change[0]), int(no_change[0]))
+        lost = (int(no_stock[0]), int(no_change[0]))
+
+        stock_step = max(1, slot_capacity // 4)
+        coin_step = max(1, float_capacity // 4)
+        for _ in range(max_rounds):
+            if best[0] == 0:
+                break
+            candidates = [(s, coins) for s in self._moves(stock, stock_step)] + \
+                [(stock, c) for c in self._moves(coins, coin_step)]
+            if candidates:
+                stocks = np.array([s for s, _ in candidates])
+                floats = np.array([c for _, c in candidates])
+                no_stock, no_change = self._evaluate(stocks, floats)
+                scores = list(zip((no_stock + no_change).tolist(), no_change.tolist()))
+                i = min(range(len(scores)), key=scores.__getitem__)
+                if scores[i] < best:
+                    best = scores[i]
+                    lost = (int(no_stock[i]), int(no_change[i]))
+                    stock, coins = stocks[i], floats[i]
+                    continue
+            if stock_step == 1 and coin_step == 1:
+                break
+            stock_step = max(1, stock_step // 2)
+            coin_step = max(1, coin_step // 2)
+
+        return RestockPlan(
+            product_counts={t: int(c) for t, c in zip(self.product_types, stock) if c},
+            float_counts={d: int(c) for d, c in zip(self.denominations, coins) if c},
+            lost_no_stock=lost[0],
+            lost_no_change=lost[1],
+        )
+
+    @staticmethod
+    def _moves(counts, step):
+        moves = []
+        for i in range(len(counts)):
+            if counts[i] < step:
+                continue
+            for j in range(len(counts)):
+                if i != j:
+                    moved = counts.copy()
+                    moved[i] -= step
+                    moved[j] += step
+                    moves.append(moved)
+        return moves
+
+    def _initial_stock(self, slot_capacity):
+        demand = np.bincount(self.products, minlength=len(self.product_types))
+        return _apportion(demand, slot_capacity)
+
+    def _initial_coins(self, float_capacity):
+        # the coins given as change from a machine that never runs short
+        simulator = self._simulator(
+            np.full((self.n_intervals, len(self.product_types)), len(self.products)),
+            np.full((self.n_intervals, len(self.denominations)), len(self.products)))
+        _, change = simulator.step(self.intervals, self.products, self.tenders)
+        return _apportion(change.sum(axis=0), float_capacity)
+
+    def _simulator(self, stock, coins):
+        return FleetSimulator(self.product_types, self.denominations, stock, coins, self.catalog)
+
+    def _evaluate(self, stocks, floats):
+        """Return the sales lost for lack of stock and for lack of change by each candidate
+        over every service interval."""
+        n_candidates = len(stocks)
+        simulator = self._simulator(np.repeat(stocks, self.n_intervals, axis=0),
+                                    np.repeat(floats, self.n_intervals, axis=0))
+        machines = (np.arange(n_candidates)[:, None] * self.n_intervals + self.intervals).ravel()
+        outcomes, _ = simulator.step(machines, np.tile(self.products, n_candidates),
+                                     np.tile(self.tenders, (n_candidates, 1)))
+        outcomes = outcomes.reshape(n_candidates, -1)
+        return (outcomes == NO_STOCK).sum(axis=1), (outcomes == NO_CHANGE).sum(axis=1)
@@ -0,0 +1,128 @@
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+from change import find_change
+from exceptions import CalculateChangeError, NoStockException
+
+PolicyReport = namedtuple('PolicyReport', ['sales', 'no_change', 'no_stock', 'other_failures'])
+
+
+class DispensingPolicy(ABC):
+    """A dispensing policy decides which coins and notes to give as change."""
+    name = None
+
+    @abstractmethod
+    def change(self, target, values, counts):
+        """Return the number of each denomination to give as change for a target, or
+        None if the policy cannot make the target.
+
+        Args:
+            - target: (int) total amount of change to give
+            - values: (Tuple[int]) value of each denomination, smallest first
+            - counts: (Tuple[int]) number available of each denomination
+        """
+
+
+class Greedy(DispensingPolicy):
+    """Give as many of the largest denomination as possible, then the next largest and so
+    on. This can fail to make change that other policies can make."""
+    name = 'greedy'
+
+    def change(self, target, values, counts):
+        change = [0] * len(values)
+        remaining = target
+        for i in range(len(values) - 1, -1, -1):
+            change[i] = min(counts[i], remaining // values[i])
+            remaining -= change[i] * values[i]
+        return tuple(change) if remaining == 0 else None
+
+
+class FewestCoins(DispensingPolicy):
+    """Give the fewest coins and notes that make the target."""
+    name = 'fewest_coins'
+
+    def change(self, target, values, counts):
+        return find_change(target, values, counts)
+
+
+class PreserveScarce(DispensingPolicy):
+    """Give the fewest coins and notes, weighting each by how scarce its denomination is,
+    so the last few of a denomination are kept back while others are plentiful.
+
+    Args:
+        - scale: (int) how much more a nearly empty denomination costs than a full one
+    """
+    name = 'preserve_scarce'
+
+    def __init__(self, scale=64):
+        self.scale = scale
+
+    def change(self, target, values, counts):
+        weights = tuple(1 + self.scale // (c + 1) for c in counts)
+        return find_change(target, values, counts, weights)
+
+
+class BalanceToFloat(DispensingPolicy):
+    """Give the fewest coins and notes, weighting each denomination by how far it has
+    fallen below a target float, so denominations above their float are paid out first.
+
+    Args:
+        - target_float: (dict) target count for each money type; money types that are
+          not given have a target of zero
+        - scale: (int) how much more each coin short of the float costs to give
+    """
+    name = 'balance_to_float'
+
+    def __init__(self, target_float, scale=8):
+        self.target_float = target_float
+        self.scale = scale
+        self._targets = {}
+
+    def change(self, target, values, counts):
+        targets = self._targets.get(values)
+        if targets is None:
+            by_value = {m.value: c for m, c in self.target_float.items()}
+            targets = self._targets[values] = tuple(by_value.get(v, 0) for v in values)
+
+        weights = tuple(1 + self.scale * max(0, t + 1 - c) for t, c in zip(targets, counts))
+        return find_change(target, values, counts, weights)
+
+
+def evaluate(orders, policies, products, money_store, valid_money):
+    """Replay the orders between two service visits under each dispensing policy.
+
+    Every policy starts from a vending machine holding the same products and money.
+
+    Args:
+        - orders: a list of (product, money objects) pairs
+        - policies: the dispensing policies to compare
+        - products: the products loaded at the service visit
+        - money_store: the money loaded at the service visit
+        - valid_money: the money types the vending machine accepts
+
+    Returns:
+        - (dict) of PolicyReport keyed by policy name, counting the sales made and the
+          sales that failed for lack of change, for lack of stock or for other reasons
+    """
+    # imported here as machine and transaction import this module
+    from machine import MoneyBox, VendingMachine
+    from transaction import VendingAction
+
+    reports = {}
+    for policy in policies:
+        money_box = MoneyBox(money_store=list(money_store), valid_money=valid_money, policy=policy)
+        vending_machine = VendingMachine(products=list(products), money_box=money_box)
+
+        sales = no_change = no_stock = other_failures = 0
+        for result in VendingAction(vending_machine).purchase_many(orders):
+            if result.success:
+                sales += 1
+            elif result.reason is CalculateChangeError:
+                no_change += 1
+            elif result.reason is NoStockException:
+                no_stock += 1
+            else:
+                other_failures += 1
+
+        reports[policy.name] = PolicyReport(sales, no_change, no_stock, other_failures)
+    return reports
@@ -1,34 +1,63 @@
 from abc import ABC
 
+# The one instance of each product type.
+_INSTANCES = {}
+
 
 class Product(ABC):
-    """A generic product object. A product has a price, in pence."""
+    """A generic product object. A product has a price, in pence.
+
+    Every product of the same type is the same object: creating a product returns the
+    shared instance of its type. Products have no instance attributes, and are equal
+    when they are of the same type."""
+    __slots__ = ()
     price = None
 
-    def __init__(self):
-        if self.price is None:
-            raise AttributeError
+    def __new__(cls):
+        instance = _INSTANCES.get(cls)
+        if instance is None:
+            if cls.price is None:
+                raise AttributeError
+            instance = _INSTANCES.setdefault(cls, super().__new__(cls))
+        return instance
+
+    def __eq__(self, other):
+        if not isinstance(other, Product):
+            return NotImplemented
+        return self.__class__ is other.__class__
+
+    def __hash__(self):
+        return hash(self.__class__)
+
+    def __repr__(self):
+        return '{}()'.format(self.__class__.__name__)
 
 
 class Candy(Product):
+    __slots__ = ()
     price = 10
 
 
 class Snack(Product):
+    __slots__ = ()
     price = 50
 
 
 class Nuts(Product):
+    __slots__ = ()
     price = 90
 
 
 class Coke(Product):
+    __slots__ = ()
     price = 25
 
 
 class Pepsi(Product):
+    __slots__ = ()
     price = 35
 
 
 class Soda(Product):
+    __slots__ = ()
     price = 45
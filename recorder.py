@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+from collections import namedtuple
+
+from money import BaseMoney
+from products import Product
+from registry import types_by_name
+
+# Format 2 added the change given to purchase records. Format 1 traces can still be
+# read, their purchases having no change recorded.
+TRACE_FORMAT = 2
+_READABLE_FORMATS = (1, TRACE_FORMAT)
+
+# Events read back from a trace. Times are seconds since recording started, and an
+# outcome is a code from transaction, or None for a purchase stopped by an error. The
+# change of a purchase read from a format 1 trace is None, as it was not recorded.
+Purchase = namedtuple('Purchase', ['time', 'product', 'money_objects', 'outcome', 'change'])
+Restock = namedtuple('Restock', ['time', 'products', 'money_objects'])
+MoneyAdjustment = namedtuple('MoneyAdjustment', ['time', 'money_object', 'count'])
+
+
+class TraceRecorder:
+    """Records the calls made on a VendingAction to a trace file, so the same load can be
+    replayed later against another build.
+
+    The trace starts with a header holding the money and stock of the vending machine
+    when recording began. Every purchase, with its tender, outcome and change, every
+    restock and every change to the money stock follows, in the order they finished, as
+    one compact JSON array per line. Money and product types are written as a number, with
+    a line naming them before their first use, and a restock is written as counts.
+
+    Args:
+        - path: the trace file to write
+        - vending_machine: the vending machine the recorded vending action works on
+        - machine_id: a name for the vending machine, written to the header
+    """
+
+    def __init__(self, path, vending_machine, machine_id=None):
+        self.path = path
+        self._ids = {}
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._file = open(path, 'w')
+
+        ledger = vending_machine.money_box.ledger
+        inventory = vending_machine.inventory
+        self._denominations = ledger.denominations
+        header = {
+            'format': TRACE_FORMAT,
+            'machine': machine_id,
+            'valid_money': [d.__name__ for d in ledger.denominations],
+            'money': {d.__name__: c for d, c in zip(ledger.denominations, ledger.counts) if c},
+            'products': {t.__name__: c for t, c in zip(inventory.product_types, inventory.counts) if c},
+        }
+        self._file.write(json.dumps(header, separators=(',', ':')) + '\n')
+
+    def purchase(self, product, money_objects, outcome, change=None):
+        """Record a purchase. The change is the count of each denomination given, if any."""
+        with self._lock:
+            given = [[self._id(d), c] for d, c in zip(self._denominations, change or ()) if c]
+            self._write(['p', self._time(), self._id(type(product)),
+                         [self._id(type(m)) for m in money_objects], outcome, given])
+
+    def restock(self, products, money_objects):
+        with self._lock:
+            self._write(['r', self._time(), self._counts(products), self._counts(money_objects)])
+
+    def money(self, money_object, count):
+        with self._lock:
+            self._write(['m', self._time(), self._id(type(money_object)), count])
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def _time(self):
+        return round(time.monotonic() - self._started, 6)
+
+    def _id(self, t):
+        i = self._ids.get(t)
+        if i is None:
+            i = self._ids[t] = len(self._ids)
+            self._write(['n', t.__name__])
+        return i
+
+    def _counts(self, objects):
+        counts = {}
+        for o in objects:
+            i = self._id(type(o))
+            counts[i] = counts.get(i, 0) + 1
+        return sorted(counts.items())
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+
+def read_trace(path):
+    """Read a trace file.
+
+    Returns:
+        - (dict) the header, holding the name of the vending machine, the names of the
+          valid money types and the count of each money type and product type held when
+          recording began
+        - a generator of the Purchase, Restock and MoneyAdjustment events recorded
+    """
+    f = open(path)
+    header = json.loads(f.readline())
+    if header.get('format') not in _READABLE_FORMATS:
+        f.close()
+        raise ValueError("Trace format '{}' is not supported".format(header.get('format')))
+
+    def events():
+        known_types = types_by_name(BaseMoney)
+        known_types.update(types_by_name(Product))
+        types = []
+        with f:
+            for line in f:
+                record = json.loads(line)
+                kind = record[0]
+                if kind == 'n':
+                    types.append(known_types[record[1]])
+                elif kind == 'p':
+                    change = [types[i]() for i, c in record[5] for _ in range(c)] if len(record) > 5 else None
+                    yield Purchase(record[1], types[record[2]](), [types[i]() for i in record[3]], record[4], change)
+                elif kind == 'r':
+                    yield Restock(record[1], [types[i]() for i, c in record[2] for _ in range(c)],
+                                  [types[i]() for i, c in record[3] for _ in range(c)])
+                elif kind == 'm':
+                    yield MoneyAdjustment(record[1], types[record[2]](), record[3])
+
+    return header, events()
@@ -0,0 +1,10 @@
+def types_by_name(base):
+    """Return every subclass of a base class keyed by class name, such as every money or
+    product type, for reading back types written out by name."""
+    types = {}
+    pending = [base]
+    while pending:
+        for t in pending.pop().__subclasses__():
+            types[t.__name__] = t
+            pending.append(t)
+    return types
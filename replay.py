@@ -0,0 +1,137 @@
+"""Replay a recorded trace against a fresh vending machine.
+
+Run from the repository root:
+
+    python replay.py trace.log              # replay as fast as possible
+    python replay.py trace.log --rate 5000  # replay at 5000 operations a second
+"""
+import argparse
+import sys
+import time
+from collections import namedtuple
+
+from machine import MoneyBox, VendingMachine
+from money import BaseMoney
+from products import Product
+from recorder import Purchase, Restock, read_trace
+from registry import types_by_name
+from transaction import VendingAction
+
+ReplayReport = namedtuple('ReplayReport', [
+    'operations', 'purchases', 'seconds', 'ops_per_sec', 'p50', 'p95', 'p99', 'divergences'])
+
+# An event whose outcome differs from the recording: its position among the events, the
+# event, and the recorded and replayed outcomes. A purchase's outcome is its outcome
+# code; restocks and changes to the money stock are only recorded when they succeed,
+# and their replayed outcome is the name of the exception that stopped them.
+Divergence = namedtuple('Divergence', ['index', 'event', 'recorded', 'replayed'])
+
+
+def vending_machine_from_header(header):
+    """Return a vending machine holding the money and stock a trace was recorded from."""
+    money_types = types_by_name(BaseMoney)
+    product_types = types_by_name(Product)
+
+    money_store = [money_types[n]() for n, c in header['money'].items() for _ in range(c)]
+    money_box = MoneyBox(money_store=money_store, valid_money=[money_types[n] for n in header['valid_money']])
+    vending_machine = VendingMachine(products=[], money_box=money_box)
+    for name, count in header['products'].items():
+        vending_machine.inventory.add(product_types[name](), count)
+    return vending_machine
+
+
+def replay(path, rate=None):
+    """Replay a trace against a fresh vending machine, timing each operation.
+
+    Args:
+        - path: the trace file
+        - rate: (float) operations a second to replay at, or None to replay as fast as
+          possible
+
+    Returns:
+        - (ReplayReport) the throughput sustained, the latency percentiles in seconds
+          and the events whose outcome differs from the recording
+    """
+    header, events = read_trace(path)
+    vending_action = VendingAction(vending_machine_from_header(header))
+    clock = time.perf_counter
+
+    latencies = []
+    divergences = []
+    purchases = 0
+    started = clock()
+    for index, event in enumerate(events):
+        if rate:
+            wait = started + index / rate - clock()
+            if wait > 0:
+                time.sleep(wait)
+
+        start = clock()
+        if isinstance(event, Purchase):
+            outcome = _purchase(vending_action, event)
+            latencies.append(clock() - start)
+            purchases += 1
+            if outcome != event.outcome:
+                divergences.append(Divergence(index, event, event.outcome, outcome))
+        else:
+            error = _adjust(vending_action, event)
+            latencies.append(clock() - start)
+            if error is not None:
+                divergences.append(Divergence(index, event, None, error))
+
+    seconds = clock() - started
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+    return ReplayReport(len(latencies), purchases, seconds, len(latencies) / seconds if seconds else 0.0,
+                        percentile(0.5), percentile(0.95), percentile(0.99), divergences)
+
+
+def _purchase(vending_action, event):
+    try:
+        return vending_action.try_purchase(event.product, event.money_objects).outcome
+    except Exception:
+        # a purchase stopped by an error has no outcome, as in the recording
+        return None
+
+
+def _adjust(vending_action, event):
+    """Apply a restock or a change to the money stock, returning the name of the
+    exception that stopped it, if any."""
+    try:
+        if isinstance(event, Restock):
+            vending_action.restock(event.products, event.money_objects)
+        elif event.count > 0:
+            vending_action.add_money_objects_to_money_stock([event.money_object] * event.count)
+        else:
+            vending_action.collect(counts={event.money_object.__class__: -event.count})
+    except Exception as e:
+        return e.__class__.__name__
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('trace', help='trace file written by a TraceRecorder')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='operations a second to replay at; by default as fast as possible')
+    parser.add_argument('--show-divergences', type=int, default=10, metavar='N',
+                        help='how many divergent events to list')
+    args = parser.parse_args(argv)
+
+    report = replay(args.trace, args.rate)
+    print('operations {}  purchases {}  seconds {:.3f}  ops/sec {:.0f}'.format(
+        report.operations, report.purchases, report.seconds, report.ops_per_sec))
+    print('latency us  p50 {:.2f}  p95 {:.2f}  p99 {:.2f}'.format(
+        report.p50 * 1e6, report.p95 * 1e6, report.p99 * 1e6))
+    print('divergences {}'.format(len(report.divergences)))
+    for d in report.divergences[:args.show_divergences]:
+        print('  event {}: {} recorded {} replayed {}'.format(d.index, d.event, d.recorded, d.replayed))
+
+    return 1 if report.divergences else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
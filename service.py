@@ -0,0 +1,140 @@
+import asyncio
+import time
+
+from transaction import VendingAction
+
+# Placed on a machine's queue to stop its worker once the commands before it are done.
+_STOP = object()
+
+
+class CommandStats:
+    """Latency of the commands of one kind, measured from when a command is queued to
+    when its result is ready, in seconds."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, latency):
+        self.count += 1
+        self.total += latency
+        if latency > self.max:
+            self.max = latency
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class VendingService:
+    """An asyncio front end for a number of vending machines.
+
+    Purchase, quote and restock commands can be sent from any number of coroutines.
+    Each vending machine has its own queue and worker, so commands for one machine are
+    applied one at a time and in order while machines do not wait on each other. The
+    worker takes all queued commands, up to a batch size, each time it wakes. When a
+    queue is full the coroutine sending a command waits for space.
+
+    Args:
+        - vending_machines: (dict) of vending machines keyed by machine id
+        - max_queue_size: (int) number of commands that can wait for each machine
+        - batch_size: (int) most commands a worker applies before yielding
+    """
+
+    def __init__(self, vending_machines, max_queue_size=1024, batch_size=64):
+        self.vending_actions = {k: VendingAction(vm) for k, vm in vending_machines.items()}
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.latency = {'purchase': CommandStats(), 'quote': CommandStats(), 'restock': CommandStats()}
+        self._queues = {}
+        self._workers = []
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.stop()
+
+    async def start(self):
+        """Start a worker for every vending machine."""
+        for machine_id, vending_action in self.vending_actions.items():
+            queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._queues[machine_id] = queue
+            self._workers.append(asyncio.ensure_future(self._serve(vending_action, queue)))
+
+    async def stop(self):
+        """Finish the queued commands and stop the workers."""
+        for queue in self._queues.values():
+            await queue.put(_STOP)
+        await asyncio.gather(*self._workers)
+        self._queues = {}
+        self._workers = []
+
+    def queue_depth(self, machine_id=None):
+        """Return the number of commands waiting for a vending machine, or for all of them."""
+        if machine_id is not None:
+            return self._queues[machine_id].qsize()
+        return sum(q.qsize() for q in self._queues.values())
+
+    async def purchase(self, machine_id, product, money_objects):
+        """Purchase a product, returning the change given."""
+        return await self._submit(machine_id, 'purchase', product, money_objects)
+
+    async def quote(self, machine_id, product, money_objects):
+        """Work out whether a purchase would succeed, and its change, without making it."""
+        return await self._submit(machine_id, 'quote', product, money_objects)
+
+    async def restock(self, machine_id, products, money_objects=()):
+        """Add products and money to a vending machine."""
+        return await self._submit(machine_id, 'restock', products, money_objects)
+
+    async def _submit(self, machine_id, command, *args):
+        future = asyncio.get_running_loop().create_future()
+        await self._queues[machine_id].put((command, args, future, time.perf_counter()))
+        return await future
+
+    async def _serve(self, vending_action, queue):
+        commands = {
+            'purchase': vending_action.purchase,
+            'quote': vending_action.quote,
+            'restock': vending_action.restock,
+        }
+
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            for i, item in enumerate(batch):
+                if item is _STOP:
+                    self._fail_unserved(batch[i + 1:], queue)
+                    return
+
+                command, args, future, queued_at = item
+                if future.cancelled():
+                    continue
+
+                try:
+                    result = commands[command](*args)
+                except Exception as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+                self.latency[command].record(time.perf_counter() - queued_at)
+
+            # let the waiting senders run before taking the next batch
+            await asyncio.sleep(0)
+
+    @staticmethod
+    def _fail_unserved(batch, queue):
+        # commands sent after the worker was told to stop would otherwise never be answered
+        while not queue.empty():
+            batch.append(queue.get_nowait())
+        for item in batch:
+            if item is _STOP:
+                continue
+            future = item[2]
+            if not future.done():
+                future.set_exception(RuntimeError("The vending service has stopped"))
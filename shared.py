@@ -0,0 +1,192 @@
+import fcntl
+import mmap
+import os
+import struct
+import threading
+
+from exceptions import InvalidProductType
+from inventory import Inventory
+from ledger import Ledger
+from machine import MoneyBox, VendingMachine, _NoLock
+from money import BaseMoney
+from products import Product
+from registry import types_by_name
+
+MAGIC = b'VMSM'
+FORMAT_VERSION = 1
+
+# magic, format version, flags (unused), denominations, product types, length of the
+# names, padding so the counts that follow are aligned
+_HEADER = struct.Struct('<4sHHIIII')
+
+# The cells before the counts: the ledger version and the balance.
+_CELLS = 2
+
+# Byte of the file locked while the money box is changed; product slot i locks byte i + 1.
+_MONEY_LOCK_OFFSET = 0
+
+
+def create(path, vending_machine):
+    """Write the money and stock of a vending machine to a file that SharedVendingMachine
+    can map. The file should be created once, before any process opens it.
+
+    Args:
+        - path: where to write the shared state
+        - vending_machine: the vending machine whose money, stock and product types are
+          copied
+    """
+    ledger = vending_machine.money_box.ledger
+    inventory = vending_machine.inventory
+    denominations, product_types = ledger.denominations, tuple(inventory.product_types)
+    n_denominations, n_products = len(denominations), len(product_types)
+
+    names = '\n'.join(t.__name__ for t in denominations + product_types).encode()
+    integers = struct.pack('<{}q'.format(_CELLS + 3 * n_denominations + n_products),
+                           ledger.version, ledger.balance,
+                           *ledger.values, *ledger.counts, *ledger.stamps(n_denominations),
+                           *inventory.counts)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, 0, n_denominations, n_products, len(names), 0)
+
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as f:
+        f.write(header + integers + names)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path, path)
+
+
+class _ProcessLock:
+    """A lock held by one thread of one process at a time: a thread lock keeps out the
+    other threads of this process and a lock on one byte of the shared file keeps out
+    other processes."""
+
+    def __init__(self, fd, offset):
+        self._fd = fd
+        self._offset = offset
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, self._offset)
+        except BaseException:
+            self._lock.release()
+            raise
+        return self
+
+    def __exit__(self, *args):
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, self._offset)
+        self._lock.release()
+        return False
+
+
+class SharedLedger(Ledger):
+    """A ledger whose counts, stamps, balance and version live in shared memory, so every
+    process mapping the same file sees the same money box."""
+
+    def __init__(self, denominations, cells, counts, stamps):
+        self.denominations = tuple(denominations)
+        self.values = tuple(d.value for d in self.denominations)
+        self._index = {d: i for i, d in enumerate(self.denominations)}
+        self._cells = cells
+        self._counts = counts
+        self._stamps = stamps
+
+    @property
+    def version(self):
+        return self._cells[0]
+
+    @version.setter
+    def version(self, version):
+        self._cells[0] = version
+
+    @property
+    def _balance(self):
+        return self._cells[1]
+
+    @_balance.setter
+    def _balance(self, balance):
+        self._cells[1] = balance
+
+
+class SharedInventory(Inventory):
+    """An inventory whose stock levels live in shared memory. The product types are fixed
+    when the shared file is created."""
+
+    def __init__(self, product_types, counts):
+        self.product_types = list(product_types)
+        self._index = {t: i for i, t in enumerate(self.product_types)}
+        self._samples = [t() for t in self.product_types]
+        self._counts = counts
+
+    def add(self, product, count=1):
+        if product.__class__ not in self._index:
+            raise InvalidProductType("Product type has no slot in the shared vending machine")
+        super().add(product, count)
+
+
+class SharedVendingMachine(VendingMachine):
+    """A vending machine whose money and stock are kept in a memory-mapped file shared by
+    every process that opens it, so several worker processes can serve the same vending
+    machine without a broker.
+
+    The locks of a concurrent vending machine are extended across processes: each
+    product type and the money box has a lock on one byte of the file as well as a
+    thread lock, taken in the same order as before, so a sale's product and money
+    deltas are committed atomically for every process. Purchases are planned against
+    the shared ledger stamps and planned again if another process moved the money
+    their change is made from first, as between threads.
+
+    Each process must open the file once, itself, rather than inherit an open vending
+    machine or open it twice, as the locks on the file are held per process. Listeners
+    are only told about the changes made by their own process.
+
+    Args:
+        - path: a file written by create
+        - policy: the dispensing policy of the money box
+    """
+
+    def __init__(self, path, policy=None):
+        money_types_by_name = types_by_name(BaseMoney)
+        product_types_by_name = types_by_name(Product)
+
+        self._file = open(path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, version, _, n_denominations, n_products, names_size, _ = _HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError("'{}' is not a shared vending machine of a readable version".format(path))
+
+        offset = _HEADER.size + 8 * (_CELLS + 3 * n_denominations + n_products)
+        names = self._map[offset:offset + names_size].decode().split('\n')
+        denominations = [money_types_by_name[n] for n in names[:n_denominations]]
+        product_types = [product_types_by_name[n] for n in names[n_denominations:]]
+
+        integers = memoryview(self._map)[_HEADER.size:offset].cast('q')
+        d = n_denominations
+        money_box = MoneyBox(money_store=[], valid_money=denominations, policy=policy)
+        money_box.ledger = SharedLedger(
+            denominations,
+            cells=integers[:_CELLS],
+            counts=integers[_CELLS + d:_CELLS + 2 * d],
+            stamps=integers[_CELLS + 2 * d:_CELLS + 3 * d])
+
+        super().__init__(products=[], money_box=money_box, concurrent=True)
+        self.inventory = SharedInventory(product_types, integers[_CELLS + 3 * d:])
+        self._views = [integers, money_box.ledger._cells, money_box.ledger._counts,
+                       money_box.ledger._stamps, self.inventory._counts]
+
+        fd = self._file.fileno()
+        self._money_lock = _ProcessLock(fd, _MONEY_LOCK_OFFSET)
+        self._product_locks = {t: _ProcessLock(fd, i + 1) for i, t in enumerate(product_types)}
+
+    def _product_lock(self, product_type):
+        # a product type without a slot has no stock to guard
+        return self._product_locks.get(product_type) or _NoLock()
+
+    def close(self):
+        """Unmap the shared file. The vending machine cannot be used afterwards."""
+        for view in reversed(getattr(self, '_views', [])):
+            view.release()
+        self._map.close()
+        self._file.close()
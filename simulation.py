@@ -0,0 +1,261 @@
+import numpy as np
+
+# Outcomes of purchase events use the codes VendingAction.try_purchase returns.
+from catalog import price_of
+from transaction import SOLD, INSUFFICIENT_FUNDS, NO_STOCK, NO_CHANGE, INVALID_PRODUCT
+
+# Stands in for the cost of an amount that cannot be made, as in change.make_change.
+_UNREACHABLE = np.iinfo(np.int32).max // 2
+
+# Most purchase events given change in one pass, to bound the memory of the change tables.
+_CHANGE_CHUNK = 4096
+
+
+def make_change(targets, values, counts):
+    """Calculate change for many targets at once, giving the same answer as
+    change.make_change for each of them: the fewest coins, ties broken in favour of the
+    larger denominations.
+
+    Args:
+        - targets: (K,) array of positive amounts of change to give
+        - values: (D,) array of the value of each denomination, smallest first
+        - counts: (K, D) array of the number available of each denomination
+
+    Returns:
+        - (K, D) array of the number of each denomination to give
+        - (K,) boolean array, False where the target cannot be made
+    """
+    change = np.zeros(counts.shape, dtype=np.int64)
+    feasible = np.zeros(len(targets), dtype=bool)
+    for start in range(0, len(targets), _CHANGE_CHUNK):
+        end = start + _CHANGE_CHUNK
+        change[start:end], feasible[start:end] = _make_change(targets[start:end], values, counts[start:end])
+    return change, feasible
+
+
+def _make_change(targets, values, counts):
+    rows = np.arange(len(targets))
+    top = int(targets.max())
+    usable = np.minimum(counts, targets[:, None] // values)
+
+    # tables[i][k, a] is the fewest coins making amount a from the first i denominations
+    table = np.full((len(targets), top + 1), _UNREACHABLE, dtype=np.int32)
+    table[:, 0] = 0
+    tables = [table]
+
+    for i, value in enumerate(values):
+        table = tables[-1].copy()
+        remaining = usable[:, i].copy()
+        part = 1
+        while remaining.any():
+            take = np.minimum(part, remaining)
+            for size in np.unique(take[take > 0]):
+                step = int(size) * int(value)
+                if step > top:
+                    continue
+                selected = take == size
+                shifted = table[selected, :-step] + np.int32(size)
+                table[selected, step:] = np.minimum(table[selected, step:], shifted)
+            remaining -= take
+            part *= 2
+        tables.append(table)
+
+    feasible = tables[-1][rows, targets] < _UNREACHABLE
+
+    change = np.zeros(counts.shape, dtype=np.int64)
+    amounts = np.where(feasible, targets, 0)
+    for i in range(len(values) - 1, -1, -1):
+        value = int(values[i])
+        best = tables[i + 1][rows, amounts]
+        highest = np.minimum(usable[:, i], amounts // value)
+        chosen = np.zeros(len(targets), dtype=bool)
+        for k in range(int(highest.max()), -1, -1):
+            candidates = ~chosen & (k <= highest)
+            if not candidates.any():
+                continue
+            rest = np.where(candidates, amounts - k * value, 0)
+            matches = candidates & (tables[i][rows, rest] + k == best)
+            change[matches, i] = k
+            chosen |= matches
+        amounts = amounts - change[:, i] * value
+
+    return change, feasible
+
+
+class FleetReport:
+    """Totals per machine from a fleet simulation."""
+
+    def __init__(self, n_machines):
+        self.sales = np.zeros(n_machines, dtype=np.int64)
+        self.revenue = np.zeros(n_machines, dtype=np.int64)
+        self.lost_no_stock = np.zeros(n_machines, dtype=np.int64)
+        self.lost_no_change = np.zeros(n_machines, dtype=np.int64)
+        self.lost_insufficient_funds = np.zeros(n_machines, dtype=np.int64)
+
+    def record(self, machines, outcomes, prices):
+        np.add.at(self.sales, machines[outcomes == SOLD], 1)
+        np.add.at(self.revenue, machines[outcomes == SOLD], prices[outcomes == SOLD])
+        np.add.at(self.lost_no_stock, machines[outcomes == NO_STOCK], 1)
+        np.add.at(self.lost_no_change, machines[outcomes == NO_CHANGE], 1)
+        np.add.at(self.lost_insufficient_funds, machines[outcomes == INSUFFICIENT_FUNDS], 1)
+
+    def summary(self):
+        """Return the totals across the fleet."""
+        return {
+            'sales': int(self.sales.sum()),
+            'revenue': int(self.revenue.sum()),
+            'lost_no_stock': int(self.lost_no_stock.sum()),
+            'lost_no_change': int(self.lost_no_change.sum()),
+            'lost_insufficient_funds': int(self.lost_insufficient_funds.sum()),
+        }
+
+
+class FleetSimulator:
+    """A fleet of vending machines held as arrays, for simulating demand quickly.
+
+    Each machine is a row of the stock array, with a column per product type, and a
+    row of the coins array, with a column per denomination. Purchase events are
+    applied a tick at a time across the whole fleet with the same rules as
+    VendingAction.purchase: the tender must cover the price, the product must be in
+    stock, and change is made from the money in the machine and the tender.
+
+    Args:
+        - product_types: the product types, one per column of stock
+        - denominations: the money types, one per column of coins
+        - stock: (N, P) array of the stock of each product type in each machine
+        - coins: (N, D) array of the count of each denomination in each machine
+        - catalog: a Catalog to take prices from when the simulator is built, if any;
+          product types not in it cannot be sold
+    """
+
+    def __init__(self, product_types, denominations, stock, coins, catalog=None):
+        order = np.argsort([d.value for d in denominations], kind='stable')
+        self.product_types = list(product_types)
+        self.denominations = [denominations[i] for i in order]
+        prices = [price_of(p, catalog) for p in self.product_types]
+        self.listed = np.array([p is not None for p in prices], dtype=bool)
+        self.prices = np.array([p or 0 for p in prices], dtype=np.int64)
+        self.values = np.array([d.value for d in self.denominations], dtype=np.int64)
+        self.stock = np.array(stock, dtype=np.int64)
+        self.coins = np.array(coins, dtype=np.int64)[:, order]
+
+    @classmethod
+    def from_machines(cls, vending_machines, product_types=None, catalog=None):
+        """Build a simulator from vending machines that accept the same money."""
+        denominations = vending_machines[0].money_box.ledger.denominations
+        if any(vm.money_box.ledger.denominations != denominations for vm in vending_machines):
+            raise ValueError("Every vending machine in a fleet must accept the same money")
+
+        if product_types is None:
+            product_types = []
+            for vm in vending_machines:
+                product_types.extend(t for t in vm.inventory.product_types if t not in product_types)
+
+        stock = [[vm.stock_level(t) for t in product_types] for vm in vending_machines]
+        coins = [vm.money_box.ledger.counts for vm in vending_machines]
+        return cls(product_types, denominations, stock, coins, catalog)
+
+    @property
+    def n_machines(self):
+        return len(self.stock)
+
+    def step(self, machines, products, tenders):
+        """Apply a tick of purchase events. Events for the same machine are applied in
+        the order given.
+
+        Args:
+            - machines: (E,) array of the machine of each event
+            - products: (E,) array of the product column bought in each event
+            - tenders: (E, D) array of the count of each denomination tendered
+
+        Returns:
+            - (E,) array of the outcome of each event
+            - (E, D) array of the change given for each event
+        """
+        machines = np.asarray(machines)
+        products = np.asarray(products)
+        tenders = np.asarray(tenders, dtype=np.int64)
+
+        outcomes = np.empty(len(machines), dtype=np.int8)
+        change = np.zeros(tenders.shape, dtype=np.int64)
+
+        # the nth event of every machine is applied in the nth round, so each round
+        # touches a machine at most once
+        order = np.argsort(machines, kind='stable')
+        sorted_machines = machines[order]
+        starts = np.flatnonzero(np.r_[True, sorted_machines[1:] != sorted_machines[:-1]])
+        group_sizes = np.diff(np.r_[starts, len(machines)])
+        ranks = np.empty(len(machines), dtype=np.int64)
+        ranks[order] = np.arange(len(machines)) - np.repeat(starts, group_sizes)
+
+        for r in range(int(ranks.max()) + 1 if len(machines) else 0):
+            events = np.flatnonzero(ranks == r)
+            outcomes[events], change[events] = self._round(machines[events], products[events], tenders[events])
+
+        return outcomes, change
+
+    def _round(self, machines, products, tenders):
+        prices = self.prices[products]
+        totals = tenders @ self.values
+        outcomes = np.full(len(machines), SOLD, dtype=np.int8)
+        change = np.zeros(tenders.shape, dtype=np.int64)
+
+        outcomes[totals < prices] = INSUFFICIENT_FUNDS
+        outcomes[(outcomes == SOLD) & (self.stock[machines, products] == 0)] = NO_STOCK
+        outcomes[~self.listed[products]] = INVALID_PRODUCT
+
+        needs_change = np.flatnonzero((outcomes == SOLD) & (totals > prices))
+        if len(needs_change):
+            available = self.coins[machines[needs_change]] + tenders[needs_change]
+            given, feasible = make_change(totals[needs_change] - prices[needs_change], self.values, available)
+            change[needs_change] = given
+            outcomes[needs_change[~feasible]] = NO_CHANGE
+
+        sold = outcomes == SOLD
+        self.coins[machines[sold]] += tenders[sold] - change[sold]
+        self.stock[machines[sold], products[sold]] -= 1
+
+        return outcomes, change
+
+    def run(self, ticks, report=None):
+        """Apply every tick of purchase events in turn.
+
+        Args:
+            - ticks: an iterable of (machines, products, tenders) arrays as taken by step
+            - report: a FleetReport to add to, if any
+
+        Returns:
+            - (FleetReport) of sales and lost sales per machine
+        """
+        if report is None:
+            report = FleetReport(self.n_machines)
+
+        for machines, products, tenders in ticks:
+            outcomes, _ = self.step(machines, products, tenders)
+            report.record(np.asarray(machines), outcomes, self.prices[np.asarray(products)])
+
+        return report
+
+
+def random_demand(n_machines, n_ticks, events_per_tick, product_weights, tenders, seed=None):
+    """Generate ticks of random purchase events.
+
+    Args:
+        - n_machines: (int) machines in the fleet
+        - n_ticks: (int) ticks to generate
+        - events_per_tick: (int) purchase events in every tick, spread across the fleet
+        - product_weights: (P,) relative demand for each product column
+        - tenders: (T, D) array of the tenders customers pay with, equally likely
+
+    Returns:
+        - a generator of (machines, products, tenders) arrays
+    """
+    rng = np.random.default_rng(seed)
+    weights = np.asarray(product_weights, dtype=float)
+    weights = weights / weights.sum()
+    tenders = np.asarray(tenders, dtype=np.int64)
+
+    for _ in range(n_ticks):
+        machines = rng.integers(0, n_machines, events_per_tick)
+        products = rng.choice(len(weights), events_per_tick, p=weights)
+        yield machines, products, tenders[rng.integers(0, len(tenders), events_per_tick)]
@@ -0,0 +1,229 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from catalog import PriceTable
+from inventory import Inventory
+from ledger import Ledger
+from machine import MoneyBox, VendingMachine
+from money import BaseMoney
+from products import Product
+from registry import types_by_name
+
+MAGIC = b'VMSS'
+FORMAT_VERSION = 2
+
+# magic, format version, flags (unused), sequence number, catalog version,
+# denominations, product types, length of the names, padding so the arrays that
+# follow are aligned
+_HEADER = struct.Struct('<4sHHQQIIII')
+
+# Counts are stored little-endian, so they can be viewed in place on little-endian hosts.
+_ZERO_COPY = sys.byteorder == 'little'
+
+
+class SnapshotFormatError(ValueError):
+    """Raised when a buffer does not hold a snapshot this version can read."""
+
+
+class Snapshot:
+    """The state of a vending machine read from a binary snapshot.
+
+    The snapshot starts with a fixed header followed by four arrays of 64 bit integers:
+    the value and count of each denomination, smallest first, and the price and stock
+    of each product type. The names of the denominations and product types come last,
+    separated by newlines.
+
+    When a snapshot is loaded from a buffer the arrays are views into the buffer rather
+    than copies, so the buffer must not change while the snapshot is in use.
+
+    Args:
+        - seq: (int) sequence number of the last change in the snapshot
+        - denominations: (Tuple[str]) name of each denomination
+        - values: value of each denomination
+        - money_counts: number held of each denomination
+        - product_names: (Tuple[str]) name of each product type
+        - prices: price of each product type, or -1 for one not in the catalog it was
+          priced from
+        - stock: number held of each product type
+        - catalog_version: (int) version of the catalog it was priced from, or 0 if
+          it was priced from the product types
+    """
+
+    def __init__(self, seq, denominations, values, money_counts, product_names, prices, stock,
+                 catalog_version=0):
+        self.seq = seq
+        self.denominations = denominations
+        self.values = values
+        self.money_counts = money_counts
+        self.product_names = product_names
+        self.prices = prices
+        self.stock = stock
+        self.catalog_version = catalog_version
+        self._buffer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def close(self):
+        """Release the views into the buffer, and close it if it was opened by load."""
+        for name in ('values', 'money_counts', 'prices', 'stock'):
+            view = getattr(self, name)
+            if isinstance(view, memoryview):
+                setattr(self, name, array('q', view))
+                view.release()
+        if self._buffer is not None:
+            self._buffer.close()
+            self._buffer = None
+
+    def restore(self, concurrent=False):
+        """Return a vending machine holding the money and stock of the snapshot."""
+        money_types = types_by_name(BaseMoney)
+        product_types = types_by_name(Product)
+        for name in self.denominations:
+            if name not in money_types:
+                raise SnapshotFormatError("Unknown money type '{}'".format(name))
+        for name in self.product_names:
+            if name not in product_types:
+                raise SnapshotFormatError("Unknown product type '{}'".format(name))
+
+        money_box = MoneyBox(money_store=[], valid_money=[money_types[n] for n in self.denominations])
+        vending_machine = VendingMachine(products=[], money_box=money_box, concurrent=concurrent)
+
+        ledger = money_box.ledger
+        counts = dict(zip(self.denominations, self.money_counts))
+        ledger.apply([counts[d.__name__] for d in ledger.denominations])
+        for name, count in zip(self.product_names, self.stock):
+            vending_machine.inventory.add(product_types[name](), count)
+        return vending_machine
+
+    def price_table(self):
+        """Return the prices of the snapshot as a PriceTable, holding the product types
+        that were in the catalog it was priced from."""
+        prices = {n: p for n, p in zip(self.product_names, self.prices) if p >= 0}
+        return PriceTable.from_dict({'version': self.catalog_version, 'products': prices})
+
+
+def dumps(vending_machine, seq=0, catalog=None):
+    """Return a binary snapshot of a vending machine.
+
+    Args:
+        - vending_machine: the vending machine to snapshot
+        - seq: (int) sequence number of the last change applied to it
+        - catalog: a Catalog the vending machine is priced from, if any
+    """
+    ledger = vending_machine.money_box.ledger
+    inventory = vending_machine.inventory
+    return _pack(seq, ledger.denominations, ledger.counts, inventory.product_types, inventory.counts, catalog)
+
+
+def dumps_objects(products, money_store, valid_money, seq=0, catalog=None):
+    """Return a binary snapshot of vending machine state held as lists of objects, as
+    taken by VendingMachine and MoneyBox.
+
+    Args:
+        - products: the products held
+        - money_store: the money held
+        - valid_money: the money types accepted
+        - seq: (int) sequence number of the last change applied
+        - catalog: a Catalog the products are priced from, if any
+    """
+    ledger = Ledger(valid_money)
+    ledger.apply(ledger.tally(money_store))
+    inventory = Inventory(products)
+    return _pack(seq, ledger.denominations, ledger.counts, inventory.product_types, inventory.counts, catalog)
+
+
+def _pack(seq, denominations, money_counts, product_types, stock, catalog=None):
+    if catalog is None:
+        catalog_version, prices = 0, [t.price for t in product_types]
+    else:
+        # the table is taken once, so a catalog reloaded meanwhile cannot mix versions
+        table = catalog.table
+        catalog_version = table.version
+        prices = [table.price(t) if t in table else None for t in product_types]
+    n_denominations, n_products = len(denominations), len(product_types)
+    names = '\n'.join(t.__name__ for t in denominations + tuple(product_types)).encode()
+    integers = struct.pack('<{}q'.format(2 * (n_denominations + n_products)),
+                           *[d.value for d in denominations], *money_counts,
+                           *[-1 if p is None else p for p in prices], *stock)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, 0, seq, catalog_version, n_denominations, n_products,
+                          len(names), 0)
+    return header + integers + names
+
+
+def loads(buffer):
+    """Read a binary snapshot from a bytes-like object without copying its counts.
+
+    Raises:
+        - SnapshotFormatError: if the buffer is not a snapshot of a readable version
+    """
+    if len(buffer) < _HEADER.size:
+        raise SnapshotFormatError('Snapshot is shorter than its header')
+
+    magic, version, _, seq, catalog_version, n_denominations, n_products, names_size, _ = \
+        _HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise SnapshotFormatError('Not a vending machine snapshot')
+    if version != FORMAT_VERSION:
+        raise SnapshotFormatError("Snapshot format version '{}' is not supported".format(version))
+
+    offset = _HEADER.size + 16 * (n_denominations + n_products)
+    if len(buffer) < offset + names_size:
+        raise SnapshotFormatError('Snapshot is cut short')
+
+    view = memoryview(buffer)
+    names = bytes(view[offset:offset + names_size]).decode().split('\n') if names_size else []
+    if len(names) != n_denominations + n_products:
+        view.release()
+        raise SnapshotFormatError('Snapshot names do not match its counts')
+
+    arrays = []
+    offset = _HEADER.size
+    for n in (n_denominations, n_denominations, n_products, n_products):
+        arrays.append(_integers(view[offset:offset + 8 * n]))
+        offset += 8 * n
+
+    values, money_counts, prices, stock = arrays
+    return Snapshot(seq, tuple(names[:n_denominations]), values, money_counts,
+                    tuple(names[n_denominations:]), prices, stock, catalog_version)
+
+
+def _integers(view):
+    if _ZERO_COPY:
+        return view.cast('q')
+    integers = array('q', bytes(view))
+    integers.byteswap()
+    return integers
+
+
+def dump(vending_machine, path, seq=0, catalog=None):
+    """Write a binary snapshot of a vending machine to a file, replacing it in one step."""
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as f:
+        f.write(dumps(vending_machine, seq, catalog))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path, path)
+
+
+def load(path):
+    """Read a binary snapshot from a file by mapping it into memory. The snapshot should
+    be closed once it is no longer needed, to unmap the file."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise SnapshotFormatError('Snapshot is shorter than its header')
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        snapshot = loads(buffer)
+    except SnapshotFormatError:
+        buffer.close()
+        raise
+    snapshot._buffer = buffer
+    return snapshot
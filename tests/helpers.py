@@ -1,5 +1,24 @@
+from machine import MoneyBox, VendingMachine
+from money import TenCent, TwentyFiveCent, FiftyCent
+from products import Candy, Coke
+
+
 def assert_list_instances_equal(list_one, list_two):
     for i, j in zip(list_one, list_two):
         if not i.__class__ is j.__class__:
             assert False
-    assert True
\ No newline at end of file
+    assert True
+
+
+def make_vending_machine(products=(Candy(), Candy(), Coke()), money_store=(TenCent(),) * 5,
+                         valid_money=(TenCent, TwentyFiveCent, FiftyCent), concurrent=False):
+    """Return a vending machine holding some products and money, by default two Candy, a
+    Coke and five TenCent."""
+    money_box = MoneyBox(money_store=list(money_store), valid_money=list(valid_money))
+    return VendingMachine(products=list(products), money_box=money_box, concurrent=concurrent)
+
+
+def machine_state(vending_machine):
+    """Return the count of each denomination and the stock of each product type."""
+    return vending_machine.money_box.ledger.counts, {
+        t: vending_machine.stock_level(t) for t in vending_machine.inventory.product_types}
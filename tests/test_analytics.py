@@ -0,0 +1,93 @@
+import pytest
+
+from analytics import SalesAggregate, aggregate, aggregate_files, purchases, rolling, windows
+from machine import MoneyBox, VendingMachine
+from money import TenCent, TwentyFiveCent, FiftyCent
+from products import Candy, Coke
+from recorder import Purchase, TraceRecorder
+from transaction import VendingAction, SOLD, NO_STOCK, NO_CHANGE
+
+
+def _record(path, machine_id):
+    money_box = MoneyBox(money_store=[TenCent() for _ in range(4)], valid_money=[TenCent, TwentyFiveCent, FiftyCent])
+    vending_machine = VendingMachine(products=[Candy(), Candy(), Coke()], money_box=money_box)
+    recorder = TraceRecorder(path, vending_machine, machine_id=machine_id)
+    vending_action = VendingAction(vending_machine, recorder=recorder)
+
+    vending_action.try_purchase(Candy(), [FiftyCent()])
+    vending_action.try_purchase(Candy(), [TwentyFiveCent()])
+    vending_action.try_purchase(Coke(), [TwentyFiveCent()])
+    vending_action.try_purchase(Coke(), [TwentyFiveCent()])
+    recorder.close()
+
+
+def _purchase(time, outcome=SOLD):
+    return Purchase(time, Candy(), [TenCent()], outcome, [])
+
+
+@pytest.mark.analytics
+def test_aggregate_totals(tmp_path):
+    path = str(tmp_path / 'a.log')
+    _record(path, 'a')
+
+    totals = aggregate(purchases([path]))
+
+    assert totals.attempts == {'a': 4}
+    assert totals.sales == {('a', 'Candy'): 1, ('a', 'Coke'): 1}
+    assert totals.revenue == {('a', 'Candy'): Candy.price, ('a', 'Coke'): Coke.price}
+    assert totals.change_paid == {('a', 'TenCent'): 4}
+    assert totals.refunds == {('a', 'CalculateChangeError'): 1, ('a', 'NoStockException'): 1}
+    assert totals.refund_rates('a') == {'CalculateChangeError': 0.25, 'NoStockException': 0.25}
+
+
+@pytest.mark.analytics
+def test_aggregate_files_merges_machines(tmp_path):
+    paths = [str(tmp_path / '{}.log'.format(name)) for name in 'ab']
+    for path, name in zip(paths, 'ab'):
+        _record(path, name)
+
+    totals = aggregate_files(paths, processes=2)
+
+    assert totals.attempts == {'a': 4, 'b': 4}
+    assert totals.sales[('b', 'Coke')] == 1
+    assert totals.refund_rates() == {'CalculateChangeError': 0.25, 'NoStockException': 0.25}
+
+
+@pytest.mark.analytics
+def test_windows():
+    stream = [('a', _purchase(0.5)), ('a', _purchase(1.5)), ('a', _purchase(1.9, NO_STOCK)), ('a', _purchase(4.0))]
+
+    result = [(start, totals.attempts['a'], totals.sales['a', 'Candy']) for start, totals in windows(stream, 1)]
+
+    assert result == [(0, 1, 1), (1, 2, 1), (4, 1, 1)]
+
+
+@pytest.mark.analytics
+def test_rolling():
+    stream = [('a', _purchase(0.0)), ('a', _purchase(1.0, NO_CHANGE)), ('a', _purchase(2.5)), ('b', _purchase(3.2))]
+
+    result = [(time, dict(+totals.attempts)) for time, totals in rolling(stream, 2)]
+
+    assert result == [(0.0, {'a': 1}), (1.0, {'a': 2}), (2.5, {'a': 2}), (3.2, {'a': 1, 'b': 1})]
+
+
+@pytest.mark.analytics
+def test_merge():
+    first, second = SalesAggregate(), SalesAggregate()
+    first.add('a', _purchase(0))
+    second.add('a', _purchase(1))
+    second.add('b', _purchase(2, NO_STOCK))
+
+    merged = first.merge(second)
+
+    assert merged.attempts == {'a': 2, 'b': 1}
+    assert merged.revenue == {('a', 'Candy'): 20}
+    assert merged.refunds == {('b', 'NoStockException'): 1}
+
+
+@pytest.mark.analytics
+def test_sale_without_recorded_change_adds_no_revenue():
+    totals = aggregate([('m1', Purchase(0.0, Candy(), [TwentyFiveCent()], SOLD, None))])
+
+    assert totals.sales == {('m1', 'Candy'): 1}
+    assert totals.revenue == {}
@@ -0,0 +1,21 @@
+import pytest
+
+from benchmarks.run import BENCHMARKS, Result, compare, run
+
+
+@pytest.mark.benchmarks
+def test_every_benchmark_runs():
+    results = run(repeat=3)
+
+    assert [r.name for r in results] == [name for name, _ in BENCHMARKS]
+    assert all(r.ops_per_sec > 0 and r.p50 <= r.p95 <= r.p99 for r in results)
+
+
+@pytest.mark.benchmarks
+def test_compare_reports_regressions():
+    results = [Result('fast', 1000.0, 0, 0, 0), Result('slow', 500.0, 0, 0, 0), Result('new', 1.0, 0, 0, 0)]
+    baseline = {'fast': {'ops_per_sec': 1100.0}, 'slow': {'ops_per_sec': 1000.0}}
+
+    regressions = compare(results, baseline, tolerance=0.25)
+
+    assert [(r.name, expected) for r, expected in regressions] == [('slow', 1000.0)]
@@ -0,0 +1,131 @@
+import json
+
+import pytest
+
+from catalog import Catalog, PriceTable
+from exceptions import InvalidProductType
+from feasibility import FeasibilityIndex
+from money import TenCent, TwentyFiveCent, FiftyCent
+from products import Candy, Coke, Product, Snack
+from simulation import FleetSimulator
+from snapshot import dumps, loads
+from tests.helpers import make_vending_machine
+from transaction import OrderResult, VendingAction, SOLD, INSUFFICIENT_FUNDS, INVALID_PRODUCT
+
+
+def _write_catalog(path, products, version=None):
+    data = {'products': products}
+    if version is not None:
+        data['version'] = version
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+
+@pytest.mark.catalog
+def test_price_table_indexes_skus():
+    table = PriceTable.from_dict({'version': 4, 'products': {'Candy': 15, 'Coke': 30}})
+
+    assert table.version == 4
+    assert table.skus == ('Candy', 'Coke')
+    assert table.sku_id(Coke) == 1
+    assert table.price(Candy) == 15
+    assert table.price_of(1) == 30
+    assert Snack not in table
+    with pytest.raises(InvalidProductType):
+        table.price(Snack)
+
+
+@pytest.mark.catalog
+def test_new_sku_is_given_a_product_type():
+    table = PriceTable.from_dict({'products': {'Water': 60}})
+    water = table.product_types[0]
+
+    assert issubclass(water, Product)
+    assert water.__name__ == 'Water'
+    assert water() is water()
+    assert PriceTable.from_dict({'products': {'Water': 70}}).product_types[0] is water
+
+
+@pytest.mark.catalog
+def test_purchase_prices_from_catalog(tmp_path):
+    path = str(tmp_path / 'catalog.json')
+    _write_catalog(path, {'Candy': 20, 'Coke': 25})
+    catalog = Catalog(path)
+    vending_action = VendingAction(make_vending_machine([Candy(), Candy()]), catalog=catalog)
+
+    assert vending_action.purchase(Candy(), [FiftyCent()]) == [TenCent(), TenCent(), TenCent()]
+
+    _write_catalog(path, {'Candy': 40, 'Coke': 25})
+    assert catalog.reload().version == 2
+    assert vending_action.purchase(Candy(), [FiftyCent()]) == [TenCent()]
+
+
+@pytest.mark.catalog
+def test_sale_in_flight_keeps_its_price(tmp_path):
+    path = str(tmp_path / 'catalog.json')
+    _write_catalog(path, {'Candy': 20})
+    catalog = Catalog(path)
+    vending_machine = make_vending_machine([Candy()])
+    vending_action = VendingAction(vending_machine, catalog=catalog)
+
+    commit = vending_machine.commit
+
+    def reload_then_commit(*args, **kwargs):
+        _write_catalog(path, {'Candy': 40})
+        catalog.reload()
+        return commit(*args, **kwargs)
+
+    vending_machine.commit = reload_then_commit
+    change = vending_action.purchase(Candy(), [FiftyCent()])
+
+    assert change == [TenCent(), TenCent(), TenCent()]
+    assert catalog.price(Candy) == 40
+
+
+@pytest.mark.catalog
+def test_quote_of_product_not_in_catalog(tmp_path):
+    path = str(tmp_path / 'catalog.json')
+    _write_catalog(path, {'Candy': 20}, version=7)
+    catalog = Catalog(path)
+    vending_action = VendingAction(make_vending_machine([Coke()]), catalog=catalog)
+
+    assert catalog.table.version == 7
+    assert vending_action.quote(Coke(), [FiftyCent()]) == OrderResult(False, None, InvalidProductType)
+    with pytest.raises(InvalidProductType):
+        vending_action.purchase(Coke(), [FiftyCent()])
+
+
+@pytest.mark.catalog
+def test_feasibility_index_prices_from_catalog(tmp_path):
+    path = str(tmp_path / 'catalog.json')
+    _write_catalog(path, {'Candy': 10, 'Coke': 40})
+    catalog = Catalog(path)
+    index = FeasibilityIndex(make_vending_machine([Candy(), Coke()]), tenders=(TwentyFiveCent, FiftyCent),
+                             catalog=catalog)
+
+    assert index.tenders_for(Coke) == [FiftyCent]
+
+    _write_catalog(path, {'Coke': 25})
+    catalog.reload()
+    assert index.tenders_for(Coke) == [TwentyFiveCent]
+    assert not index.sellable(Candy)
+
+
+@pytest.mark.catalog
+def test_simulator_and_snapshot_price_from_catalog(tmp_path):
+    path = str(tmp_path / 'catalog.json')
+    _write_catalog(path, {'Coke': 40})
+    catalog = Catalog(path)
+
+    simulator = FleetSimulator([Candy, Coke], [TenCent, TwentyFiveCent, FiftyCent], [[1, 2]], [[5, 0, 0]], catalog)
+    outcomes, _ = simulator.step([0, 0, 0], [0, 1, 1], [[0, 0, 1], [0, 1, 0], [0, 0, 1]])
+    assert outcomes.tolist() == [INVALID_PRODUCT, INSUFFICIENT_FUNDS, SOLD]
+    assert simulator.prices.tolist() == [0, 40]
+
+    snapshot = loads(dumps(make_vending_machine([Candy(), Coke()]), catalog=catalog))
+    assert list(snapshot.prices) == [-1, 40]
+
+    table = snapshot.price_table()
+    assert table.version == catalog.table.version
+    assert table.skus == ('Coke',)
+    assert table.price(Coke) == 40
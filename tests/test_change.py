@@ -1,6 +1,6 @@
 import pytest
 
-from change import calculate_change
+from change import calculate_change, make_change, _solve
 from exceptions import CalculateChangeError
 
 
@@ -43,3 +43,49 @@ def test_change_failure():
     for arg in args:
         with pytest.raises(CalculateChangeError):
             calculate_change(arg[0], arg[1])
+
+
+@pytest.mark.change
+def test_change_uses_smaller_coins_when_greedy_fails():
+    result = calculate_change(30, [25, 10, 10, 10])
+    assert result == [10, 10, 10]
+
+
+@pytest.mark.change
+def test_make_change_fewest_coins():
+    values = (1, 5, 10, 25, 50)
+    counts = (10, 10, 10, 10, 10)
+
+    assert make_change(65, values, counts) == (0, 1, 1, 0, 1)
+    assert make_change(65, values, (10, 10, 10, 10, 0)) == (0, 1, 1, 2, 0)
+
+
+@pytest.mark.change
+def test_make_change_respects_counts():
+    assert make_change(40, (10, 25), (4, 1)) == (4, 0)
+
+    with pytest.raises(CalculateChangeError):
+        make_change(40, (10, 25), (3, 1))
+
+
+@pytest.mark.change
+def test_make_change_with_weights():
+    values = (5, 10, 25)
+    counts = (10, 10, 10)
+
+    assert make_change(30, values, counts) == (1, 0, 1)
+    # make quarters expensive to give so they are kept back
+    assert make_change(30, values, counts, weights=(1, 1, 10)) == (0, 3, 0)
+
+
+@pytest.mark.change
+def test_make_change_is_cached_on_usable_inventory():
+    values = (1, 5, 10, 50)
+    make_change(17, values, (5, 5, 5, 5))
+    hits = _solve.cache_info().hits
+
+    # the number of fifty cent coins cannot affect change for 17
+    result = make_change(17, values, (5, 5, 5, 9))
+
+    assert result == (2, 1, 1, 0)
+    assert _solve.cache_info().hits == hits + 1
@@ -0,0 +1,73 @@
+import pytest
+
+from feasibility import FeasibilityIndex
+from machine import MoneyBox, VendingMachine
+from money import FiveCent, TenCent, TwentyFiveCent, FiftyCent, OneDollarBill, TwoDollarBill
+from products import Candy, Nuts, Coke
+from transaction import VendingAction
+
+VALID_MONEY = [FiveCent, TenCent, TwentyFiveCent, FiftyCent, OneDollarBill, TwoDollarBill]
+
+
+def _check_against_quotes(index, vending_machine, product_types):
+    vending_action = VendingAction(vending_machine=vending_machine)
+    exact_change_only = False
+    for product_type in product_types:
+        feasible = [t for t in index.tenders
+                    if t.value >= product_type.price and vending_action.quote(product_type(), [t()]).success]
+        assert index.tenders_for(product_type) == feasible
+        assert index.sellable(product_type) == bool(feasible)
+        if product_type in vending_machine.inventory:
+            exact_change_only |= any(t not in feasible for t in index.tenders if t.value > product_type.price)
+    assert index.exact_change_only == exact_change_only
+
+
+@pytest.mark.feasibility
+def test_index_follows_purchases_and_restocks():
+    money_box = MoneyBox(money_store=[TenCent()] * 3, valid_money=VALID_MONEY)
+    vending_machine = VendingMachine(products=[Coke(), Nuts(), Candy()], money_box=money_box)
+    index = FeasibilityIndex(vending_machine, product_types=[Candy, Nuts, Coke])
+    vending_action = VendingAction(vending_machine=vending_machine)
+
+    _check_against_quotes(index, vending_machine, [Candy, Nuts, Coke])
+    assert index.exact_change_only
+    assert index.tenders_for(Nuts) == [OneDollarBill]
+
+    vending_action.restock([Coke()], [TwentyFiveCent()] * 8 + [FiftyCent()] * 4 + [FiveCent()] * 4)
+    _check_against_quotes(index, vending_machine, [Candy, Nuts, Coke])
+    assert not index.exact_change_only
+    assert index.sellable_products() == {Candy, Nuts, Coke}
+
+    vending_action.purchase(Candy(), [TwoDollarBill()])
+    vending_action.purchase(Nuts(), [TwoDollarBill()])
+    _check_against_quotes(index, vending_machine, [Candy, Nuts, Coke])
+    assert index.sellable_products() == {Coke}
+
+    ledger = money_box.ledger
+    while ledger.count(TwentyFiveCent):
+        vending_machine.remove_from_money_stock(TwentyFiveCent())
+        _check_against_quotes(index, vending_machine, [Candy, Nuts, Coke])
+    assert index.exact_change_only
+
+    vending_machine.remove_product(Coke())
+    vending_machine.remove_product(Coke())
+    _check_against_quotes(index, vending_machine, [Candy, Nuts, Coke])
+    assert index.sellable_products() == set()
+    assert not index.exact_change_only
+
+
+@pytest.mark.feasibility
+def test_index_picks_up_new_product_types():
+    money_box = MoneyBox(money_store=[], valid_money=VALID_MONEY)
+    vending_machine = VendingMachine(products=[], money_box=money_box)
+    index = FeasibilityIndex(vending_machine)
+
+    vending_machine.add_product(Coke())
+    assert index.sellable(Coke)
+    assert index.tenders_for(Coke) == [TwentyFiveCent]
+    assert index.exact_change_only
+
+    vending_machine.add_to_money_stock(TwentyFiveCent())
+    vending_machine.add_to_money_stock(FiftyCent())
+    assert index.tenders_for(Coke) == [TwentyFiveCent, OneDollarBill]
+    _check_against_quotes(index, vending_machine, [Coke])
@@ -0,0 +1,58 @@
+import pytest
+
+from fleet import FleetManager
+from machine import MoneyBox, VendingMachine
+from money import TenCent, TwentyFiveCent, FiftyCent
+from products import Candy, Coke
+from transaction import VendingAction
+
+VALID_MONEY = [TenCent, TwentyFiveCent, FiftyCent]
+
+
+def _machines(n):
+    return [(i, [Candy(), Candy(), Coke()], [TenCent(), TenCent()], VALID_MONEY) for i in range(n)]
+
+
+def _orders(n):
+    products = [Candy(), Coke(), Candy()]
+    tenders = [[FiftyCent()], [TwentyFiveCent()], [TenCent()]]
+    return [(i % n, products[i % 3], tenders[i // 3 % 3]) for i in range(4 * n)]
+
+
+@pytest.mark.fleet
+def test_purchases_match_a_single_process():
+    expected = {}
+    for machine_id, products, money_store, valid_money in _machines(10):
+        money_box = MoneyBox(money_store=money_store, valid_money=valid_money)
+        expected[machine_id] = VendingAction(VendingMachine(products=products, money_box=money_box))
+    expected_results = [next(expected[m].purchase_many([(p, t)])) for m, p, t in _orders(10)]
+
+    with FleetManager(workers=3) as fleet:
+        fleet.add_machines(_machines(10))
+        results = fleet.purchase(_orders(10))
+
+    assert results == expected_results
+
+
+@pytest.mark.fleet
+def test_summary_gathers_every_shard():
+    with FleetManager(workers=3) as fleet:
+        fleet.add_machines(_machines(10))
+        fleet.restock([(3, [Coke()], [FiftyCent()])])
+        fleet.purchase([(5, Coke(), [TwentyFiveCent()])])
+        summary = fleet.summary()
+
+    assert summary.machines == 10
+    assert summary.stock == {'Candy': 20, 'Coke': 10}
+    assert summary.coins == {'TenCent': 20, 'TwentyFiveCent': 1, 'FiftyCent': 1}
+    assert summary.cash == 20 * 10 + 25 + 50
+
+
+@pytest.mark.fleet
+def test_errors_are_raised_by_the_manager():
+    with FleetManager(workers=2) as fleet:
+        fleet.add_machines(_machines(2))
+        with pytest.raises(KeyError):
+            fleet.purchase([(0, Candy(), [TenCent()]), (99, Candy(), [TenCent()])])
+
+        assert fleet.summary().machines == 2
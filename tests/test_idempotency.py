@@ -0,0 +1,131 @@
+import threading
+
+import pytest
+
+from exceptions import NoStockException
+from idempotency import IdempotencyCache
+from machine import MoneyBox, VendingMachine
+from money import FiveCent, TenCent, TwentyFiveCent
+from products import Candy
+from tests.helpers import assert_list_instances_equal
+from transaction import VendingAction, NO_STOCK
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _vending_action(products, cache=None):
+    money_box = MoneyBox(money_store=[FiveCent(), TenCent()], valid_money=[FiveCent, TenCent, TwentyFiveCent])
+    return VendingAction(VendingMachine(products=products, money_box=money_box), idempotency=cache)
+
+
+@pytest.mark.idempotency
+def test_retried_purchase_returns_the_first_change():
+    vending_action = _vending_action([Candy(), Candy()])
+
+    change = vending_action.purchase(Candy(), [TwentyFiveCent()], idempotency_key='order-1')
+    retried = vending_action.purchase(Candy(), [TwentyFiveCent()], idempotency_key='order-1')
+
+    assert_list_instances_equal(change, [FiveCent(), TenCent()])
+    assert_list_instances_equal(retried, [FiveCent(), TenCent()])
+    assert vending_action.vending_machine.stock_level(Candy) == 1
+    assert vending_action.vending_machine.money_box.total_money == 25
+    assert vending_action.idempotency.stats() == {'hits': 1, 'misses': 1, 'evictions': 0, 'entries': 1}
+
+
+@pytest.mark.idempotency
+def test_retried_declined_purchase_is_declined_again():
+    vending_action = _vending_action([])
+
+    with pytest.raises(NoStockException):
+        vending_action.purchase(Candy(), [TenCent()], idempotency_key='order-1')
+    vending_action.restock([Candy()])
+    with pytest.raises(NoStockException):
+        vending_action.purchase(Candy(), [TenCent()], idempotency_key='order-1')
+
+    assert vending_action.try_purchase(Candy(), [TenCent()], idempotency_key='order-1').outcome == NO_STOCK
+    assert vending_action.vending_machine.stock_level(Candy) == 1
+
+
+@pytest.mark.idempotency
+def test_retries_do_not_share_results():
+    vending_action = _vending_action([Candy()])
+
+    for key in ('sold', 'declined'):
+        first = vending_action.try_purchase(Candy(), [TwentyFiveCent()], idempotency_key=key)
+        first.change.clear()
+        first.refund.clear()
+
+    assert_list_instances_equal(vending_action.try_purchase(Candy(), [TwentyFiveCent()], idempotency_key='sold').change,
+                                [FiveCent(), TenCent()])
+    assert_list_instances_equal(
+        vending_action.try_purchase(Candy(), [TwentyFiveCent()], idempotency_key='declined').refund, [TwentyFiveCent()])
+
+
+@pytest.mark.idempotency
+def test_retried_restock_is_added_once():
+    vending_action = _vending_action([])
+
+    for _ in range(3):
+        vending_action.restock([Candy()], [TenCent()], idempotency_key='visit-7')
+
+    assert vending_action.vending_machine.stock_level(Candy) == 1
+    assert vending_action.vending_machine.money_box.total_money == 25
+
+
+@pytest.mark.idempotency
+def test_results_expire_and_are_evicted_least_recently_used_first():
+    clock = FakeClock()
+    cache = IdempotencyCache(max_entries=2, ttl=10, clock=clock)
+
+    cache.run('a', str, 'a')
+    cache.run('b', str, 'b')
+    cache.run('a', str, 'ignored')
+    cache.run('c', str, 'c')
+    assert cache.stats() == {'hits': 1, 'misses': 3, 'evictions': 1, 'entries': 2}
+
+    clock.now = 10
+    assert cache.run('a', str, 'again') == 'again'
+    assert cache.evictions == 3
+    assert len(cache) == 1
+
+
+@pytest.mark.idempotency
+def test_failed_command_is_not_remembered():
+    cache = IdempotencyCache()
+
+    with pytest.raises(ZeroDivisionError):
+        cache.run('a', divmod, 1, 0)
+    assert cache.run('a', divmod, 7, 2) == (3, 1)
+    assert len(cache) == 1
+
+
+@pytest.mark.idempotency
+def test_concurrent_retries_run_the_command_once():
+    cache = IdempotencyCache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def command():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return len(calls)
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(cache.run('a', command)))
+    first.start()
+    started.wait()
+    retry = threading.Thread(target=lambda: results.append(cache.run('a', command)))
+    retry.start()
+    release.set()
+    first.join()
+    retry.join()
+
+    assert results == [1, 1]
+    assert cache.stats()['hits'] == 1
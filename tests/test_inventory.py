@@ -0,0 +1,54 @@
+import pytest
+
+from exceptions import NoStockException
+from inventory import Inventory
+from products import Candy, Snack, Nuts
+from tests.helpers import assert_list_instances_equal
+
+
+@pytest.mark.inventory
+def test_inventory_counts_products_by_type():
+    inventory = Inventory([Candy(), Snack(), Candy()])
+
+    assert inventory.count(Candy) == 2
+    assert inventory.count(Snack) == 1
+    assert inventory.count(Nuts) == 0
+    assert len(inventory) == 3
+    assert inventory.product_types == [Candy, Snack]
+    assert inventory.counts == (2, 1)
+
+
+@pytest.mark.inventory
+def test_inventory_add_and_remove():
+    inventory = Inventory()
+
+    inventory.add(Nuts(), 3)
+    inventory.remove(Nuts)
+
+    assert inventory.count(Nuts) == 2
+    assert Nuts in inventory
+
+
+@pytest.mark.inventory
+def test_inventory_remove_out_of_stock():
+    inventory = Inventory([Candy()])
+    inventory.remove(Candy)
+
+    with pytest.raises(NoStockException):
+        inventory.remove(Candy)
+
+    with pytest.raises(NoStockException):
+        inventory.remove(Snack)
+
+    assert Candy not in inventory
+    assert inventory.in_stock() == set()
+
+
+@pytest.mark.inventory
+def test_inventory_get_and_products():
+    candy = Candy()
+    inventory = Inventory([candy, Snack(), Candy()])
+
+    assert inventory.get(Candy) is candy
+    assert inventory.get(Nuts) is None
+    assert_list_instances_equal(inventory.products(), [Candy(), Candy(), Snack()])
@@ -0,0 +1,185 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from journal import Journal
+from money import TenCent, TwentyFiveCent, FiftyCent
+from products import Candy, Coke
+from tests.helpers import machine_state, make_vending_machine
+from transaction import VendingAction
+
+
+def _journal_lines(journal):
+    with open(journal.journal_path) as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.journal
+def test_recover_replays_journal(tmp_path):
+    vending_machine = make_vending_machine()
+    journal = Journal(str(tmp_path), group_size=1)
+    journal.attach(vending_machine)
+
+    vending_action = VendingAction(vending_machine=vending_machine)
+    vending_action.purchase(Candy(), [FiftyCent()])
+    vending_action.restock([Coke(), Coke()], [TwentyFiveCent()])
+    vending_action.purchase(Coke(), [FiftyCent()])
+    journal.close()
+
+    assert [r['kind'] for r in _journal_lines(journal)] == ['purchase', 'restock', 'purchase']
+
+    recovered = Journal.recover(str(tmp_path))
+    assert machine_state(recovered) == machine_state(vending_machine)
+
+
+@pytest.mark.journal
+def test_recover_replays_direct_adjustments(tmp_path):
+    vending_machine = make_vending_machine()
+    journal = Journal(str(tmp_path), group_size=1)
+    journal.attach(vending_machine)
+
+    vending_machine.add_to_money_stock(FiftyCent())
+    vending_machine.remove_from_money_stock(TenCent())
+    vending_machine.add_product(Coke())
+    vending_machine.remove_product(Candy())
+    journal.close()
+
+    assert [r['kind'] for r in _journal_lines(journal)] == ['adjust'] * 4
+
+    recovered = Journal.recover(str(tmp_path))
+    assert machine_state(recovered) == machine_state(vending_machine)
+
+
+@pytest.mark.journal
+def test_group_commit_holds_records_until_group_is_full(tmp_path):
+    vending_machine = make_vending_machine()
+    journal = Journal(str(tmp_path), group_size=3, group_interval=60)
+    journal.attach(vending_machine)
+
+    vending_action = VendingAction(vending_machine=vending_machine)
+    vending_action.restock([Candy()])
+    vending_action.restock([Candy()])
+    assert _journal_lines(journal) == []
+
+    vending_action.restock([Candy()])
+    assert len(_journal_lines(journal)) == 3
+    journal.close()
+
+
+@pytest.mark.journal
+def test_records_left_after_a_burst_are_synced_within_the_interval(tmp_path):
+    vending_machine = make_vending_machine()
+    journal = Journal(str(tmp_path), group_size=100, group_interval=0.02)
+    journal.attach(vending_machine)
+
+    VendingAction(vending_machine=vending_machine).restock([Candy()])
+    deadline = time.monotonic() + 5
+    while not _journal_lines(journal) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert len(_journal_lines(journal)) == 1
+    journal.close()
+
+
+@pytest.mark.journal
+def test_snapshot_starts_journal_again(tmp_path):
+    vending_machine = make_vending_machine()
+    journal = Journal(str(tmp_path), group_size=1, snapshot_interval=2)
+    journal.attach(vending_machine)
+
+    vending_action = VendingAction(vending_machine=vending_machine)
+    vending_action.purchase(Candy(), [TenCent()])
+    vending_action.purchase(Candy(), [TenCent()])
+    vending_action.restock([Candy()], [FiftyCent()])
+    journal.close()
+
+    with open(journal.snapshot_path) as f:
+        assert json.load(f)['seq'] == 2
+    assert [r['seq'] for r in _journal_lines(journal)] == [3]
+
+    recovered = Journal.recover(str(tmp_path))
+    assert machine_state(recovered) == machine_state(vending_machine)
+
+
+@pytest.mark.journal
+def test_recover_ignores_record_cut_short(tmp_path):
+    vending_machine = make_vending_machine()
+    journal = Journal(str(tmp_path), group_size=1)
+    journal.attach(vending_machine)
+
+    VendingAction(vending_machine=vending_machine).purchase(Candy(), [FiftyCent()])
+    state = machine_state(vending_machine)
+    journal.close()
+
+    with open(journal.journal_path, 'a') as f:
+        f.write('{"seq":2,"kind":"pur')
+
+    recovered = Journal.recover(str(tmp_path))
+    assert machine_state(recovered) == state
+    assert os.path.exists(journal.snapshot_path)
+
+
+@pytest.mark.journal
+@pytest.mark.parametrize('change', [
+    lambda vending_machine: vending_machine.restock([Coke(), Coke(), Coke()]),
+    lambda vending_machine: vending_machine.remove_product(Coke()),
+    lambda vending_machine: vending_machine.add_product(Coke()),
+])
+def test_snapshot_during_concurrent_change_is_not_replayed_twice(tmp_path, change):
+    vending_machine = make_vending_machine([Coke()], [], concurrent=True)
+    journal = Journal(str(tmp_path), group_size=1, snapshot_interval=1000)
+    journal.attach(vending_machine)
+
+    # while a sale holds the money box lock, the change waits for it and a snapshot
+    # is taken, as when the sale's record fills the snapshot interval
+    with vending_machine._money_lock:
+        thread = threading.Thread(target=change, args=(vending_machine,))
+        thread.start()
+        time.sleep(0.05)
+        with journal._lock:
+            journal._snapshot()
+    thread.join()
+    journal.close()
+
+    recovered = Journal.recover(str(tmp_path))
+    assert machine_state(recovered) == machine_state(vending_machine)
+
+
+@pytest.mark.journal
+def test_snapshot_waits_for_a_sale_to_be_journaled(tmp_path):
+    vending_machine = make_vending_machine([Candy(), Candy()], concurrent=True)
+    journal = Journal(str(tmp_path), group_size=1)
+    snapshots = []
+
+    # runs after the sale is applied but before the journal is told about it
+    def snapshot_in_another_thread(delta):
+        thread = threading.Thread(target=journal.snapshot)
+        thread.start()
+        thread.join(0.05)
+        snapshots.append(thread)
+
+    vending_machine.add_listener(snapshot_in_another_thread)
+    journal.attach(vending_machine)
+    VendingAction(vending_machine=vending_machine).purchase(Candy(), [FiftyCent()])
+    snapshots[0].join()
+    journal.close()
+
+    recovered = Journal.recover(str(tmp_path))
+    assert machine_state(recovered) == machine_state(vending_machine)
+
+
+@pytest.mark.journal
+def test_close_stops_journaling(tmp_path):
+    vending_machine = make_vending_machine()
+    journal = Journal(str(tmp_path), group_size=1)
+    journal.attach(vending_machine)
+    journal.close()
+
+    change = VendingAction(vending_machine=vending_machine).purchase(Candy(), [FiftyCent()])
+
+    assert len(change) == 4
+    assert vending_machine.listeners == []
+    assert _journal_lines(journal) == []
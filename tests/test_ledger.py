@@ -0,0 +1,87 @@
+import pytest
+
+from exceptions import InvalidMoneyTypes, MoneyTypeNotInStock
+from ledger import Ledger
+from money import OneCent, FiveCent, TenCent, OneDollarBill
+from tests.helpers import assert_list_instances_equal
+
+
+@pytest.mark.ledger
+def test_ledger_orders_denominations_by_value():
+    ledger = Ledger([OneDollarBill, TenCent, OneCent])
+
+    assert ledger.denominations == (OneCent, TenCent, OneDollarBill)
+    assert ledger.values == (1, 10, 100)
+    assert ledger.counts == (0, 0, 0)
+
+
+@pytest.mark.ledger
+def test_ledger_add_and_remove():
+    ledger = Ledger([OneCent, FiveCent])
+
+    ledger.add(FiveCent, 3)
+    ledger.add(OneCent)
+    ledger.remove(FiveCent)
+
+    assert ledger.counts == (1, 2)
+    assert ledger.balance == 11
+    assert len(ledger) == 3
+    assert FiveCent in ledger
+
+
+@pytest.mark.ledger
+def test_ledger_rejects_invalid_money_type():
+    ledger = Ledger([OneCent])
+
+    with pytest.raises(InvalidMoneyTypes):
+        ledger.add(TenCent)
+
+
+@pytest.mark.ledger
+def test_ledger_remove_money_type_not_in_stock():
+    ledger = Ledger([OneCent, FiveCent])
+    ledger.add(OneCent)
+
+    with pytest.raises(MoneyTypeNotInStock):
+        ledger.remove(FiveCent)
+
+    with pytest.raises(MoneyTypeNotInStock):
+        ledger.remove(TenCent)
+
+    assert FiveCent not in ledger
+    assert TenCent not in ledger
+
+
+@pytest.mark.ledger
+def test_ledger_tally():
+    ledger = Ledger([OneCent, FiveCent, TenCent])
+
+    assert ledger.tally([TenCent(), OneCent(), TenCent()]) == [1, 0, 2]
+
+    with pytest.raises(InvalidMoneyTypes):
+        ledger.tally([OneDollarBill()])
+
+
+@pytest.mark.ledger
+def test_ledger_apply_is_all_or_nothing():
+    ledger = Ledger([OneCent, FiveCent])
+    ledger.add(OneCent, 2)
+
+    ledger.apply([-1, 2])
+    assert ledger.counts == (1, 2)
+    assert ledger.balance == 11
+
+    with pytest.raises(MoneyTypeNotInStock):
+        ledger.apply([1, -3])
+
+    assert ledger.counts == (1, 2)
+    assert ledger.balance == 11
+
+
+@pytest.mark.ledger
+def test_ledger_money_objects():
+    ledger = Ledger([OneCent, FiveCent])
+    ledger.add(FiveCent)
+    ledger.add(OneCent, 2)
+
+    assert_list_instances_equal(ledger.money_objects(), [OneCent(), OneCent(), FiveCent()])
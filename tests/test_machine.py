@@ -1,9 +1,9 @@
 import mock
 import pytest
 
-from exceptions import InvalidMoneyTypes, MoneyTypeNotInStock, InvalidMoneyBox, NoStockException
+from exceptions import InvalidMoneyTypes, MoneyTypeNotInStock, InvalidMoneyBox, NoStockException, CalculateChangeError
 from machine import MoneyBox, VendingMachine
-from money import OneCent, FiveCent, TenCent
+from money import OneCent, FiveCent, TenCent, TwentyFiveCent, OneDollarBill
 from products import Candy, Snack
 from tests.helpers import assert_list_instances_equal
 
@@ -259,3 +259,104 @@ def test_get_product_of_type():
 
     assert vending_machine.get_product_of_type(Snack) == products[1]
     assert vending_machine.get_product_of_type(Candy) == products[0]
+
+
+@pytest.mark.vending_machine
+def test_restock_is_a_single_change():
+    money_box = MoneyBox(money_store=[], valid_money=[FiveCent, TenCent])
+    vending_machine = VendingMachine(products=[Candy()], money_box=money_box)
+    deltas = []
+    vending_machine.add_listener(deltas.append)
+
+    vending_machine.restock([Snack(), Candy(), Snack()], [TenCent(), FiveCent(), TenCent()])
+
+    assert vending_machine.stock_level(Candy) == 2
+    assert vending_machine.stock_level(Snack) == 2
+    assert money_box.total_money == 25
+    assert [(d.kind, dict(d.product_delta), d.money_delta) for d in deltas] == [
+        ('restock', {Candy: 1, Snack: 2}, (1, 2))]
+
+
+@pytest.mark.vending_machine
+def test_failing_listener_does_not_fail_the_change():
+    money_box = MoneyBox(money_store=[], valid_money=[FiveCent, TenCent])
+    vending_machine = VendingMachine(products=[], money_box=money_box)
+    deltas = []
+
+    def failing_listener(delta):
+        raise ValueError("write to closed file")
+
+    vending_machine.add_listener(failing_listener)
+    vending_machine.add_listener(deltas.append)
+    vending_machine.restock([Candy()], [TenCent()])
+    vending_machine.remove_listener(failing_listener)
+    vending_machine.restock([Candy()])
+
+    assert vending_machine.stock_level(Candy) == 2
+    assert vending_machine.listeners == [deltas.append]
+    assert [d.kind for d in deltas] == ['restock', 'restock']
+
+
+@pytest.mark.vending_machine
+def test_restock_from_generators():
+    money_box = MoneyBox(money_store=[], valid_money=[FiveCent, TenCent])
+    vending_machine = VendingMachine(products=[], money_box=money_box)
+
+    vending_machine.restock((Snack() for _ in range(3)), (TenCent() for _ in range(2)))
+
+    assert vending_machine.stock_level(Snack) == 3
+    assert money_box.total_money == 20
+
+
+@pytest.mark.vending_machine
+def test_restock_with_invalid_money_adds_nothing():
+    money_box = MoneyBox(money_store=[], valid_money=[FiveCent, TenCent])
+    vending_machine = VendingMachine(products=[], money_box=money_box)
+
+    with pytest.raises(InvalidMoneyTypes):
+        vending_machine.restock([Candy()], [TenCent(), OneCent()])
+
+    assert vending_machine.stock_level(Candy) == 0
+    assert money_box.total_money == 0
+
+
+@pytest.mark.vending_machine
+def test_collect():
+    money_box = MoneyBox(money_store=[FiveCent(), TenCent(), TenCent(), TenCent()], valid_money=[FiveCent, TenCent])
+    vending_machine = VendingMachine(products=[], money_box=money_box)
+
+    assert vending_machine.collect(counts={TenCent: 2}) == (0, 2)
+    assert vending_machine.collect(amount=15) == (1, 1)
+    assert money_box.total_money == 0
+
+
+@pytest.mark.vending_machine
+def test_collect_amount_only_asks_the_policy_when_greedy_fails():
+    money_box = MoneyBox(money_store=[TenCent() for _ in range(3)] + [TwentyFiveCent()] + [OneDollarBill()] * 1000,
+                         valid_money=[TenCent, TwentyFiveCent, OneDollarBill])
+    vending_machine = VendingMachine(products=[], money_box=money_box)
+
+    with mock.patch.object(money_box, 'change_counts', wraps=money_box.change_counts) as change_counts:
+        assert vending_machine.collect(amount=100000) == (0, 0, 1000)
+        assert not change_counts.called
+
+        assert vending_machine.collect(amount=30) == (3, 0, 0)
+        assert change_counts.called
+    assert money_box.total_money == 25
+
+
+@pytest.mark.vending_machine
+@pytest.mark.parametrize('kwargs, exception', [
+    ({'counts': {FiveCent: 1, TenCent: 2}}, MoneyTypeNotInStock),
+    ({'counts': {OneCent: 1}}, MoneyTypeNotInStock),
+    ({'amount': 7}, CalculateChangeError),
+    ({}, ValueError),
+])
+def test_collect_takes_nothing_when_it_cannot_take_everything(kwargs, exception):
+    money_box = MoneyBox(money_store=[FiveCent(), TenCent()], valid_money=[FiveCent, TenCent])
+    vending_machine = VendingMachine(products=[], money_box=money_box)
+
+    with pytest.raises(exception):
+        vending_machine.collect(**kwargs)
+
+    assert money_box.ledger.counts == (1, 1)
@@ -0,0 +1,120 @@
+import urllib.request
+
+import pytest
+
+from exceptions import NoStockException
+from machine import MoneyBox, VendingMachine
+from metrics import Metrics
+from money import TenCent, FiftyCent
+from products import Candy, Snack
+from transaction import VendingAction
+
+
+def _vending_action(metrics):
+    money_box = MoneyBox(money_store=[TenCent() for _ in range(4)], valid_money=[TenCent, FiftyCent])
+    vending_machine = VendingMachine(products=[Candy()], money_box=money_box)
+    return VendingAction(vending_machine=vending_machine, metrics=metrics)
+
+
+@pytest.mark.metrics
+def test_purchase_records_counters_and_stages():
+    metrics = Metrics()
+    vending_action = _vending_action(metrics)
+
+    vending_action.purchase(Candy(), [FiftyCent()])
+    with pytest.raises(NoStockException):
+        vending_action.purchase(Snack(), [FiftyCent()])
+
+    assert metrics.counters[('vending_sales_total', None)] == 1
+    assert metrics.counters[('vending_refunds_total', ('reason', 'NoStockException'))] == 1
+    assert metrics.counters[('vending_coins_dispensed_total', ('denomination', 'TenCent'))] == 4
+    assert metrics.histograms['purchase'].count == 1
+    assert metrics.histograms['check_stock'].count == 1
+    for stage in ('total_money', 'validate_money', 'calculate_change', 'commit', 'dispense_change'):
+        assert metrics.histograms[stage].count >= 1
+
+
+@pytest.mark.metrics
+@pytest.mark.parametrize('purchase', [
+    lambda vending_action, product, money_objects: vending_action.try_purchase(product, money_objects),
+    lambda vending_action, product, money_objects: next(vending_action.purchase_many([(product, money_objects)])),
+])
+def test_every_purchase_api_records_the_same_metrics(purchase):
+    metrics = Metrics()
+    vending_action = _vending_action(metrics)
+
+    purchase(vending_action, Candy(), [FiftyCent()])
+    purchase(vending_action, Snack(), [FiftyCent()])
+
+    assert metrics.counters[('vending_sales_total', None)] == 1
+    assert metrics.counters[('vending_refunds_total', ('reason', 'NoStockException'))] == 1
+    assert metrics.counters[('vending_coins_dispensed_total', ('denomination', 'TenCent'))] == 4
+    assert metrics.histograms['purchase'].count == 1
+    for stage in ('total_money', 'validate_money'):
+        assert metrics.histograms[stage].count >= 1
+    for stage in ('check_stock', 'calculate_change', 'commit'):
+        assert metrics.histograms[stage].count == 1
+
+@pytest.mark.metrics
+def test_purchase_without_metrics_records_nothing():
+    vending_action = _vending_action(None)
+
+    assert vending_action.purchase(Candy(), [TenCent()]) == []
+
+
+@pytest.mark.metrics
+def test_instrument_money_box():
+    metrics = Metrics()
+    money_box = MoneyBox(money_store=[TenCent() for _ in range(4)], valid_money=[TenCent, FiftyCent])
+    metrics.instrument_money_box(money_box)
+    vending_machine = VendingMachine(products=[Candy()], money_box=money_box)
+
+    assert len(VendingAction(vending_machine).purchase(Candy(), [FiftyCent()])) == 4
+
+    assert metrics.histograms['money_box_change_counts'].count == 1
+    assert metrics.histograms['ledger_apply'].count == 1
+
+
+@pytest.mark.metrics
+def test_render_prometheus_text():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.inc('vending_sales_total')
+    metrics.inc('vending_refunds_total', ('reason', 'NoStockException'), 2)
+    metrics.observe('commit', 0.05)
+    metrics.observe('commit', 0.5)
+
+    assert metrics.render().splitlines() == [
+        '# HELP vending_refunds_total Purchases refused, by the exception that refused them.',
+        '# TYPE vending_refunds_total counter',
+        'vending_refunds_total{reason="NoStockException"} 2',
+        '# HELP vending_sales_total Purchases completed.',
+        '# TYPE vending_sales_total counter',
+        'vending_sales_total 1',
+        '# HELP vending_stage_seconds Time spent in each stage of a purchase or money box operation.',
+        '# TYPE vending_stage_seconds histogram',
+        'vending_stage_seconds_bucket{stage="commit",le="0.1"} 1',
+        'vending_stage_seconds_bucket{stage="commit",le="1.0"} 2',
+        'vending_stage_seconds_bucket{stage="commit",le="+Inf"} 2',
+        'vending_stage_seconds_sum{stage="commit"} 0.55',
+        'vending_stage_seconds_count{stage="commit"} 2',
+    ]
+
+
+@pytest.mark.metrics
+def test_write_and_serve(tmp_path):
+    metrics = Metrics()
+    metrics.inc('vending_sales_total')
+
+    path = str(tmp_path / 'vending.prom')
+    metrics.write_textfile(path)
+    with open(path) as f:
+        assert f.read() == metrics.render()
+
+    server = metrics.serve(0)
+    try:
+        url = 'http://127.0.0.1:{}/metrics'.format(server.server_address[1])
+        with urllib.request.urlopen(url) as response:
+            assert response.read().decode() == metrics.render()
+    finally:
+        server.shutdown()
+        server.server_close()
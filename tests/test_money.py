@@ -0,0 +1,33 @@
+import pickle
+
+import pytest
+
+from money import OneCent, FiveCent, TenCent, OneDollarBill
+
+
+@pytest.mark.money
+def test_money_objects_are_shared():
+    assert OneCent() is OneCent()
+    assert OneDollarBill() is OneDollarBill()
+    assert OneCent() is not FiveCent()
+
+
+@pytest.mark.money
+def test_money_objects_have_no_instance_dict():
+    assert not hasattr(TenCent(), '__dict__')
+
+    with pytest.raises(AttributeError):
+        TenCent().value = 20
+
+
+@pytest.mark.money
+def test_money_equality_and_hashing():
+    assert TenCent() == TenCent()
+    assert TenCent() != FiveCent()
+    assert TenCent() != 10
+    assert len({TenCent(), TenCent(), FiveCent()}) == 2
+
+
+@pytest.mark.money
+def test_money_pickles_to_shared_instance():
+    assert pickle.loads(pickle.dumps(TenCent())) is TenCent()
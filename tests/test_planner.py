@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from money import FiveCent, TenCent, TwentyFiveCent, FiftyCent, OneDollarBill
+from planner import RestockPlan, plan_restock
+from policies import FewestCoins, evaluate
+from products import Candy, Coke, Snack, Soda
+
+VALID_MONEY = [FiveCent, TenCent, TwentyFiveCent, FiftyCent, OneDollarBill]
+
+
+def random_trace(n, seed):
+    rng = np.random.default_rng(seed)
+    products = [Candy(), Snack(), Coke(), Soda()]
+    tenders = [[OneDollarBill()], [FiftyCent()], [TwentyFiveCent(), TwentyFiveCent()]]
+    return [(products[rng.choice(4, p=[0.5, 0.2, 0.2, 0.1])], tenders[rng.integers(3)]) for _ in range(n)]
+
+
+@pytest.mark.planner
+def test_plan_fills_capacity():
+    plan = plan_restock(random_trace(60, seed=1), VALID_MONEY, slot_capacity=40, float_capacity=30)
+
+    assert sum(plan.product_counts.values()) == 40
+    assert sum(plan.float_counts.values()) == 30
+    assert len(plan.products()) == 40
+    assert len(plan.money_store()) == 30
+
+
+@pytest.mark.planner
+def test_plan_losses_match_replaying_the_trace():
+    trace = random_trace(80, seed=2)
+    plan = plan_restock(trace, VALID_MONEY, slot_capacity=60, float_capacity=20)
+
+    report = evaluate(trace, [FewestCoins()], plan.products(), plan.money_store(), VALID_MONEY)['fewest_coins']
+    assert (report.no_stock, report.no_change) == (plan.lost_no_stock, plan.lost_no_change)
+
+
+@pytest.mark.planner
+def test_plan_beats_an_even_load():
+    trace = random_trace(80, seed=3)
+    plan = plan_restock(trace, VALID_MONEY, slot_capacity=60, float_capacity=20)
+
+    even = RestockPlan({t: 15 for t in (Candy, Snack, Coke, Soda)}, {t: 4 for t in VALID_MONEY})
+    report = evaluate(trace, [FewestCoins()], even.products(), even.money_store(), VALID_MONEY)['fewest_coins']
+    assert plan.lost_no_stock + plan.lost_no_change < report.no_stock + report.no_change
+
+
+@pytest.mark.planner
+def test_plan_is_scored_per_service_interval():
+    # forty candies between visits, with room for only thirty
+    trace = [(Candy(), [TenCent()])] * 80
+    plan = plan_restock(trace, VALID_MONEY, slot_capacity=30, float_capacity=0, service_interval=40)
+
+    assert plan.product_counts == {Candy: 30}
+    assert plan.lost_no_stock == 20
+    assert plan.lost_no_change == 0
+
+
+@pytest.mark.planner
+def test_plan_builds_a_vending_machine():
+    plan = RestockPlan({Candy: 2, Coke: 1}, {TenCent: 3})
+    vending_machine = plan.build(VALID_MONEY)
+
+    assert vending_machine.stock_level(Candy) == 2
+    assert vending_machine.stock_level(Coke) == 1
+    assert vending_machine.money_box.total_money == 30
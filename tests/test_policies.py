@@ -0,0 +1,62 @@
+import pytest
+
+from exceptions import CalculateChangeError
+from machine import MoneyBox
+from money import FiveCent, TenCent, TwentyFiveCent, FiftyCent, OneDollarBill
+from policies import BalanceToFloat, FewestCoins, Greedy, PreserveScarce, evaluate
+from products import Candy, Coke
+
+VALUES = (5, 10, 25)
+
+
+@pytest.mark.policies
+def test_greedy_gives_largest_first():
+    assert Greedy().change(30, VALUES, (5, 5, 5)) == (1, 0, 1)
+    assert Greedy().change(30, VALUES, (0, 3, 1)) is None
+
+
+@pytest.mark.policies
+def test_fewest_coins():
+    assert FewestCoins().change(30, VALUES, (0, 3, 1)) == (0, 3, 0)
+
+
+@pytest.mark.policies
+def test_preserve_scarce_keeps_back_last_coins():
+    # one quarter left, plenty of dimes and nickels
+    assert FewestCoins().change(30, VALUES, (20, 20, 1)) == (1, 0, 1)
+    assert PreserveScarce().change(30, VALUES, (20, 20, 1)) == (0, 3, 0)
+
+
+@pytest.mark.policies
+def test_balance_to_float_pays_out_surplus_first():
+    policy = BalanceToFloat({FiveCent: 20, TenCent: 20, TwentyFiveCent: 2})
+
+    assert policy.change(50, VALUES, (20, 20, 10)) == (0, 0, 2)
+    assert policy.change(50, VALUES, (20, 40, 2)) == (0, 5, 0)
+
+
+@pytest.mark.policies
+def test_money_box_uses_policy():
+    money_store = [TenCent(), TenCent(), TenCent(), TwentyFiveCent()]
+    valid_money = [FiveCent, TenCent, TwentyFiveCent]
+
+    assert MoneyBox(money_store, valid_money).calculate_change(30) == [TenCent()] * 3
+
+    with pytest.raises(CalculateChangeError):
+        MoneyBox(money_store, valid_money, policy=Greedy()).calculate_change(30)
+
+
+@pytest.mark.policies
+def test_evaluate_counts_failed_sales_per_policy():
+    products = [Candy(), Coke()]
+    money_store = [TenCent()] * 4 + [TwentyFiveCent()]
+    valid_money = [FiveCent, TenCent, TwentyFiveCent, FiftyCent, OneDollarBill]
+    orders = [(Candy(), [FiftyCent()]), (Coke(), [FiftyCent()]), (Coke(), [FiftyCent()])]
+
+    reports = evaluate(orders, [Greedy(), FewestCoins()], products, money_store, valid_money)
+
+    # greedy gives a quarter and a dime towards 40 cents change and cannot find the last 5 cents
+    assert reports == {
+        'greedy': (1, 1, 1, 0),
+        'fewest_coins': (2, 0, 1, 0),
+    }
@@ -0,0 +1,26 @@
+import pickle
+
+import pytest
+
+from products import Product, Candy, Snack
+
+
+@pytest.mark.products
+def test_products_are_shared():
+    assert Candy() is Candy()
+    assert Candy() is not Snack()
+    assert pickle.loads(pickle.dumps(Candy())) is Candy()
+
+
+@pytest.mark.products
+def test_product_equality_and_hashing():
+    assert Candy() == Candy()
+    assert Candy() != Snack()
+    assert len({Candy(), Candy(), Snack()}) == 2
+    assert not hasattr(Candy(), '__dict__')
+
+
+@pytest.mark.products
+def test_product_without_price():
+    with pytest.raises(AttributeError):
+        Product()
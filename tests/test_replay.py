@@ -0,0 +1,90 @@
+import pytest
+
+from money import OneCent, TenCent, TwentyFiveCent, FiftyCent
+from products import Candy, Coke, Snack
+from recorder import MoneyAdjustment, Purchase, Restock, TraceRecorder, read_trace
+from replay import main, replay
+from tests.helpers import make_vending_machine
+from transaction import VendingAction, SOLD, NO_CHANGE, NO_STOCK, INSUFFICIENT_FUNDS, INVALID_MONEY
+
+VALID_MONEY = [TenCent, TwentyFiveCent, FiftyCent]
+
+
+def _record(path):
+    vending_machine = make_vending_machine([Candy(), Coke()], [TenCent()] * 2, VALID_MONEY)
+    recorder = TraceRecorder(path, vending_machine)
+    vending_action = VendingAction(vending_machine, recorder=recorder)
+
+    vending_action.try_purchase(Candy(), [FiftyCent()])
+    vending_action.purchase(Coke(), [TwentyFiveCent()])
+    with pytest.raises(Exception):
+        vending_action.purchase(Coke(), [FiftyCent()])
+    vending_action.restock([Snack(), Snack()], [TenCent()])
+    list(vending_action.purchase_many([(Snack(), [TenCent()]), (Snack(), [OneCent()] * 50)]))
+    vending_action.add_money_objects_to_money_stock([FiftyCent()])
+    recorder.close()
+
+
+@pytest.mark.replay
+def test_recorder_writes_every_call(tmp_path):
+    path = str(tmp_path / 'trace.log')
+    _record(path)
+
+    header, events = read_trace(path)
+    events = [e._replace(time=0) for e in events]
+
+    assert header['money'] == {'TenCent': 2}
+    assert header['products'] == {'Candy': 1, 'Coke': 1}
+    assert events == [
+        Purchase(0, Candy(), [FiftyCent()], NO_CHANGE, []),
+        Purchase(0, Coke(), [TwentyFiveCent()], SOLD, []),
+        Purchase(0, Coke(), [FiftyCent()], NO_STOCK, []),
+        Restock(0, [Snack(), Snack()], [TenCent()]),
+        Purchase(0, Snack(), [TenCent()], INSUFFICIENT_FUNDS, []),
+        Purchase(0, Snack(), [OneCent()] * 50, INVALID_MONEY, []),
+        MoneyAdjustment(0, FiftyCent(), 1),
+    ]
+
+
+@pytest.mark.replay
+def test_replay_matches_recording(tmp_path):
+    path = str(tmp_path / 'trace.log')
+    _record(path)
+
+    report = replay(path)
+
+    assert report.operations == 7
+    assert report.purchases == 5
+    assert report.divergences == []
+    assert report.p50 <= report.p95 <= report.p99
+    assert main([path]) == 0
+
+
+@pytest.mark.replay
+def test_replay_reports_divergences(tmp_path):
+    path = str(tmp_path / 'trace.log')
+    vending_machine = make_vending_machine([Candy(), Coke()], [TenCent()] * 2, VALID_MONEY)
+    recorder = TraceRecorder(path, vending_machine)
+    vending_action = VendingAction(vending_machine, recorder=recorder)
+    vending_action.purchase(Candy(), [TenCent()])
+    recorder.purchase(Candy(), [TenCent()], SOLD)
+    recorder.close()
+
+    report = replay(path, rate=1000)
+
+    assert [(d.index, d.recorded, d.replayed) for d in report.divergences] == [(1, SOLD, NO_STOCK)]
+    assert main([path]) == 1
+
+
+@pytest.mark.replay
+def test_format_1_trace_is_read_without_change(tmp_path):
+    path = str(tmp_path / 'trace.log')
+    with open(path, 'w') as f:
+        f.write('{"format":1,"machine":"m1","valid_money":["FiveCent","TenCent","TwentyFiveCent"],'
+                '"money":{"FiveCent":1,"TenCent":1},"products":{"Candy":1}}\n')
+        f.write('["n","Candy"]\n["n","TwentyFiveCent"]\n["p",0.1,0,[1],0]\n')
+
+    header, events = read_trace(path)
+
+    assert list(events) == [Purchase(0.1, Candy(), [TwentyFiveCent()], SOLD, None)]
+    assert replay(path).divergences == []
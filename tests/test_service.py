@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+import pytest
+
+from exceptions import NoStockException
+from money import TenCent, TwentyFiveCent, FiftyCent
+from products import Candy, Coke
+from service import VendingService, _STOP
+from tests.helpers import assert_list_instances_equal, make_vending_machine
+
+
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+@pytest.mark.service
+def test_service_purchase_and_quote():
+    vending_machine = make_vending_machine([Candy()], [TenCent()] * 100)
+
+    async def session():
+        async with VendingService({'a': vending_machine}) as service:
+            quote = await service.quote('a', Candy(), [FiftyCent()])
+            change = await service.purchase('a', Candy(), [FiftyCent()])
+            with pytest.raises(NoStockException):
+                await service.purchase('a', Candy(), [TenCent()])
+            return quote, change, service
+
+    quote, change, service = _run(session())
+
+    assert quote.success
+    assert quote.change == (4, 0, 0)
+    assert len(change) == 4
+    assert_list_instances_equal(change, [TenCent()] * 4)
+    assert vending_machine.stock_level(Candy) == 0
+    assert service.latency['quote'].count == 1
+    assert service.latency['purchase'].count == 2
+
+
+@pytest.mark.service
+def test_service_many_sessions_share_machines():
+    vending_machines = {'a': make_vending_machine([], [TenCent()] * 100), 'b': make_vending_machine([], [TenCent()] * 100)}
+
+    async def client(service, machine_id):
+        await service.restock(machine_id, [Coke()], [TwentyFiveCent()])
+        return await service.purchase(machine_id, Coke(), [FiftyCent()])
+
+    async def session():
+        service = VendingService(vending_machines, max_queue_size=8, batch_size=4)
+        await service.start()
+        results = await asyncio.gather(*[client(service, machine_id) for machine_id in ['a', 'b'] * 1000])
+        depth = service.queue_depth()
+        await service.stop()
+        return results, depth, service
+
+    results, depth, service = _run(session())
+
+    assert len(results) == 2000
+    assert all(sum(m.value for m in change) == 25 for change in results)
+    assert depth == 0
+    assert service.latency['restock'].count == 2000
+    assert service.latency['purchase'].max >= service.latency['purchase'].mean > 0
+    for vending_machine in vending_machines.values():
+        assert vending_machine.stock_level(Coke) == 0
+        assert vending_machine.money_box.total_money == 1000 + 1000 * (TwentyFiveCent.value + Coke.price)
+
+
+@pytest.mark.service
+def test_service_fails_commands_sent_after_stop():
+    vending_machine = make_vending_machine([Candy(), Candy()], [TenCent()] * 100)
+
+    async def session():
+        service = VendingService({'a': vending_machine})
+        await service.start()
+        loop = asyncio.get_running_loop()
+        queue = service._queues['a']
+        served, unserved = loop.create_future(), loop.create_future()
+        queue.put_nowait(('purchase', (Candy(), [FiftyCent()]), served, time.perf_counter()))
+        queue.put_nowait(_STOP)
+        queue.put_nowait(('purchase', (Candy(), [FiftyCent()]), unserved, time.perf_counter()))
+        await asyncio.gather(*service._workers)
+        return served, unserved
+
+    served, unserved = _run(session())
+
+    assert len(served.result()) == 4
+    with pytest.raises(RuntimeError):
+        unserved.result()
+    assert vending_machine.stock_level(Candy) == 1
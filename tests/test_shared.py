@@ -0,0 +1,69 @@
+import multiprocessing
+
+import pytest
+
+from exceptions import InvalidProductType
+from money import TenCent, TwentyFiveCent, FiftyCent
+from products import Candy, Coke, Snack
+from shared import SharedVendingMachine, create
+from tests.helpers import make_vending_machine
+from transaction import VendingAction
+
+PRODUCTS = [Candy()] * 100 + [Coke()] * 100
+MONEY_STORE = [TenCent()] * 50 + [TwentyFiveCent()] * 50
+
+
+def _serve(path, n):
+    vending_machine = SharedVendingMachine(path)
+    vending_action = VendingAction(vending_machine)
+    orders = [(Candy(), [FiftyCent()]), (Coke(), [FiftyCent()]), (Coke(), [TwentyFiveCent()])] * n
+    sales = sum(result.success for result in vending_action.purchase_many(orders))
+    vending_machine.close()
+    return sales
+
+
+@pytest.mark.shared
+def test_processes_share_one_vending_machine(tmp_path):
+    path = str(tmp_path / 'machine.shm')
+    original = make_vending_machine(PRODUCTS, MONEY_STORE)
+    create(path, original)
+
+    with multiprocessing.get_context('fork').Pool(4) as pool:
+        sales = sum(pool.starmap(_serve, [(path, 20)] * 4))
+
+    vending_machine = SharedVendingMachine(path)
+    sold = 200 - len(vending_machine.inventory)
+    money_box = vending_machine.money_box
+
+    assert sold == sales
+    assert money_box.total_money == original.money_box.total_money + \
+        Candy.price * (100 - vending_machine.stock_level(Candy)) + Coke.price * (100 - vending_machine.stock_level(Coke))
+    assert money_box.total_money == sum(m.value for m in money_box.money_store)
+    vending_machine.close()
+
+
+@pytest.mark.shared
+def test_changes_are_seen_by_every_opener(tmp_path):
+    path = str(tmp_path / 'machine.shm')
+    create(path, make_vending_machine(PRODUCTS, MONEY_STORE))
+    writer = SharedVendingMachine(path)
+    reader = SharedVendingMachine(path)
+
+    VendingAction(writer).purchase(Coke(), [FiftyCent()])
+
+    assert reader.stock_level(Coke) == 99
+    assert reader.money_box.ledger.counts == writer.money_box.ledger.counts
+    assert reader.money_box.ledger.version == writer.money_box.ledger.version
+    writer.close()
+    reader.close()
+
+
+@pytest.mark.shared
+def test_product_types_are_fixed(tmp_path):
+    path = str(tmp_path / 'machine.shm')
+    create(path, make_vending_machine(PRODUCTS, MONEY_STORE))
+    vending_machine = SharedVendingMachine(path)
+
+    with pytest.raises(InvalidProductType):
+        vending_machine.restock([Snack()])
+    vending_machine.close()
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from change import make_change as scalar_make_change
+from exceptions import CalculateChangeError, InsufficientFundsForPurchase, NoStockException
+from machine import MoneyBox, VendingMachine
+from money import OneCent, FiveCent, TenCent, TwentyFiveCent, FiftyCent, OneDollarBill, TwoDollarBill
+from products import Candy, Snack, Nuts, Coke, Pepsi, Soda
+from simulation import FleetSimulator, make_change, random_demand, SOLD, INSUFFICIENT_FUNDS, NO_STOCK, NO_CHANGE
+from transaction import VendingAction
+
+DENOMINATIONS = [OneCent, FiveCent, TenCent, TwentyFiveCent, FiftyCent, OneDollarBill, TwoDollarBill]
+PRODUCT_TYPES = [Candy, Snack, Nuts, Coke, Pepsi, Soda]
+OUTCOMES = {
+    InsufficientFundsForPurchase: INSUFFICIENT_FUNDS,
+    NoStockException: NO_STOCK,
+    CalculateChangeError: NO_CHANGE,
+}
+
+
+@pytest.mark.simulation
+def test_make_change_matches_scalar_make_change():
+    rng = np.random.default_rng(1)
+    values = np.array([d.value for d in DENOMINATIONS])
+    targets = rng.integers(1, 200, 500)
+    counts = rng.integers(0, 6, (500, len(values)))
+
+    change, feasible = make_change(targets, values, counts)
+
+    for target, row, given, ok in zip(targets, counts, change, feasible):
+        try:
+            expected = scalar_make_change(int(target), tuple(values.tolist()), tuple(row.tolist()))
+        except CalculateChangeError:
+            assert not ok
+        else:
+            assert ok
+            assert tuple(given.tolist()) == expected
+
+
+@pytest.mark.simulation
+def test_fleet_matches_vending_action():
+    rng = np.random.default_rng(7)
+    vending_machines = []
+    for _ in range(5):
+        products = [t() for t in PRODUCT_TYPES for _ in range(rng.integers(0, 4))]
+        money_store = [d() for d in DENOMINATIONS[:5] for _ in range(rng.integers(0, 4))]
+        money_box = MoneyBox(money_store=money_store, valid_money=DENOMINATIONS)
+        vending_machines.append(VendingMachine(products=products, money_box=money_box))
+
+    simulator = FleetSimulator.from_machines(vending_machines, PRODUCT_TYPES)
+    tenders = np.eye(len(DENOMINATIONS), dtype=np.int64)[2:]
+    ticks = list(random_demand(5, 20, 8, [1] * len(PRODUCT_TYPES), tenders, seed=3))
+
+    for machines, products, tender_counts in ticks:
+        outcomes, change = simulator.step(machines, products, tender_counts)
+
+        for m, p, tender, outcome, given in zip(machines, products, tender_counts, outcomes, change):
+            money_objects = [d() for d, c in zip(DENOMINATIONS, tender) for _ in range(c)]
+            vending_action = VendingAction(vending_machine=vending_machines[m])
+            try:
+                change_objects = vending_action.purchase(PRODUCT_TYPES[p](), money_objects)
+            except tuple(OUTCOMES) as e:
+                assert outcome == OUTCOMES[e.__class__]
+            else:
+                assert outcome == SOLD
+                assert [m.value for m in change_objects] == [
+                    d.value for d, c in zip(DENOMINATIONS, given) for _ in range(c)]
+
+    for m, vending_machine in enumerate(vending_machines):
+        assert tuple(simulator.coins[m]) == vending_machine.money_box.ledger.counts
+        assert [simulator.stock[m, p] for p in range(len(PRODUCT_TYPES))] == [
+            vending_machine.stock_level(t) for t in PRODUCT_TYPES]
+
+
+@pytest.mark.simulation
+def test_fleet_report():
+    stock = [[1, 0], [5, 5]]
+    coins = [[0, 0, 0], [0, 0, 0]]
+    simulator = FleetSimulator([Candy, Coke], [TenCent, TwentyFiveCent, FiftyCent], stock, coins)
+
+    ticks = [
+        ([0, 0, 1, 1], [0, 0, 1, 0], [[1, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]]),
+        ([1], [1], [[1, 0, 0]]),
+    ]
+    report = simulator.run(ticks)
+
+    assert report.summary() == {
+        'sales': 2,
+        'revenue': Candy.price + Coke.price,
+        'lost_no_stock': 1,
+        'lost_no_change': 1,
+        'lost_insufficient_funds': 1,
+    }
+    assert list(report.sales) == [1, 1]
+    assert simulator.stock.tolist() == [[0, 0], [5, 4]]
+    assert simulator.coins.tolist() == [[1, 0, 0], [0, 1, 0]]
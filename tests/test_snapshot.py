@@ -0,0 +1,81 @@
+import struct
+
+import pytest
+
+from money import TenCent, TwentyFiveCent, FiftyCent
+from products import Candy, Coke
+from snapshot import SnapshotFormatError, dump, dumps, dumps_objects, load, loads
+from tests.helpers import machine_state, make_vending_machine
+
+MONEY_STORE = [TenCent()] * 5 + [FiftyCent()]
+
+
+@pytest.mark.snapshot
+def test_round_trip():
+    vending_machine = make_vending_machine(money_store=MONEY_STORE)
+
+    snapshot = loads(dumps(vending_machine, seq=42))
+
+    assert snapshot.seq == 42
+    assert snapshot.denominations == ('TenCent', 'TwentyFiveCent', 'FiftyCent')
+    assert list(snapshot.values) == [10, 25, 50]
+    assert list(snapshot.money_counts) == [5, 0, 1]
+    assert snapshot.product_names == ('Candy', 'Coke')
+    assert list(snapshot.prices) == [Candy.price, Coke.price]
+    assert list(snapshot.stock) == [2, 1]
+    assert machine_state(snapshot.restore()) == machine_state(vending_machine)
+
+
+@pytest.mark.snapshot
+def test_counts_are_aligned():
+    data = dumps(make_vending_machine(money_store=MONEY_STORE))
+
+    assert data.index(struct.pack('<3q', 10, 25, 50)) % 8 == 0
+
+
+@pytest.mark.snapshot
+def test_loads_views_buffer_without_copying():
+    buffer = bytearray(dumps(make_vending_machine(money_store=MONEY_STORE)))
+    snapshot = loads(buffer)
+
+    offset = buffer.index(struct.pack('<q', 5))
+    buffer[offset:offset + 8] = struct.pack('<q', 7)
+
+    assert list(snapshot.money_counts) == [7, 0, 1]
+    snapshot.close()
+    assert list(snapshot.money_counts) == [7, 0, 1]
+
+
+@pytest.mark.snapshot
+def test_dumps_objects_matchesmake_vending_machine(money_store=MONEY_STORE):
+    products = [Candy(), Coke(), Candy()]
+    money_store = [FiftyCent()] + [TenCent() for _ in range(5)]
+    valid_money = [FiftyCent, TenCent, TwentyFiveCent]
+
+    assert dumps_objects(products, money_store, valid_money, seq=3) == dumps(make_vending_machine(money_store=MONEY_STORE), seq=3)
+
+
+@pytest.mark.snapshot
+def test_load_maps_file(tmp_path):
+    vending_machine = make_vending_machine(money_store=MONEY_STORE)
+    path = str(tmp_path / 'machine.snap')
+    dump(vending_machine, path, seq=9)
+
+    with load(path) as snapshot:
+        assert snapshot.seq == 9
+        assert machine_state(snapshot.restore(concurrent=True)) == machine_state(vending_machine)
+
+
+@pytest.mark.snapshot
+@pytest.mark.parametrize('mangle', [
+    lambda data: b'XXXX' + data[4:],
+    lambda data: data[:4] + struct.pack('<H', 99) + data[6:],
+    lambda data: data[:-3],
+    lambda data: data[:10],
+    lambda data: data.replace(b'Coke', b'Cola'),
+])
+def test_loads_rejects_bad_snapshots(mangle):
+    data = mangle(dumps(make_vending_machine(money_store=MONEY_STORE)))
+
+    with pytest.raises(SnapshotFormatError):
+        loads(data).restore()
@@ -1,10 +1,16 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import mock
 import pytest
 
+from exceptions import CalculateChangeError, InsufficientFundsForPurchase, InvalidMoneyTypes, MoneyTypeNotInStock, \
+    NoStockException
 from machine import MoneyBox, VendingMachine
-from money import OneCent, FiveCent, TenCent, FiftyCent, OneDollarBill
+from money import OneCent, FiveCent, TenCent, TwentyFiveCent, FiftyCent, OneDollarBill
 from products import Candy, Snack, Nuts
 from tests.helpers import assert_list_instances_equal
-from transaction import VendingAction
+from transaction import VendingAction, PurchaseResult, SOLD, INSUFFICIENT_FUNDS, NO_STOCK, NO_CHANGE, INVALID_MONEY
 
 
 @pytest.mark.transactions
@@ -51,7 +57,8 @@ def test_purchase_product():
     vending_action = VendingAction(vending_machine=vending_machine)
     vending_action.purchase(Candy(), [TenCent()])
 
-    assert vending_machine.products == products
+    assert len(vending_machine.products) == 2
+    assert_list_instances_equal(vending_machine.products, [Snack(), Nuts()])
     assert_list_instances_equal(money_box.money_store, [TenCent(), TenCent()])
 
 
@@ -65,4 +72,284 @@ def test_purchase_product_case_two():
     vending_action = VendingAction(vending_machine=vending_machine)
     vending_action.purchase(Nuts(), [OneDollarBill()])
 
-    assert vending_machine.products == products
+    assert len(vending_machine.products) == 5
+    assert vending_machine.stock_level(Nuts) == 1
+
+
+@pytest.mark.transactions
+def test_purchase_returns_change():
+    products = [Snack()]
+    money_store = [TenCent(), TenCent(), TenCent(), TwentyFiveCent()]
+    valid_money = [TenCent, TwentyFiveCent, OneDollarBill]
+    money_box = MoneyBox(money_store=money_store, valid_money=valid_money)
+    vending_machine = VendingMachine(products=products, money_box=money_box)
+
+    vending_action = VendingAction(vending_machine=vending_machine)
+    change = vending_action.purchase(Snack(), [TwentyFiveCent(), TwentyFiveCent(), TwentyFiveCent()])
+
+    assert len(change) == 1
+    assert_list_instances_equal(change, [TwentyFiveCent()])
+    assert money_box.total_money == 105
+    assert vending_machine.products == []
+
+
+@pytest.mark.transactions
+def test_plan_purchase_does_not_change_machine():
+    products = [Candy()]
+    money_store = [FiveCent()]
+    valid_money = [FiveCent, TenCent, FiftyCent]
+    money_box = MoneyBox(money_store=money_store, valid_money=valid_money)
+    vending_machine = VendingMachine(products=products, money_box=money_box)
+
+    vending_action = VendingAction(vending_machine=vending_machine)
+    plan = vending_action.plan_purchase(Candy(), [TenCent(), FiveCent()])
+
+    assert plan.product_type is Candy
+    assert plan.change == (1, 0, 0)
+    assert plan.money_delta == (0, 1, 0)
+    assert money_box.ledger.counts == (1, 0, 0)
+    assert vending_machine.stock_level(Candy) == 1
+
+
+@pytest.mark.transactions
+@pytest.mark.parametrize('product, money_objects, exception', [
+    (Nuts(), [FiftyCent()], InsufficientFundsForPurchase),
+    (Candy(), [OneCent() for _ in range(10)], InvalidMoneyTypes),
+    (Snack(), [FiftyCent()], NoStockException),
+    (Candy(), [FiftyCent()], CalculateChangeError),
+])
+def test_failed_purchase_leaves_machine_untouched(product, money_objects, exception):
+    products = [Candy()]
+    money_store = [TenCent()]
+    valid_money = [FiveCent, TenCent, FiftyCent]
+    money_box = MoneyBox(money_store=money_store, valid_money=valid_money)
+    vending_machine = VendingMachine(products=products, money_box=money_box)
+
+    vending_action = VendingAction(vending_machine=vending_machine)
+
+    with pytest.raises(exception):
+        vending_action.plan_purchase(product, money_objects)
+    with pytest.raises(exception):
+        vending_action.purchase(product, money_objects)
+
+    assert money_box.ledger.counts == (0, 1, 0)
+    assert vending_machine.stock_level(Candy) == 1
+
+
+@pytest.mark.transactions
+@pytest.mark.parametrize('product, money_objects, outcome', [
+    (Nuts(), [FiftyCent()], INSUFFICIENT_FUNDS),
+    (Candy(), [OneCent() for _ in range(10)], INVALID_MONEY),
+    (Snack(), [FiftyCent()], NO_STOCK),
+    (Candy(), [FiftyCent()], NO_CHANGE),
+])
+def test_try_purchase_returns_declined_outcome(product, money_objects, outcome):
+    products = [Candy()]
+    money_store = [TenCent()]
+    valid_money = [FiveCent, TenCent, FiftyCent]
+    money_box = MoneyBox(money_store=money_store, valid_money=valid_money)
+    vending_machine = VendingMachine(products=products, money_box=money_box)
+
+    vending_action = VendingAction(vending_machine=vending_machine)
+
+    assert vending_action.try_purchase(product, money_objects) == PurchaseResult(outcome, [], money_objects)
+    assert money_box.ledger.counts == (0, 1, 0)
+    assert vending_machine.stock_level(Candy) == 1
+
+
+@pytest.mark.transactions
+def test_try_purchase_returns_change():
+    products = [Candy()]
+    money_store = [TenCent(), FiveCent()]
+    valid_money = [FiveCent, TenCent, TwentyFiveCent]
+    money_box = MoneyBox(money_store=money_store, valid_money=valid_money)
+    vending_machine = VendingMachine(products=products, money_box=money_box)
+
+    result = VendingAction(vending_machine=vending_machine).try_purchase(Candy(), [TwentyFiveCent()])
+
+    assert result == PurchaseResult(SOLD, [FiveCent(), TenCent()], [])
+    assert money_box.ledger.counts == (0, 0, 1)
+    assert vending_machine.stock_level(Candy) == 0
+
+
+@pytest.mark.transactions
+def test_concurrent_purchases_conserve_stock_and_money():
+    stock = {Candy: 200, Snack: 200, Nuts: 200}
+    products = [product_type() for product_type, count in stock.items() for _ in range(count)]
+    money_store = [OneCent() for _ in range(50)] + [FiveCent() for _ in range(50)] + [TenCent() for _ in range(50)]
+    valid_money = [OneCent, FiveCent, TenCent, FiftyCent, OneDollarBill]
+    money_box = MoneyBox(money_store=money_store, valid_money=valid_money)
+    vending_machine = VendingMachine(products=products, money_box=money_box, concurrent=True)
+    initial_money = money_box.total_money
+
+    vending_action = VendingAction(vending_machine=vending_machine)
+    orders = [(Candy(), [FiftyCent()]), (Snack(), [FiftyCent()]), (Nuts(), [OneDollarBill()])] * 300
+
+    def purchase(order):
+        product, money_objects = order
+        try:
+            change = vending_action.purchase(product, money_objects)
+        except (NoStockException, CalculateChangeError):
+            return None
+        assert sum(m.value for m in change) == sum(m.value for m in money_objects) - product.price
+        return product.__class__
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            sold = [p for p in executor.map(purchase, orders) if p is not None]
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    for product_type, count in stock.items():
+        assert vending_machine.stock_level(product_type) == count - sold.count(product_type)
+    assert money_box.total_money == initial_money + sum(p.price for p in sold)
+    assert all(c >= 0 for c in money_box.ledger.counts)
+    assert sum(money_box.ledger.counts) == len(money_box.ledger)
+
+
+@pytest.mark.transactions
+def test_commit_rejects_stale_ledger_version():
+    products = [Candy()]
+    money_store = [TenCent()]
+    valid_money = [TenCent]
+    money_box = MoneyBox(money_store=money_store, valid_money=valid_money)
+    vending_machine = VendingMachine(products=products, money_box=money_box, concurrent=True)
+
+    version = money_box.ledger.version
+    vending_machine.add_to_money_stock(TenCent())
+
+    assert not vending_machine.commit(Candy, (1,), version)
+    assert money_box.ledger.counts == (2,)
+    assert vending_machine.stock_level(Candy) == 1
+
+
+@pytest.mark.transactions
+def test_commit_only_rejects_changes_to_denominations_the_change_uses():
+    money_box = MoneyBox(money_store=[FiveCent(), TenCent()], valid_money=[FiveCent, TenCent, FiftyCent])
+    vending_machine = VendingMachine(products=[Candy(), Snack()], money_box=money_box, concurrent=True)
+    ledger = money_box.ledger
+
+    # a sale giving 5p change depends only on the 5p coins
+    stamps = ledger.stamps(1)
+    vending_machine.add_to_money_stock(FiftyCent())
+    assert vending_machine.commit(Candy, (-1, 1, 0), stamps=stamps)
+
+    stamps = ledger.stamps(1)
+    vending_machine.add_to_money_stock(FiveCent())
+    assert not vending_machine.commit(Snack, (-1, 1, 0), stamps=stamps)
+    assert vending_machine.stock_level(Snack) == 1
+
+@pytest.mark.transactions
+def test_purchase_many():
+    products = [Candy(), Candy(), Snack()]
+    money_store = [TenCent(), TenCent()]
+    valid_money = [FiveCent, TenCent, TwentyFiveCent, FiftyCent]
+    money_box = MoneyBox(money_store=money_store, valid_money=valid_money)
+    vending_machine = VendingMachine(products=products, money_box=money_box)
+
+    vending_action = VendingAction(vending_machine=vending_machine)
+    orders = [
+        (Candy(), [TwentyFiveCent()]),
+        (Candy(), [TenCent(), TenCent()]),
+        (Nuts(), [FiftyCent()]),
+        (Snack(), [OneDollarBill()]),
+        (Nuts(), [FiftyCent(), FiftyCent()]),
+        (Candy(), [TenCent()]),
+        (Snack(), [TwentyFiveCent(), TwentyFiveCent()]),
+    ]
+
+    results = list(vending_action.purchase_many(orders))
+
+    assert [r.success for r in results] == [False, True, False, False, False, True, True]
+    assert [r.reason for r in results] == [
+        CalculateChangeError, None, InsufficientFundsForPurchase, InvalidMoneyTypes,
+        NoStockException, None, None]
+    assert results[1].change == (0, 1, 0, 0)
+    assert results[6].change == (0, 0, 0, 0)
+    assert vending_machine.stock_level(Candy) == 0
+    assert vending_machine.stock_level(Snack) == 0
+    assert money_box.total_money == 20 + 2 * Candy.price + Snack.price
+
+
+@pytest.mark.transactions
+def test_quote():
+    products = [Candy()]
+    money_store = [TenCent(), TenCent()]
+    valid_money = [FiveCent, TenCent, TwentyFiveCent, FiftyCent]
+    money_box = MoneyBox(money_store=money_store, valid_money=valid_money)
+    vending_machine = VendingMachine(products=products, money_box=money_box)
+
+    vending_action = VendingAction(vending_machine=vending_machine)
+
+    assert vending_action.quote(Candy(), [TwentyFiveCent(), FiveCent()]) == (True, (0, 2, 0, 0), None)
+    assert vending_action.quote(Candy(), [FiftyCent()]) == (False, None, CalculateChangeError)
+    assert vending_action.quote(Nuts(), [FiftyCent()]) == (False, None, InsufficientFundsForPurchase)
+    assert vending_action.quote(Candy(), [OneCent()] * 10) == (False, None, InvalidMoneyTypes)
+    assert vending_action.quote(Snack(), [FiftyCent()]) == (False, None, NoStockException)
+    assert money_box.ledger.counts == (0, 2, 0, 0)
+    assert vending_machine.stock_level(Candy) == 1
+
+
+@pytest.mark.transactions
+def test_quote_is_remembered_until_relevant_money_changes():
+    products = [Candy(), Candy()]
+    money_store = [TenCent(), TenCent()]
+    valid_money = [FiveCent, TenCent, TwentyFiveCent, FiftyCent]
+    money_box = MoneyBox(money_store=money_store, valid_money=valid_money)
+    vending_machine = VendingMachine(products=products, money_box=money_box)
+
+    vending_action = VendingAction(vending_machine=vending_machine)
+    tender = [TwentyFiveCent(), FiveCent()]
+    vending_action.quote(Candy(), tender)
+
+    with mock.patch('transaction.VendingAction._quote') as mock_quote:
+        # money too large to be part of the change does not affect the quote
+        vending_machine.add_to_money_stock(FiftyCent())
+        assert vending_action.quote(Candy(), tender) == (True, (0, 2, 0, 0), None)
+        assert not mock_quote.called
+
+    vending_machine.remove_from_money_stock(TenCent())
+    assert vending_action.quote(Candy(), tender) == (False, None, CalculateChangeError)
+
+    vending_machine.remove_product(Candy())
+    vending_machine.remove_product(Candy())
+    vending_machine.add_to_money_stock(TenCent())
+    assert vending_action.quote(Candy(), tender) == (False, None, NoStockException)
+
+
+@pytest.mark.transactions
+def test_collect_and_remove_money_are_all_or_nothing():
+    money_box = MoneyBox(money_store=[FiveCent(), TenCent(), TenCent()], valid_money=[FiveCent, TenCent])
+    vending_action = VendingAction(VendingMachine(products=[], money_box=money_box))
+
+    with pytest.raises(MoneyTypeNotInStock):
+        vending_action.remove_money_objects_to_money_stock([TenCent(), FiveCent(), FiveCent()])
+    assert money_box.total_money == 25
+
+    assert_list_instances_equal(vending_action.collect(amount=15), [FiveCent(), TenCent()])
+    assert_list_instances_equal(money_box.money_store, [TenCent()])
+
+
+@pytest.mark.transactions
+def test_calculate_change_gives_back_the_money_when_it_cannot():
+    money_box = MoneyBox(money_store=[TenCent(), TwentyFiveCent()], valid_money=[TenCent, TwentyFiveCent])
+    vending_action = VendingAction(VendingMachine(products=[], money_box=money_box))
+
+    assert_list_instances_equal(vending_action.calculate_change(35, 25, [TwentyFiveCent()]), [TenCent()])
+    with pytest.raises(CalculateChangeError):
+        vending_action.calculate_change(30, 25, [TwentyFiveCent()])
+    assert_list_instances_equal(money_box.money_store, [TenCent()])
+
+
+@pytest.mark.transactions
+def test_remove_product_gives_back_the_money_when_out_of_stock():
+    money_box = MoneyBox(money_store=[TenCent(), TenCent()], valid_money=[TenCent])
+    vending_action = VendingAction(VendingMachine(products=[Candy()], money_box=money_box))
+
+    vending_action.remove_product(Candy(), [TenCent()])
+    with pytest.raises(NoStockException):
+        vending_action.remove_product(Candy(), [TenCent()])
+    assert vending_action.vending_machine.stock_level(Candy) == 0
+    assert_list_instances_equal(money_box.money_store, [TenCent()])
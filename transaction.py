@@ -1,4 +1,47 @@
-from exceptions import NoStockException, InsufficientFundsForPurchase, CalculateChangeError
+import time
+from bisect import bisect_right
+from collections import Counter, namedtuple
+
+from catalog import price_of
+from exceptions import NoStockException, InsufficientFundsForPurchase, InvalidMoneyTypes, CalculateChangeError, \
+    InvalidProductType
+from idempotency import IdempotencyCache
+
+PurchasePlan = namedtuple('PurchasePlan', ['product_type', 'money_delta', 'change'])
+OrderResult = namedtuple('OrderResult', ['success', 'change', 'reason'])
+PurchaseResult = namedtuple('PurchaseResult', ['outcome', 'change', 'refund'])
+
+# Outcome of a purchase, as returned by try_purchase. The fleet simulator uses the same codes.
+SOLD = 0
+INSUFFICIENT_FUNDS = 1
+NO_STOCK = 2
+NO_CHANGE = 3
+INVALID_MONEY = 4
+INVALID_PRODUCT = 5
+
+# The exception purchase raises for each outcome other than SOLD.
+DECLINES = {
+    INSUFFICIENT_FUNDS: InsufficientFundsForPurchase,
+    NO_STOCK: NoStockException,
+    NO_CHANGE: CalculateChangeError,
+    INVALID_MONEY: InvalidMoneyTypes,
+    INVALID_PRODUCT: InvalidProductType,
+}
+
+# The message of the exception raised for each outcome other than SOLD.
+_DECLINE_MESSAGES = {
+    INSUFFICIENT_FUNDS: "Insufficient funds",
+    NO_STOCK: "Stock has run out",
+    NO_CHANGE: "There is not enough change to match this amount",
+    INVALID_MONEY: "Money type not allowed in money box",
+    INVALID_PRODUCT: "Product type is not in the catalog",
+}
+
+# Most distinct tenders remembered while processing a stream of orders.
+_MAX_TENDERS = 1024
+
+# Most quotes remembered by a vending action.
+_MAX_QUOTES = 4096
 
 
 class VendingAction:
@@ -6,60 +49,394 @@ class VendingAction:
 
     Args:
          vending_machine: An instantiated vending machine
+         metrics: A Metrics to record each stage of a purchase in, if any
+         catalog: A Catalog to price products from, if any; without one products are
+             sold at the price of their type
+         recorder: A TraceRecorder to record every purchase, restock and change to the
+             money stock in, if any
+         idempotency: An IdempotencyCache to remember the results of purchases and
+             restocks made with an idempotency key in; by default one of its own
     """
 
-    def __init__(self, vending_machine):
+    def __init__(self, vending_machine, metrics=None, catalog=None, recorder=None, idempotency=None):
         self.vending_machine = vending_machine
+        self.metrics = metrics
+        self.catalog = catalog
+        self.recorder = recorder
+        self.idempotency = idempotency if idempotency is not None else IdempotencyCache()
+        self._quotes = {}
+
+    def _price(self, product):
+        """Return the price of a product from the catalog in effect now, or None if it is
+        not in the catalog. A sale looks its price up once, when it starts, so a catalog
+        reloaded part way through does not change it."""
+        if self.catalog is None:
+            return product.price
+        return price_of(type(product), self.catalog)
+
+    def _checked_price(self, product):
+        price = self._price(product)
+        if price is None:
+            raise InvalidProductType("Product type is not in the catalog")
+        return price
 
     def add_money_objects_to_money_stock(self, money_objects):
         for m in money_objects:
             self.vending_machine.add_to_money_stock(m)
+            if self.recorder is not None:
+                self.recorder.money(m, 1)
 
     def remove_money_objects_to_money_stock(self, money_objects):
-        for m in money_objects:
-            self.vending_machine.remove_from_money_stock(m)
+        """Take money out of the money box as a single change. Either all of it is
+        taken or, if the money box does not hold it, none."""
+        self._collect(None, Counter(map(type, money_objects)))
+
+    def collect(self, amount=None, counts=None):
+        """Take money out of the money box as a single change, either a number of coins
+        and notes of each money type or an amount, made up under the dispensing policy.
+        Either all of it is taken or none.
+
+        Args:
+            - amount: the amount to take, in pence
+            - counts: a mapping of money type to the number to take
+
+        Returns:
+            - (list) of money objects taken
+        """
+        return self._money_objects(self._collect(amount, counts))
+
+    def _collect(self, amount, counts):
+        taken = self.vending_machine.collect(amount, counts)
+        if self.recorder is not None:
+            for d, count in zip(self.vending_machine.money_box.ledger.denominations, taken):
+                if count:
+                    self.recorder.money(d(), -count)
+        return taken
+
+    def restock(self, products, money_objects=(), idempotency_key=None):
+        """Add products and money to the vending machine. The money is checked before
+        anything is added.
+
+        Args:
+            - idempotency_key: a key identifying the restock, if any; a restock sent
+              again with the same key is not added again
+        """
+        if idempotency_key is not None:
+            self.idempotency.run(('restock', idempotency_key), self.restock, products, money_objects)
+            return
+
+        if self.recorder is not None:
+            products, money_objects = list(products), list(money_objects)
+            self.vending_machine.restock(products, money_objects)
+            self.recorder.restock(products, money_objects)
+        else:
+            self.vending_machine.restock(products, money_objects)
 
     def calculate_change(self, provided_amount, product_price, money_objects):
-        """Return a lsit of money objects to give as change"""
-        change_amount = provided_amount - product_price
+        """Return a list of money objects to give as change from the money box. If the
+        change cannot be made, the money objects, already added to the money stock by
+        the caller, are taken back out before raising."""
         try:
-            change_to_give = self.vending_machine.money_box.calculate_change(change_amount)
-            return change_to_give
+            return self.vending_machine.money_box.calculate_change(provided_amount - product_price)
         except CalculateChangeError as e:
-            # if there is a calculate change error then return the money
             self.remove_money_objects_to_money_stock(money_objects)
             raise e
 
     def remove_product(self, product, money_objects):
+        """Remove a product from the vending machine. If it is out of stock, the money
+        objects, already added to the money stock by the caller, are taken back out
+        before raising."""
         try:
             self.vending_machine.remove_product(product)
         except NoStockException as e:
             self.remove_money_objects_to_money_stock(money_objects)
             raise e
 
-    def purchase(self, product, money_objects):
-        """Perform necessary actions on the vending machine to purchase a
-        product with a certain amount of money"""
+    def plan_purchase(self, product, money_objects):
+        """Work out what purchasing a product with a certain amount of money would do,
+        without changing the vending machine.
 
-        # check that there is enough money for the purchase
+        Returns:
+            - (PurchasePlan) the product type sold, the change in the count of each
+              denomination in the money box and the count of each denomination given
+              as change
+        """
+        price = self._checked_price(product)
         total_money = self._calculate_total_money(money_objects)
-        self._check_enough_money(product.price, total_money)
+        tendered = self.vending_machine.money_box.ledger.try_tally(money_objects)
 
-        self.add_money_objects_to_money_stock(money_objects)
+        outcome, change, _ = self._plan(type(product), price, tendered, total_money)
+        if outcome != SOLD:
+            raise DECLINES[outcome](_DECLINE_MESSAGES[outcome])
+        money_delta = tuple(t - c for t, c in zip(tendered, change))
+        return PurchasePlan(type(product), money_delta, change)
 
-        change_to_give = self.calculate_change(total_money, product.price, money_objects)
+    def quote(self, product, money_objects):
+        """Work out whether purchasing a product with a certain amount of money would
+        succeed and what change would be given, without changing the vending machine or
+        creating any money objects.
 
-        self.remove_product(product, money_objects)
+        Quotes are remembered. A remembered quote is used again until the count of a
+        denomination that could be part of its change changes, so asking again after
+        unrelated sales costs a lookup.
 
-        # if all is good then give the change
-        for change in change_to_give:
-            self.vending_machine.remove_from_money_stock(change)
+        Returns:
+            - (OrderResult) holding whether the purchase would succeed, the count of each
+              denomination that would be given as change and, if it would fail, the type
+              of exception that would stop it
+        """
+        ledger = self.vending_machine.money_box.ledger
+        price = self._price(product)
+        if price is None:
+            return OrderResult(False, None, InvalidProductType)
+        key = (product.__class__, price, tuple(m.__class__ for m in money_objects))
 
-    @staticmethod
-    def _check_enough_money(min_amount, total_money):
-        """Check that the amount of money is greater than a minimum amount."""
-        if total_money < min_amount:
-            raise InsufficientFundsForPurchase("Insufficient funds")
+        remembered = self._quotes.get(key)
+        if remembered is None or ledger.stamps(remembered[0]) != remembered[1]:
+            remembered = self._quote(price, money_objects)
+            if len(self._quotes) >= _MAX_QUOTES:
+                self._quotes.clear()
+            self._quotes[key] = remembered
+
+        result = remembered[2]
+        if result.reason in (InsufficientFundsForPurchase, InvalidMoneyTypes):
+            return result
+        if type(product) not in self.vending_machine.inventory:
+            return OrderResult(False, None, NoStockException)
+        return result
+
+    def _quote(self, price, money_objects):
+        """Return a quote, without checking stock, along with the number of denominations
+        it depends on and their stamps."""
+        ledger = self.vending_machine.money_box.ledger
+        total_money = self._calculate_total_money(money_objects)
+        tendered = ledger.try_tally(money_objects)
+        relevant = bisect_right(ledger.values, total_money - price)
+        stamps = ledger.stamps(relevant)
+
+        outcome, change, _ = self._plan(None, price, tendered, total_money)
+        if outcome == SOLD:
+            return relevant, stamps, OrderResult(True, change, None)
+        if outcome in (INSUFFICIENT_FUNDS, INVALID_MONEY):
+            # these do not depend on the money box at all
+            return 0, (), OrderResult(False, None, DECLINES[outcome])
+        return relevant, stamps, OrderResult(False, None, DECLINES[outcome])
+
+    def purchase(self, product, money_objects, idempotency_key=None):
+        """Perform necessary actions on the vending machine to purchase a
+        product with a certain amount of money. Nothing is changed unless the
+        whole purchase can go ahead.
+
+        Args:
+            - idempotency_key: a key identifying the purchase, if any; a purchase sent
+              again with the same key is answered with the first one's change, or
+              declined again, without touching the vending machine
+
+        Returns:
+            - (list) of money objects given as change
+        """
+        result = self.try_purchase(product, money_objects, idempotency_key)
+        if result.outcome != SOLD:
+            raise DECLINES[result.outcome](_DECLINE_MESSAGES[result.outcome])
+        return result.change
+
+    def try_purchase(self, product, money_objects, idempotency_key=None):
+        """Purchase a product as purchase does, returning the outcome rather than raising
+        when the purchase cannot go ahead, so declined sales cost no more than sales.
+
+        Returns:
+            - (PurchaseResult) holding the outcome code, the money objects given as
+              change and the money objects handed back because the purchase was
+              declined
+        """
+        if idempotency_key is not None:
+            result = self.idempotency.run(('purchase', idempotency_key), self.try_purchase, product, money_objects)
+            # the remembered result is shared with later retries, so its lists are copied
+            return result._replace(change=list(result.change), refund=list(result.refund))
+
+        started = timer = time.perf_counter() if self.metrics is not None else None
+        price = self._price(product)
+        change = None
+        if price is None:
+            outcome = INVALID_PRODUCT
+        else:
+            total_money = self._calculate_total_money(money_objects)
+            if timer is not None:
+                timer = self._lap('total_money', timer)
+            tendered = self.vending_machine.money_box.ledger.try_tally(money_objects)
+            if timer is not None:
+                timer = self._lap('validate_money', timer)
+            outcome, change = self._try_purchase(type(product), price, tendered, total_money, timer)
+
+        if self.recorder is not None:
+            self.recorder.purchase(product, money_objects, outcome, change)
+        if outcome != SOLD:
+            result = PurchaseResult(outcome, [], list(money_objects))
+        elif started is None:
+            return PurchaseResult(SOLD, self._money_objects(change), [])
+        else:
+            timer = time.perf_counter()
+            result = PurchaseResult(SOLD, self._money_objects(change), [])
+            self._lap('dispense_change', timer)
+
+        if started is not None:
+            self._observe_outcome(outcome, change, started)
+        return result
+
+    def _observe_outcome(self, outcome, change, started, reason=None):
+        """Count a finished purchase, and time it if it was sold. A purchase stopped by
+        an unexpected error has no outcome and is counted under the error given."""
+        metrics = self.metrics
+        if outcome == SOLD:
+            metrics.observe('purchase', time.perf_counter() - started)
+            metrics.inc('vending_sales_total')
+            for d, count in zip(self.vending_machine.money_box.ledger.denominations, change):
+                if count:
+                    metrics.inc('vending_coins_dispensed_total', ('denomination', d.__name__), count)
+        else:
+            if outcome is not None:
+                reason = DECLINES[outcome]
+            metrics.inc('vending_refunds_total', ('reason', reason.__name__))
+
+    def _lap(self, stage, started):
+        """Record the time since a stage started, returning the time now."""
+        now = time.perf_counter()
+        self.metrics.observe(stage, now - started)
+        return now
+
+    def purchase_many(self, orders):
+        """Purchase products for a stream of orders, in order.
+
+        Tenders made up of the same money are only checked and added up once for the
+        whole stream. A failed order does not stop the stream: every order yields a
+        result, and nothing is raised.
+
+        Args:
+            - orders: an iterable of (product, money objects) pairs
+
+        Returns:
+            - a generator of OrderResult, holding whether the purchase succeeded, the
+              count of each denomination given as change and, for a failed purchase,
+              the type of exception that stopped it
+        """
+        ledger = self.vending_machine.money_box.ledger
+        metrics = self.metrics
+        tenders = {}
+
+        for product, money_objects in orders:
+            started = timer = time.perf_counter() if metrics is not None else None
+            try:
+                price = self._price(product)
+                if price is None:
+                    outcome = INVALID_PRODUCT
+                else:
+                    key = tuple(m.__class__ for m in money_objects)
+                    tender = tenders.get(key)
+                    if tender is None:
+                        if len(tenders) >= _MAX_TENDERS:
+                            tenders.clear()
+                        total_money = self._calculate_total_money(money_objects)
+                        if timer is not None:
+                            timer = self._lap('total_money', timer)
+                        tender = tenders[key] = (ledger.try_tally(money_objects), total_money)
+                        if timer is not None:
+                            timer = self._lap('validate_money', timer)
+
+                    outcome, change = self._try_purchase(type(product), price, tender[0], tender[1], timer)
+            except Exception as e:
+                outcome, result = None, OrderResult(False, None, e.__class__)
+            else:
+                if outcome == SOLD:
+                    result = OrderResult(True, change, None)
+                else:
+                    result = OrderResult(False, None, DECLINES[outcome])
+
+            if started is not None:
+                self._observe_outcome(outcome, result.change, started, result.reason)
+            if self.recorder is not None:
+                self.recorder.purchase(product, money_objects, outcome, result.change)
+            yield result
+
+    def _plan(self, product_type, price, tendered, total_money, timer=None):
+        """Check whether a purchase can go ahead and work out its change against the
+        vending machine as it is now, without changing it. Every purchase, plan and
+        quote is checked here, so they decline sales for the same reasons.
+
+        Args:
+            - product_type: the product type sold, or None to leave the stock unchecked
+            - tendered: the count of each denomination tendered, or None if the money
+              tendered is not all accepted
+            - timer: when metrics are recorded, the time the stage before ended
+
+        Returns:
+            - the outcome code, for a sale the count of each denomination to give as
+              change, and the time the last stage ended
+        """
+        if total_money < price:
+            return INSUFFICIENT_FUNDS, None, timer
+        if tendered is None:
+            return INVALID_MONEY, None, timer
+
+        vending_machine = self.vending_machine
+        if product_type is not None and product_type not in vending_machine.inventory:
+            return NO_STOCK, None, timer
+        if timer is not None:
+            timer = self._lap('check_stock', timer)
+
+        change = vending_machine.money_box.change_counts(total_money - price, tendered)
+        if change is None:
+            return NO_CHANGE, None, timer
+        if timer is not None:
+            timer = self._lap('calculate_change', timer)
+        return SOLD, change, timer
+
+    def _try_purchase(self, product_type, price, tendered, total_money, timer=None):
+        """Plan and commit a purchase without raising for a declined sale. Every purchase
+        API goes through here, so each reports the same stages to the metrics.
+
+        Args:
+            - tendered: the count of each denomination tendered, or None if the money
+              tendered is not all accepted
+            - timer: when metrics are recorded, the time the stage before ended
+
+        Returns:
+            - the outcome code and, for a sale, the count of each denomination given as
+              change
+        """
+        vending_machine = self.vending_machine
+        ledger = vending_machine.money_box.ledger
+        # change can only be made from denominations no larger than it, so only a
+        # change in their counts can spoil the plan
+        relevant = bisect_right(ledger.values, total_money - price)
+        while True:
+            # the plan is made without holding any lock, so if another purchase has
+            # moved money the change could be made from in the meantime, it is made
+            # again against the new counts
+            stamps = ledger.stamps(relevant)
+            outcome, change, timer = self._plan(product_type, price, tendered, total_money, timer)
+            if outcome != SOLD:
+                return outcome, None
+
+            money_delta = tuple(t - c for t, c in zip(tendered, change))
+            try:
+                committed = vending_machine.commit(product_type, money_delta, stamps=stamps)
+            except NoStockException:
+                # the last one was sold between checking the stock and committing
+                return NO_STOCK, None
+            if timer is not None:
+                timer = self._lap('commit', timer)
+            if committed:
+                return SOLD, change
+
+    def _money_objects(self, counts):
+        """Return a list of money objects from a count of each denomination."""
+        denominations = self.vending_machine.money_box.ledger.denominations
+        # money objects are shared instances, so a list of one can be repeated
+        money_objects = []
+        for d, c in zip(denominations, counts):
+            if c:
+                money_objects += [d()] * c
+        return money_objects
 
     @staticmethod
     def _calculate_total_money(money_objects):